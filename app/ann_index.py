@@ -0,0 +1,294 @@
+import struct
+import threading
+import time
+
+import numpy as np
+
+# Each recall sample runs one exact search over the whole index
+MAX_RECALL_SAMPLES = 500
+
+
+# Convert a REAL_VECTOR value as returned by hdbcli (fvecs bytes) or TO_NVARCHAR ('[...]') to float32
+def parse_real_vector(value):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        raw = bytes(value)
+        dim = struct.unpack_from('<I', raw)[0]
+        return np.frombuffer(raw, dtype='<f4', count=dim, offset=4).astype(np.float32)
+    if isinstance(value, str):
+        return np.array([float(x) for x in value.strip('[] ').split(',') if x.strip()], dtype=np.float32)
+    return np.asarray(value, dtype=np.float32)
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _top_k(scores, k):
+    k = min(k, len(scores))
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+class IvfIndex:
+    """Inverted-file index over L2-normalized vectors; scores are cosine similarities.
+
+    Vectors are partitioned by a spherical k-means into ``n_lists`` cells and a
+    query only scans the ``n_probe`` cells whose centroids are closest to it.
+    """
+
+    def __init__(self, n_lists=None, n_probe=8, kmeans_iterations=10, seed=0):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.kmeans_iterations = kmeans_iterations
+        self.seed = seed
+        self.vectors = np.empty((0, 0), dtype=np.float32)
+        self.centroids = None
+        self.lists = []
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def _assign(self, vectors):
+        assignments = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), 4096):
+            assignments[start:start + 4096] = (vectors[start:start + 4096] @ self.centroids.T).argmax(axis=1)
+        return assignments
+
+    def build(self, vectors):
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+        self.vectors = vectors
+        if len(vectors) == 0:
+            self.centroids, self.lists = None, []
+            return self
+
+        # Train the coarse quantizer on a sample
+        rng = np.random.default_rng(self.seed)
+        n_lists = min(self.n_lists or max(1, int(np.sqrt(len(vectors)))), len(vectors))
+        sample = vectors[rng.choice(len(vectors), size=min(len(vectors), n_lists * 40), replace=False)]
+        self.centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+        for _ in range(self.kmeans_iterations):
+            assignments = (sample @ self.centroids.T).argmax(axis=1)
+            for cell in range(n_lists):
+                members = sample[assignments == cell]
+                if len(members):
+                    self.centroids[cell] = members.mean(axis=0)
+            self.centroids = _normalize(self.centroids)
+
+        assignments = self._assign(vectors)
+        self.lists = [np.flatnonzero(assignments == cell) for cell in range(n_lists)]
+        return self
+
+    def add(self, vectors):
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+        if self.centroids is None:
+            return self.build(vectors)
+
+        offset = len(self.vectors)
+        self.vectors = np.vstack([self.vectors, vectors])
+        assignments = self._assign(vectors)
+        for cell in np.unique(assignments):
+            self.lists[cell] = np.concatenate([self.lists[cell], offset + np.flatnonzero(assignments == cell)])
+        return self
+
+    def search(self, query, k):
+        if self.centroids is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = _normalize(np.asarray(query, dtype=np.float32))
+        cells = _top_k(self.centroids @ query, self.n_probe)
+        candidates = np.concatenate([self.lists[cell] for cell in cells])
+        scores = self.vectors[candidates] @ query
+        top = _top_k(scores, k)
+        return candidates[top], scores[top]
+
+    def exact_search(self, query, k):
+        query = _normalize(np.asarray(query, dtype=np.float32))
+        scores = self.vectors @ query
+        top = _top_k(scores, k)
+        return top, scores[top]
+
+
+class AnnMirror:
+    """In-process mirror of stored embedding columns, searched with an IvfIndex.
+
+    ``sources`` maps a table name to its key, text and vector columns. The
+    mirror is loaded and kept in sync by a background thread on its own
+    connection, so searches never wait on HANA; a search returns None while
+    the mirror is not loaded or is older than ``max_staleness_seconds`` and
+    the caller falls back to HANA.
+
+    A sync appends the rows with a key above the last one loaded, then
+    compares the row count and key sum of each table up to that key with the
+    mirror's. A mismatch means rows were deleted or had their embedding
+    backfilled, and the mirror is rebuilt from scratch; it is also rebuilt
+    every ``rebuild_seconds`` to pick up embeddings updated in place.
+    """
+
+    def __init__(self, connect, schema_name, sources, n_probe=8,
+                 refresh_seconds=60, max_staleness_seconds=300, rebuild_seconds=3600):
+        self._connect = connect
+        self.schema_name = schema_name
+        self.sources = sources
+        self.refresh_seconds = refresh_seconds
+        self.max_staleness_seconds = max_staleness_seconds
+        self.rebuild_seconds = rebuild_seconds
+        self.index = IvfIndex(n_probe=n_probe)
+        self.rows = []  # (text, project_number) per indexed vector
+        self.high_water = {}
+        self.signatures = {}  # table -> (rows, key sum) loaded into the mirror
+        self.synced_at = None
+        self.built_at = None
+        self.rebuilds = 0
+        self.searches = 0
+        self.fallbacks = 0
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+
+    def _fetch(self, connection, table_name, source, after=None):
+        sql = f"""
+            SELECT "{source['key']}", "{source['text']}", "project_number", "{source['vector']}"
+            FROM {self.schema_name}.{table_name}
+            WHERE "{source['vector']}" IS NOT NULL
+        """
+        params = ()
+        if after is not None:
+            sql += f' AND "{source["key"]}" > ?'
+            params = (after,)
+        sql += f' ORDER BY "{source["key"]}"'
+
+        cursor = connection.connection.cursor()
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+        cursor.close()
+        return rows
+
+    # Rows with an embedding and the sum of their keys, up to the high-water key
+    def _signature(self, connection, table_name, source, high_water):
+        cursor = connection.connection.cursor()
+        cursor.execute(f"""
+            SELECT COUNT(*), SUM("{source['key']}") FROM {self.schema_name}.{table_name}
+            WHERE "{source['vector']}" IS NOT NULL AND "{source['key']}" <= ?
+        """, (high_water,))
+        count, key_sum = cursor.fetchone()
+        cursor.close()
+        return int(count), int(key_sum or 0)
+
+    @staticmethod
+    def _loaded(rows, previous=(0, 0)):
+        return previous[0] + len(rows), previous[1] + sum(int(row[0]) for row in rows)
+
+    def _rebuild(self, connection):
+        vectors, rows, high_water, signatures = [], [], {}, {}
+        for table_name, source in self.sources.items():
+            fetched = self._fetch(connection, table_name, source)
+            if fetched:
+                high_water[table_name] = fetched[-1][0]
+                signatures[table_name] = self._loaded(fetched)
+                rows.extend((row[1], row[2]) for row in fetched)
+                vectors.extend(parse_real_vector(row[3]) for row in fetched)
+
+        index = IvfIndex(n_probe=self.index.n_probe)
+        if vectors:
+            index.build(np.vstack(vectors))
+        with self._lock:
+            self.index, self.rows = index, rows
+            self.high_water, self.signatures = high_water, signatures
+            self.synced_at = self.built_at = time.monotonic()
+            self.rebuilds += 1
+
+    def _append(self, connection, tables):
+        """Append the rows above the high-water keys; returns False when the mirror has drifted from HANA."""
+        new_vectors, new_rows, high_water, signatures = [], [], {}, {}
+        for table_name, source in self.sources.items():
+            if tables is not None and table_name not in tables:
+                continue
+            rows = self._fetch(connection, table_name, source, after=self.high_water.get(table_name))
+            if rows:
+                high_water[table_name] = rows[-1][0]
+                new_rows.extend((row[1], row[2]) for row in rows)
+                new_vectors.extend(parse_real_vector(row[3]) for row in rows)
+            signatures[table_name] = self._loaded(rows, self.signatures.get(table_name, (0, 0)))
+            latest = high_water.get(table_name, self.high_water.get(table_name))
+            if self._signature(connection, table_name, source, latest) != signatures[table_name]:
+                return False
+
+        with self._lock:
+            if new_vectors:
+                self.index.add(np.vstack(new_vectors))
+                self.rows.extend(new_rows)
+            self.high_water.update(high_water)
+            self.signatures.update(signatures)
+            self.synced_at = time.monotonic()
+        return True
+
+    def sync(self, tables=None, rebuild=False):
+        """Load the mirror on first call, then append new rows, rebuilding it when HANA changed otherwise."""
+        if not self._sync_lock.acquire(blocking=False):
+            return  # A sync is already running
+        try:
+            rebuild = rebuild or self.built_at is None or time.monotonic() - self.built_at > self.rebuild_seconds
+            connection = self._connect()
+            try:
+                if rebuild or not self._append(connection, tables):
+                    self._rebuild(connection)
+            finally:
+                connection.close()
+        finally:
+            self._sync_lock.release()
+
+    def sync_async(self, tables=None):
+        if self._sync_lock.locked():
+            return
+        threading.Thread(target=self.sync, kwargs={"tables": tables}, daemon=True).start()
+
+    def notify_insert(self, schema_name, table_name):
+        # Pull the new rows right away when a mirrored table was written to
+        if schema_name.upper() == self.schema_name.upper() and table_name.upper() in self.sources:
+            self.sync_async(tables=[table_name.upper()])
+
+    def search(self, query_vector, k):
+        """Top-k (text, project_number, similarity) rows, or None when the caller must use HANA."""
+        age = None if self.synced_at is None else time.monotonic() - self.synced_at
+        if age is None or age > self.refresh_seconds:
+            self.sync_async()
+        if age is None or age > self.max_staleness_seconds:
+            with self._lock:
+                self.fallbacks += 1
+            return None
+
+        with self._lock:
+            ids, scores = self.index.search(parse_real_vector(query_vector), k)
+            self.searches += 1
+            return [{"TEXT": self.rows[i][0], "project_number": self.rows[i][1], "SIMILARITY": float(score)}
+                    for i, score in zip(ids, scores)]
+
+    def recall(self, k=5, samples=50, seed=0):
+        """Mean recall@k of the index against exact search, using stored vectors as queries."""
+        with self._lock:
+            if len(self.index) == 0:
+                return None
+            rng = np.random.default_rng(seed)
+            queries = rng.choice(len(self.index), size=min(samples, len(self.index)), replace=False)
+            hits = 0
+            for query in queries:
+                approximate, _ = self.index.search(self.index.vectors[query], k)
+                exact, _ = self.index.exact_search(self.index.vectors[query], k)
+                hits += len(set(approximate.tolist()) & set(exact.tolist()))
+            return hits / (len(queries) * min(k, len(self.index)))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "vectors": len(self.index),
+                "lists": len(self.index.lists),
+                "n_probe": self.index.n_probe,
+                "high_water": {table: str(key) for table, key in self.high_water.items()},
+                "seconds_since_sync": None if self.synced_at is None else time.monotonic() - self.synced_at,
+                "seconds_since_rebuild": None if self.built_at is None else time.monotonic() - self.built_at,
+                "rebuilds": self.rebuilds,
+                "searches": self.searches,
+                "fallbacks": self.fallbacks
+            }
@@ -1,13 +1,29 @@
 import os
+import time
+STARTUP_STARTED = time.perf_counter()  # Before the imports, so the startup report covers them
 import configparser
 from datetime import datetime
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, g
 from flask_cors import CORS
-from hana_ml import dataframe
 
 # Check if the application is running on Cloud Foundry
 if 'VCAP_APPLICATION' in os.environ:
-    from app.utilities_hana import kmeans_and_tsne  # works in CF
+    from app.startup import StartupReport, LazyModule  # works in CF
+    UTILITIES_MODULE = 'app.utilities_hana'
+    from app.embedding_cache import get_query_embedding, query_embedding_cache
+    from app.hana_pool import HanaConnectionPool, PoolTimeout
+    from app.jobs import JobRunner
+    from app.streaming import parse_pagination_args, fetch_keyset_page, stream_ndjson
+    from app.serializers import to_records, to_columnar, to_arrow_ipc, wants_arrow, ARROW_MIMETYPE
+    from app.ann_index import AnnMirror, MAX_RECALL_SAMPLES
+    from app.instrumentation import metrics, instrument_connection, timed_collect, InstrumentedJSONProvider
+    from app.queries import execute_statement, fetch_records, similarity_search, MAX_SIMILARITY_K
+    from app.schema import SchemaRegistry, IDENTIFIER_PATTERN
+    from app.response_cache import DataVersions, ResponseCache
+    from app.ingestion import parse_ingest_payload, insert_texts
+    from app.coalescing import RequestCoalescer
+    from app.category_scores import CategoryScorer, UNASSIGNED_LABEL
+    from app.snapshot import EmbeddingSnapshot, export_snapshot, search_texts, SNAPSHOT_DTYPES
     
     # Running on Cloud Foundry, use environment variables
     hanaURL = os.getenv('DB_ADDRESS')
@@ -15,7 +31,22 @@ if 'VCAP_APPLICATION' in os.environ:
     hanaUser = os.getenv('DB_USER')
     hanaPW = os.getenv('DB_PASSWORD')
 else:
-    from utilities_hana import kmeans_and_tsne  # works in local machine
+    from startup import StartupReport, LazyModule  # works in local machine
+    UTILITIES_MODULE = 'utilities_hana'
+    from embedding_cache import get_query_embedding, query_embedding_cache
+    from hana_pool import HanaConnectionPool, PoolTimeout
+    from jobs import JobRunner
+    from streaming import parse_pagination_args, fetch_keyset_page, stream_ndjson
+    from serializers import to_records, to_columnar, to_arrow_ipc, wants_arrow, ARROW_MIMETYPE
+    from ann_index import AnnMirror, MAX_RECALL_SAMPLES
+    from instrumentation import metrics, instrument_connection, timed_collect, InstrumentedJSONProvider
+    from queries import execute_statement, fetch_records, similarity_search, MAX_SIMILARITY_K
+    from schema import SchemaRegistry, IDENTIFIER_PATTERN
+    from response_cache import DataVersions, ResponseCache
+    from ingestion import parse_ingest_payload, insert_texts
+    from coalescing import RequestCoalescer
+    from category_scores import CategoryScorer, UNASSIGNED_LABEL
+    from snapshot import EmbeddingSnapshot, export_snapshot, search_texts, SNAPSHOT_DTYPES
     
     # Not running on Cloud Foundry, read from config.ini file
     config = configparser.ConfigParser()
@@ -25,178 +56,235 @@ else:
     hanaUser = config['database']['user']
     hanaPW = config['database']['password']
 
-# Step 1: Establish a connection to SAP HANA
-connection = dataframe.ConnectionContext(hanaURL, hanaPort, hanaUser, hanaPW)
+# hana_ml (and pandas with it) is imported by the first connection, the PAL clustering pipeline
+# by the first route that runs it; GenAI Hub is imported by the labeller when it first labels
+startup_report = StartupReport(STARTUP_STARTED)
+stage_started = startup_report.stage('imports', STARTUP_STARTED)
+dataframe = LazyModule('hana_ml.dataframe', startup_report)
+utilities_hana = LazyModule(UTILITIES_MODULE, startup_report)
+
+# Fork-safe preload for uwsgi --master without --lazy-apps: import the heavy modules once in the
+# master so the forked workers share them; no connection is opened before the fork
+if os.getenv('APP_PRELOAD', 'false').lower() == 'true':
+    for module in (dataframe, utilities_hana):
+        module.load()
+        startup_report.preloaded.append(module.module_name)
+    stage_started = startup_report.stage('preload', stage_started)
+
+# Step 1: Pool of connections to SAP HANA, sized to the uwsgi threads per worker; connections are opened on first use
+def connect_to_hana():
+    connection_context = dataframe.ConnectionContext
+    started = time.perf_counter()
+    connection = instrument_connection(connection_context(hanaURL, hanaPort, hanaUser, hanaPW))
+    startup_report.record_connection(time.perf_counter() - started)
+    return connection
+
+pool = HanaConnectionPool(
+    connect_to_hana,
+    max_size=int(os.getenv('HANA_POOL_SIZE', '2')),
+    acquire_timeout=float(os.getenv('HANA_POOL_TIMEOUT_SECONDS', '30'))
+)
+
+# Tables are ensured once per process; text tables are "SCHEMA.TABLE" entries of SCHEMA_TEXT_TABLES
+schema_registry = SchemaRegistry(text_tables=[
+    tuple(name.strip().split('.', 1))
+    for name in os.getenv('SCHEMA_TEXT_TABLES', 'DBUSER.TCM_SAMPLE').split(',') if name.strip()
+])
+
+# Background jobs (cluster refresh) run on their own connections, one at a time per worker
+job_runner = JobRunner(connect_to_hana, schema_registry, max_workers=1)
+
+# Optional in-process ANN mirror of the advisory and comment embeddings for compare_text_to_existing
+ann_mirror = None
+if os.getenv('ANN_INDEX_ENABLED', 'false').lower() == 'true':
+    ann_mirror = AnnMirror(
+        connect_to_hana,
+        schema_name=os.getenv('ANN_INDEX_SCHEMA', 'DBUSER'),
+        sources={
+            'ADVISORIES4': {"key": "index", "text": "solution", "vector": "solution_embedding"},
+            'COMMENTS4': {"key": "index", "text": "comment", "vector": "comment_embedding"}
+        },
+        n_probe=int(os.getenv('ANN_INDEX_NPROBE', '8')),
+        refresh_seconds=float(os.getenv('ANN_INDEX_REFRESH_SECONDS', '60')),
+        max_staleness_seconds=float(os.getenv('ANN_INDEX_MAX_STALENESS_SECONDS', '300')),
+        rebuild_seconds=float(os.getenv('ANN_INDEX_REBUILD_SECONDS', '3600'))
+    )
+
+# Optional memory-mapped snapshot of the embedding columns, exported by POST /embedding_snapshot
+# into EMBEDDING_SNAPSHOT_DIR and shared read-only by every worker
+SNAPSHOT_SCHEMA = os.getenv('EMBEDDING_SNAPSHOT_SCHEMA', 'DBUSER')
+SNAPSHOT_SOURCES = [
+    {"table": f'{SNAPSHOT_SCHEMA}.ADVISORIES4', "key": "index", "vector": "solution_embedding"},
+    {"table": f'{SNAPSHOT_SCHEMA}.COMMENTS4', "key": "index", "vector": "comment_embedding"}
+]
+embedding_snapshot = None
+if os.getenv('EMBEDDING_SNAPSHOT_DIR'):
+    embedding_snapshot = EmbeddingSnapshot(
+        os.getenv('EMBEDDING_SNAPSHOT_DIR'),
+        max_age_seconds=float(os.getenv('EMBEDDING_SNAPSHOT_MAX_AGE_SECONDS', '86400')),
+        oversample=int(os.getenv('EMBEDDING_SNAPSHOT_OVERSAMPLE', '4'))
+    )
 
 app = Flask(__name__)
+app.json = InstrumentedJSONProvider(app)
 CORS(app)
 
-# Function to create the CATEGORIES table if it doesn't exist
-def create_categories_table_if_not_exists():
-    create_table_sql = """
-        DO BEGIN
-            DECLARE table_exists INT;
-            
-            -- Check and create CATEGORIES table
-            SELECT COUNT(*) INTO table_exists
-            FROM SYS.TABLES 
-            WHERE TABLE_NAME = 'CATEGORIES' AND SCHEMA_NAME = CURRENT_SCHEMA;
-            
-            IF table_exists = 0 THEN
-                CREATE TABLE CATEGORIES (
-                    "index" INTEGER,
-                    "category_label" NVARCHAR(100),
-                    "category_descr" NVARCHAR(5000),
-                    "category_embedding" REAL_VECTOR 
-                        GENERATED ALWAYS AS VECTOR_EMBEDDING("category_descr", 'DOCUMENT', 'SAP_NEB.20240715')
-                );
-            END IF;
-        END;
-    """
-    
-    # Use cursor to execute the query
-    cursor = connection.connection.cursor()
-    cursor.execute(create_table_sql)
-    cursor.close()
-    
-# Function to create the PROJECT_BY_CATEGORY table if it doesn't exist
-def create_project_by_category_table_if_not_exists():
-    create_table_sql = """
-        DO BEGIN
-            DECLARE table_exists INT;
-            
-            -- Check and create PROJECT_BY_CATEGORY table
-            SELECT COUNT(*) INTO table_exists
-            FROM SYS.TABLES 
-            WHERE TABLE_NAME = 'PROJECT_BY_CATEGORY' AND SCHEMA_NAME = CURRENT_SCHEMA;
-            
-            IF table_exists = 0 THEN
-                CREATE TABLE PROJECT_BY_CATEGORY (
-                    PROJECT_ID INT,
-                    CATEGORY_ID INT
-                );
-            END IF;
-        END;
-    """
-    
-    # Use cursor to execute the query
-    cursor = connection.connection.cursor()
-    cursor.execute(create_table_sql)
-    cursor.close()  
-    
+# Collect per-route round trips, DB time, rows fetched and serialization time
+@app.before_request
+def start_request_metrics():
+    metrics.start_request(request.url_rule.rule if request.url_rule else 'unmatched')
+
+@app.teardown_request
+def finish_request_metrics(exception):
+    metrics.finish_request()
+
+# Check out one pooled connection per request, on first use. The first connection of a worker
+# also creates the static and SCHEMA_TEXT_TABLES tables in one round trip
+def get_connection():
+    if 'hana_connection' not in g:
+        g.hana_connection = pool.acquire()
+        schema_registry.bootstrap(g.hana_connection)
+    return g.hana_connection
+
+# Return the request's connection to the pool once the request is done
+@app.teardown_appcontext
+def release_connection(exception):
+    connection = g.pop('hana_connection', None)
+    if connection is not None:
+        pool.release(connection)
+
+# Connection for reading the data versions; their table is ensured with the other static tables
+def get_connection_with_tables():
+    connection = get_connection()
+    schema_registry.ensure_static_tables(connection)
+    return connection
+
+# Read routes are cached per worker until refresh_clusters or update_categories_and_projects bump their data set
+data_versions = DataVersions(check_seconds=float(os.getenv('DATA_VERSION_CHECK_SECONDS', '2')))
+response_cache = ResponseCache(data_versions, get_connection_with_tables,
+                               max_entries=int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '256')))
+
+# Top-N categories per advisory with their scores; best categories below the threshold are unassigned
+category_scorer = CategoryScorer(top_n=int(os.getenv('CATEGORY_TOP_N', '3')),
+                                 min_similarity=float(os.getenv('CATEGORY_MIN_SIMILARITY', '0')))
+
+# Identical concurrent requests to the opted-in routes share one execution
+coalescer = RequestCoalescer(enabled=os.getenv('REQUEST_COALESCING', 'true').lower() == 'true',
+                             wait_seconds=float(os.getenv('REQUEST_COALESCING_WAIT_SECONDS', '30')))
+
+# A forked worker must not use the parent's sockets or job threads
+def reset_after_fork():
+    startup_report.after_fork()
+    pool.reset_after_fork()
+    job_runner.reset_after_fork()
+
+os.register_at_fork(after_in_child=reset_after_fork)
+
+@app.errorhandler(PoolTimeout)
+def handle_pool_timeout(e):
+    return jsonify({"error": str(e)}), 503
+
 @app.route('/update_categories_and_projects', methods=['POST'])
 def update_categories_and_projects():
+    connection = get_connection()
+    
     data = request.get_json()
     categories = data
     
     if not categories:
         return jsonify({"error": "No categories provided"}), 400
     
-    cursor = connection.connection.cursor()
-    
-    # Ensure the CATEGORIES table exists
-    create_categories_table_if_not_exists()
+    # The CATEGORIES, PROJECT_BY_CATEGORY and score tables are created once per process
+    schema_registry.ensure_static_tables(connection)
     
-    # Drop existing values from the CATEGORIES table
-    cursor.execute("TRUNCATE TABLE CATEGORIES")
+    # Only added, edited and removed categories are scored; full=true recomputes the whole matrix
+    full = request.args.get('full', 'false').lower() == 'true'
     
-    # Ensure the PROJECT_BY_CATEGORY table exists
-    create_project_by_category_table_if_not_exists()
+    # Re-create the tables and retry once if one was dropped since startup
+    summary = schema_registry.retry_if_table_missing(
+        connection, lambda: category_scorer.sync_categories(connection, categories, full=full)
+    )
+    print(f"Updated categories: {summary}")
     
-    # Drop existing values from the PROJECT_BY_CATEGORY table
-    cursor.execute("TRUNCATE TABLE PROJECT_BY_CATEGORY")
+    # Invalidate the cached category responses in every worker
+    data_versions.bump(connection, 'categories')
     
-    # Add custom categories to the CATEGORIES table
-    for index, (title, description) in enumerate(categories.items()):
-        insert_sql = f"""
-            INSERT INTO CATEGORIES ("index", "category_label", "category_descr")
-            VALUES ({index}, '{title.replace("'", "''")}', '{description.replace("'", "''")}')
-        """
-        cursor.execute(insert_sql)
-    
-    # Retrieve categories from the CATEGORIES table
-    categories_df = dataframe.DataFrame(connection, 'SELECT * FROM CATEGORIES')
-    
-    # Retrieve topics from the ADVISORIES table
-    advisories_df = dataframe.DataFrame(connection, 'SELECT "project_number", "topic" FROM ADVISORIES4')
+    return jsonify({"message": "Categories and project categories updated successfully", **summary}), 200
+
+# Score the advisories added to ADVISORIES4 since the last update against the existing categories
+@app.route('/score_new_projects', methods=['POST'])
+def score_new_projects():
+    connection = get_connection()
+    schema_registry.ensure_static_tables(connection)
     
-    # Iterate over each advisory and calculate the most similar category
-    for advisory in advisories_df.collect().to_dict(orient='records'):
-        # print("Advisory columns:", advisory.keys())
-        project_number = advisory['project_number']
-        topic = advisory['topic']
-        
-        # Check if project_number is an integer
-        if not isinstance(project_number, int):
-            print(f"Skipping project_number={project_number} as it is not an integer")
-            continue
-    
-        similarities = []
-        # Iterate over each category and calculate the similarity
-        for category in categories_df.collect().to_dict(orient='records'):
-
-            category_id = category['index']
-            category_description = category['category_descr']
-            
-            # Use HANA SQL for COSINE similarity
-            similarity_sql = f"""
-                SELECT COSINE_SIMILARITY(
-                    VECTOR_EMBEDDING('{topic.replace("'", "''")}', 'DOCUMENT', 'SAP_NEB.20240715'),
-                    VECTOR_EMBEDDING('{category_description.replace("'", "''")}', 'DOCUMENT', 'SAP_NEB.20240715')
-                ) AS similarity
-                FROM DUMMY
-            """
-
-            similarity_df = dataframe.DataFrame(connection, similarity_sql)
-            similarity_results = similarity_df.collect()
-            
-            if not similarity_results.empty:
-                similarity = similarity_results.iloc[0]['SIMILARITY']
-                similarities.append((category_id, similarity))
-            else:
-                print(f"No similarity result for category_id={category_id} and topic={topic}")
-
-        # Find the most similar category
-        if similarities:
-            most_similar_category = max(similarities, key=lambda x: x[1])
-            category_id = most_similar_category[0]
-
-            # Update PROJECT_BY_CATEGORY table
-            insert_sql = f"""
-                INSERT INTO "PROJECT_BY_CATEGORY" ("PROJECT_ID", "CATEGORY_ID")
-                VALUES ('{project_number}', {category_id})
-            """
-            cursor.execute(insert_sql)
-        else:
-            print(f"No valid similarities found for project_number={project_number}")
+    scored = schema_registry.retry_if_table_missing(connection, lambda: category_scorer.score_new_advisories(connection))
+    if scored:
+        data_versions.bump(connection, 'categories')
+        # The new advisories are also new rows for the ANN mirror
+        if ann_mirror is not None:
+            ann_mirror.notify_insert(ann_mirror.schema_name, 'ADVISORIES4')
     
-    cursor.close()
-    return jsonify({"message": "Categories and project categories updated successfully"}), 200
+    return jsonify({"message": f"Scored {scored} new advisories", "scored": scored}), 200
 
 @app.route('/get_all_project_categories', methods=['GET'])
+@response_cache.cached('categories')
 def get_all_project_categories():
-    # SQL query to retrieve all records from the PROJECT_BY_CATEGORY table
-    sql_query = """
-        SELECT pbc."PROJECT_ID", c."category_label"
+    connection = get_connection()
+    
+    # SQL query to retrieve all records from the PROJECT_BY_CATEGORY table; projects below the
+    # similarity threshold have no category and are reported in the unassigned bucket
+    sql_query = f"""
+        SELECT pbc."PROJECT_ID", COALESCE(c."category_label", '{UNASSIGNED_LABEL}') AS "category_label"
         FROM "PROJECT_BY_CATEGORY" pbc
-        JOIN "CATEGORIES" c ON pbc."CATEGORY_ID" = c."index"
+        LEFT JOIN "CATEGORIES" c ON pbc."CATEGORY_ID" = c."index"
     """
+    try:
+        limit, after, stream = parse_pagination_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    # Stream all rows as NDJSON, or return one keyset page, when asked to
+    if stream:
+        return stream_ndjson(connection, sql_query, 'PROJECT_ID', after)
+    if limit is not None:
+        results, next_after = fetch_keyset_page(connection, sql_query, 'PROJECT_ID', limit, after)
+        return jsonify({"project_categories": results, "next_after": next_after}), 200
+    
     hana_df = dataframe.DataFrame(connection, sql_query)
-    project_categories = hana_df.collect()  # Return results as a pandas DataFrame
+    project_categories = timed_collect(hana_df)  # Return results as a pandas DataFrame
 
     # Convert results to a list of dictionaries for JSON response
     results = project_categories.to_dict(orient='records')
     return jsonify({"project_categories": results}), 200
 
+# Stored top-N categories and scores of one project, per advisory row
+@app.route('/get_project_category_scores', methods=['GET'])
+@response_cache.cached('categories')
+def get_project_category_scores():
+    connection = get_connection()
+    
+    project_number = request.args.get('project_number')
+    if not project_number:
+        return jsonify({"error": "Project number is required"}), 400
+    if not project_number.isdigit():
+        return jsonify({"error": "Project number must be an integer"}), 400
+    
+    results = fetch_records(connection, 'project_category_scores', (int(project_number),))
+    return jsonify({"category_scores": results, "top_n": category_scorer.top_n,
+                    "min_similarity": category_scorer.min_similarity}), 200
+
 @app.route('/get_categories', methods=['GET'])
+@response_cache.cached('categories')
 def get_categories():
+    connection = get_connection()
+    
     # SQL query to retrieve all records from the CATEGORIES table
     sql_query = """
         SELECT "index", "category_label", "category_descr"
         FROM "CATEGORIES"
     """
     hana_df = dataframe.DataFrame(connection, sql_query)
-    categories = hana_df.collect()  # Return results as a pandas DataFrame
+    categories = timed_collect(hana_df)  # Return results as a pandas DataFrame
 
     # Convert results to a list of dictionaries for JSON response
     results = categories.to_dict(orient='records')
@@ -204,207 +292,237 @@ def get_categories():
 
 @app.route('/get_advisories_by_expert_and_category', methods=['GET'])
 def get_advisories_by_expert_and_category():
+    connection = get_connection()
+    
     expert = request.args.get('expert')
     
     if not expert:
         return jsonify({"error": "Expert is required"}), 400
     
-    # SQL query to retrieve the number of advisories by expert and category
-    sql_query = f"""
-        SELECT c."category_label" AS category, COUNT(a."project_number") AS projects
-        FROM "PROJECT_BY_CATEGORY" pbc
-        JOIN "CATEGORIES" c ON pbc."CATEGORY_ID" = c."index"
-        JOIN "ADVISORIES4" a ON pbc."PROJECT_ID" = a."project_number"
-        WHERE a."architect" = '{expert.replace("'", "''")}'
-        GROUP BY c."category_label"
-    """
-    hana_df = dataframe.DataFrame(connection, sql_query)
-    advisories_by_category = hana_df.collect()  # Return results as a pandas DataFrame
-
-    # Convert results to a list of dictionaries for JSON response
-    results = advisories_by_category.to_dict(orient='records')
+    # Prepared query for the number of advisories by expert and category
+    results = fetch_records(connection, 'advisories_by_expert_and_category', (expert,))
     return jsonify({"advisories_by_category": results}), 200
 
-# Function to create the CLUSTERING table if it doesn't exist
-def create_clustering_table_if_not_exists():
-    create_table_sql = """
-        DO BEGIN
-            DECLARE table_exists INT;
-            SELECT COUNT(*) INTO table_exists
-            FROM SYS.TABLES 
-            WHERE TABLE_NAME = 'CLUSTERING' AND SCHEMA_NAME = CURRENT_SCHEMA;
-            
-            IF table_exists = 0 THEN
-                CREATE TABLE CLUSTERING (
-                    PROJECT_NUMBER NVARCHAR(255),
-                    x DOUBLE,
-                    y DOUBLE,
-                    CLUSTER_ID INT
-                );
-            END IF;
-            
-            -- Check and create CLUSTERING_DATA table
-            SELECT COUNT(*) INTO table_exists
-            FROM SYS.TABLES 
-            WHERE TABLE_NAME = 'CLUSTERING_DATA' AND SCHEMA_NAME = CURRENT_SCHEMA;
-            
-            IF table_exists = 0 THEN
-                CREATE TABLE CLUSTERING_DATA (
-                    CLUSTER_ID INT,
-                    CLUSTER_DESCRIPTION NVARCHAR(255),
-                    EMBEDDING REAL_VECTOR GENERATED ALWAYS AS VECTOR_EMBEDDING(CLUSTER_DESCRIPTION, 'DOCUMENT', 'SAP_NEB.20240715')
-                );
-            END IF;
-        END;
-    """
-    
-    # Use cursor to execute the query
-    cursor = connection.connection.cursor()
-    cursor.execute(create_table_sql)
-    cursor.close()  
-
-@app.route('/refresh_clusters', methods=['POST'])
-def refresh_clusters():
-    # # Retrieve start_date and end_date from URL arguments
-    # start_date = request.args.get('start_date', '1900-01-01')  # Default to '1900-01-01' if not provided
-    # end_date = request.args.get('end_date', datetime.now().strftime('%Y-%m-%d'))  # Default to current date if not provided
-    
-
-    # Retrieve start_date and end_date from the form data
-    start_date = request.form.get('start_date', '1900-01-01')  # Default to '1900-01-01' if not provided
-    end_date = request.form.get('end_date', datetime.now().strftime('%Y-%m-%d'))  # Default to current date if not provided
-    
-    # Ensure the CLUSTERING table exists
-    create_clustering_table_if_not_exists()
+# Pipeline run by the job runner for /refresh_clusters, on the job's own connection
+def run_refresh_clusters(connection, progress, start_date, end_date, mode='full', drift_threshold=1.5,
+                         refit_projection=False):
+    # Incremental mode places new projects with the persisted fit; it falls back
+    # to a full refit when there is no fit yet or the new projects drifted too far
+    if mode == 'incremental':
+        progress('incremental_assign', 0.0)
+        incremental = utilities_hana.assign_new_projects_to_clusters(
+                            connection,
+                            table_name='ADVISORIES4',
+                            result_table_name='CLUSTERING',
+                            n_components=64,
+                            start_date=start_date,
+                            end_date=end_date,
+                            drift_threshold=drift_threshold
+                        )
+        if not incremental["refit_required"]:
+            data_versions.bump(connection, 'clusters')
+            return {"mode": "incremental", **incremental}
     
     # Perform clustering and t-SNE on the ADVISORIES table
-    df_clusters, labels = kmeans_and_tsne(
+    df_clusters, labels = utilities_hana.kmeans_and_tsne(
                             connection,  ## Hana ConnectionContext
                             table_name='ADVISORIES4', 
                             result_table_name='CLUSTERING', 
                             n_components=64, 
                             perplexity= 5, ## perplexity for T-SNE algorithm  
                             start_date=start_date,
-                            end_date=end_date
+                            end_date=end_date,
+                            progress=progress,
+                            refit_projection=refit_projection
                         )
     
     # Insert the values of the "labels" variable into the CLUSTERING_DATA table
+    progress('store_labels', 0.95)
     cursor = connection.connection.cursor()
     
     # Delete previous clustering run
     cursor.execute("TRUNCATE TABLE CLUSTERING_DATA")
 
-    for cluster_id, cluster_description in labels.items():
-        insert_sql = f"""
-            INSERT INTO CLUSTERING_DATA (CLUSTER_ID, CLUSTER_DESCRIPTION)
-            VALUES ({cluster_id}, '{cluster_description.replace("'", "''")}')
-        """
-        cursor.execute(insert_sql)
+    cursor.executemany(
+        "INSERT INTO CLUSTERING_DATA (CLUSTER_ID, CLUSTER_DESCRIPTION) VALUES (?, ?)",
+        [(int(cluster_id), cluster_description) for cluster_id, cluster_description in labels.items()]
+    )
     cursor.close()
+    
+    # Invalidate the cached cluster responses in every worker
+    data_versions.bump(connection, 'clusters')
+    
+    return {"mode": "full", "clusters": len(labels)}
 
-    return jsonify({"message": "Clusters refreshed successfully"}), 200
+@app.route('/refresh_clusters', methods=['POST'])
+def refresh_clusters():
+    connection = get_connection()
+    
+    # Retrieve start_date and end_date from the form data
+    start_date = request.form.get('start_date', '1900-01-01')  # Default to '1900-01-01' if not provided
+    end_date = request.form.get('end_date', datetime.now().strftime('%Y-%m-%d'))  # Default to current date if not provided
+    mode = request.form.get('mode', 'full')  # 'full' refit or 'incremental' placement of new projects
+    drift_threshold = request.form.get('drift_threshold', '1.5')
+    refit_projection = request.form.get('refit_projection', 'false').lower() == 'true'  # fit CATPCA again
+    
+    if mode not in ('full', 'incremental'):
+        return jsonify({"error": "mode must be 'full' or 'incremental'"}), 400
+    try:
+        drift_threshold = float(drift_threshold)
+    except ValueError:
+        return jsonify({"error": "drift_threshold must be a positive number"}), 400
+    if not 0 < drift_threshold < float('inf'):
+        return jsonify({"error": "drift_threshold must be a positive number"}), 400
+    try:
+        datetime.strptime(start_date, '%Y-%m-%d')
+        datetime.strptime(end_date, '%Y-%m-%d')
+    except ValueError:
+        return jsonify({"error": "start_date and end_date must be YYYY-MM-DD"}), 400
+    
+    # The CLUSTERING tables are created once per process
+    schema_registry.ensure_static_tables(connection)
+    
+    # Start the pipeline in the background; a refresh for the same range that is
+    # already queued or running is reused instead of starting a duplicate
+    job_id, created = job_runner.submit(connection,
+                                        job_type='refresh_clusters',
+                                        params={"start_date": start_date, "end_date": end_date,
+                                                "mode": mode, "drift_threshold": drift_threshold,
+                                                "refit_projection": refit_projection},
+                                        fn=run_refresh_clusters)
+    
+    return jsonify({
+        "message": "Cluster refresh started" if created else "Cluster refresh already in progress",
+        "job_id": job_id,
+        "status_url": f"/refresh_clusters/{job_id}"
+    }), 202
+
+@app.route('/refresh_clusters/<job_id>', methods=['GET'])
+def get_refresh_clusters_status(job_id):
+    connection = get_connection()
+    
+    job = job_runner.get(connection, job_id)
+    if job is None:
+        return jsonify({"error": f"Job {job_id} not found"}), 404
+    return jsonify(job), 200
+
+# Pipeline run by the job runner for /embedding_snapshot
+def run_export_snapshot(connection, progress, dtype='int8'):
+    manifest = export_snapshot(connection, os.getenv('EMBEDDING_SNAPSHOT_DIR'), SNAPSHOT_SOURCES,
+                               dtype=dtype, progress=progress)
+    return {"version": manifest["version"],
+            "rows": {name: source["rows"] for name, source in manifest["sources"].items()}}
+
+@app.route('/embedding_snapshot', methods=['POST'])
+def create_embedding_snapshot():
+    connection = get_connection()
+    
+    dtype = request.form.get('dtype', 'int8')  # 'int8' or 'float16'
+    if embedding_snapshot is None:
+        return jsonify({"error": "EMBEDDING_SNAPSHOT_DIR is not configured"}), 404
+    if dtype not in SNAPSHOT_DTYPES:
+        return jsonify({"error": f"dtype must be one of {list(SNAPSHOT_DTYPES)}"}), 400
+    
+    # Export in the background; workers pick the new version up on their next check
+    job_id, created = job_runner.submit(connection,
+                                        job_type='export_snapshot',
+                                        params={"dtype": dtype},
+                                        fn=run_export_snapshot)
+    
+    return jsonify({
+        "message": "Snapshot export started" if created else "Snapshot export already in progress",
+        "job_id": job_id,
+        "status_url": f"/embedding_snapshot/{job_id}"
+    }), 202
+
+@app.route('/embedding_snapshot/<job_id>', methods=['GET'])
+def get_embedding_snapshot_status(job_id):
+    connection = get_connection()
+    
+    job = job_runner.get(connection, job_id)
+    if job is None or job["job_type"] != 'export_snapshot':
+        return jsonify({"error": f"Snapshot export {job_id} not found"}), 404
+    return jsonify(job), 200
+
+@app.route('/embedding_snapshot', methods=['GET'])
+def embedding_snapshot_stats():
+    if embedding_snapshot is None:
+        return jsonify({"error": "EMBEDDING_SNAPSHOT_DIR is not configured"}), 404
+    return jsonify(embedding_snapshot.stats()), 200
 
 @app.route('/get_clusters', methods=['GET'])
+@response_cache.cached('clusters')
 def get_clusters():
-    # Ensure the CLUSTERING table exists
-    create_clustering_table_if_not_exists()
+    connection = get_connection()
+    
+    # The CLUSTERING table is created once per process; a dropped table is re-created on the retry
+    schema_registry.ensure_static_tables(connection)
+    retry = schema_registry.retry_if_table_missing
     
     # Retrieve data from the CLUSTERING table
-    sql_query = "SELECT * FROM CLUSTERING"
+    sql_query = 'SELECT "x", "y", "CLUSTER_ID", "PROJECT_NUMBER" FROM CLUSTERING'
+    try:
+        limit, after, stream = parse_pagination_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    # Stream all rows as NDJSON, or return one keyset page, when asked to
+    if stream:
+        return retry(connection, lambda: stream_ndjson(connection, sql_query, 'PROJECT_NUMBER', after))
+    if limit is not None:
+        results, next_after = retry(connection, lambda: fetch_keyset_page(connection, sql_query, 'PROJECT_NUMBER', limit, after))
+        return jsonify({"clusters": results, "next_after": next_after}), 200
+    
     hana_df = dataframe.DataFrame(connection, sql_query)
-    clusters = hana_df.collect()  # Return results as a pandas DataFrame
+    clusters = retry(connection, lambda: timed_collect(hana_df))  # Return results as a pandas DataFrame
+    columns = ["x", "y", "CLUSTER_ID", "PROJECT_NUMBER"]
+    
+    # Arrow IPC via content negotiation, or column arrays with format=columnar
+    if wants_arrow(request):
+        return Response(to_arrow_ipc(clusters, columns), mimetype=ARROW_MIMETYPE)
+    if request.args.get('format') == 'columnar':
+        return jsonify(to_columnar(clusters, columns)), 200
     
     # Convert DataFrame to list of dictionaries
-    formatted_clusters = [
-        {
-            "x": row["x"],
-            "y": row["y"],
-            "CLUSTER_ID": row["CLUSTER_ID"],
-            "PROJECT_NUMBER": row["PROJECT_NUMBER"]
-        }
-        for _, row in clusters.iterrows()
-    ]
-    
-    return jsonify(formatted_clusters), 200
+    return jsonify(to_records(clusters, columns)), 200
 
 @app.route('/get_clusters_description', methods=['GET'])
+@response_cache.cached('clusters')
 def get_clusters_description():
-    # Ensure the CLUSTERING table exists
-    create_clustering_table_if_not_exists()
+    connection = get_connection()
     
-    # Retrieve data from the CLUSTERING table
+    # The CLUSTERING_DATA table is created once per process; a dropped table is re-created on the retry
+    schema_registry.ensure_static_tables(connection)
+    
+    # Retrieve data from the CLUSTERING_DATA table
     sql_query = "SELECT * FROM CLUSTERING_DATA"
     hana_df = dataframe.DataFrame(connection, sql_query)
-    clusters = hana_df.collect()  # Return results as a pandas DataFrame
+    clusters = schema_registry.retry_if_table_missing(connection, lambda: timed_collect(hana_df))  # Return results as a pandas DataFrame
     
     # Convert DataFrame to list of dictionaries
-    formatted_cluster_description = [
-        {
-            "CLUSTER_ID": row["CLUSTER_ID"],
-            "CLUSTER_DESCRIPTION": row["CLUSTER_DESCRIPTION"]
-        }
-        for _, row in clusters.iterrows()
-    ]
+    formatted_cluster_description = to_records(clusters, ["CLUSTER_ID", "CLUSTER_DESCRIPTION"])
     
     return jsonify(formatted_cluster_description), 200
 
 @app.route('/get_projects_by_architect_and_cluster', methods=['GET'])
+@response_cache.cached('clusters')
 def get_projects_by_architect_and_cluster():
+    connection = get_connection()
+    
     # Retrieve the architect parameter from the URL
     expert = request.args.get('expert')
     
-    # Base SQL query
-    sql_query = """
-        SELECT a."architect", c."CLUSTER_ID", COUNT(a."project_number") AS project_count
-        FROM "CLUSTERING" c
-        JOIN "ADVISORIES4" a ON c."PROJECT_NUMBER" = a."project_number"
-    """
-    
-    # Add WHERE clause if architect is provided
+    # Prepared query, filtered by architect if one is provided
     if expert:
-        sql_query += f"""
-        WHERE a."architect" = '{expert.replace("'", "''")}'
-        """
-    
-    # Add GROUP BY clause
-    sql_query += """
-        GROUP BY a."architect", c."CLUSTER_ID"
-    """
-    
-    hana_df = dataframe.DataFrame(connection, sql_query)
-    projects_by_architect_and_cluster = hana_df.collect()  # Return results as a pandas DataFrame
-
-    # Convert results to a list of dictionaries for JSON response
-    results = projects_by_architect_and_cluster.to_dict(orient='records')
+        results = fetch_records(connection, 'projects_by_cluster_for_architect', (expert,))
+    else:
+        results = fetch_records(connection, 'projects_by_architect_and_cluster')
     return jsonify({"projects_by_architect_and_cluster": results}), 200
 
-# Step 2: Function to create the table if it doesn't exist
-def create_table_if_not_exists(schema_name, table_name):
-    create_table_sql = f"""
-        DO BEGIN
-            DECLARE table_exists INT;
-            SELECT COUNT(*) INTO table_exists
-            FROM SYS.TABLES 
-            WHERE TABLE_NAME = '{table_name.upper()}' AND SCHEMA_NAME = '{schema_name.upper()}';
-            
-            IF table_exists = 0 THEN
-                CREATE TABLE {schema_name}.{table_name} (
-                    TEXT_ID INT GENERATED BY DEFAULT AS IDENTITY,
-                    TEXT NVARCHAR(5000),
-                    EMBEDDING REAL_VECTOR GENERATED ALWAYS AS VECTOR_EMBEDDING(TEXT, 'DOCUMENT', 'SAP_NEB.20240715')
-                );
-            END IF;
-        END;
-    """
-    
-    # Use cursor to execute the query
-    cursor = connection.connection.cursor()
-    cursor.execute(create_table_sql)
-    cursor.close()  
-    
 # Step 3: Function to insert text and its embedding vector into the "TCM_SAMPLE" table
 @app.route('/insert_text_and_vector', methods=['POST'])
 def insert_text_and_vector():
+    connection = get_connection()
 
     data = request.get_json()
     schema_name = data.get('schema_name', 'DBUSER')  # Default schema
@@ -413,88 +531,229 @@ def insert_text_and_vector():
     # text_type = data.get('text_type', 'DOCUMENT')
     # model_version = data.get('model_version', 'SAP_NEB.20240715')
 
-    # Create the table if it doesn't exist
-    create_table_if_not_exists(schema_name, table_name)
-    
-    # Generate the embedding vector using VECTOR_EMBEDDING
-    sql_insert = f"""
-        INSERT INTO {schema_name}.{table_name} (TEXT) SELECT '{text}' FROM DUMMY
-    """
+    # Create the table on its first use in this process
+    try:
+        schema_registry.ensure_text_table(connection, schema_name, table_name)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
-    # Use cursor to execute the query
-    cursor = connection.connection.cursor()
-    cursor.execute(sql_insert)
-    cursor.close()  
+    # Insert the text with a prepared statement; the EMBEDDING column is generated by VECTOR_EMBEDDING
+    schema_registry.retry_if_table_missing(
+        connection,
+        lambda: execute_statement(connection, 'insert_text', (text,), schema=schema_name, table=table_name),
+        text_table=(schema_name, table_name)
+    )
     
     return jsonify({"message": f"Text inserted successfully into {schema_name}.{table_name}"}), 200
 
+# Bulk variant of insert_text_and_vector: a JSON array, {"texts": [...]} or an NDJSON upload
+@app.route('/insert_texts_and_vectors', methods=['POST'])
+def insert_texts_and_vectors():
+    connection = get_connection()
+    
+    try:
+        texts, schema_name, table_name, batch_size = parse_ingest_payload(request)
+        
+        # Create the table on its first use in this process
+        schema_registry.ensure_text_table(connection, schema_name, table_name)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    # Insert in executemany batches inside one transaction and collect the generated TEXT_IDs
+    started = time.perf_counter()
+    text_ids, batches = schema_registry.retry_if_table_missing(
+        connection,
+        lambda: insert_texts(connection, schema_name, table_name, texts, batch_size),
+        text_table=(schema_name, table_name)
+    )
+    seconds = time.perf_counter() - started
+    
+    return jsonify({
+        "message": f"{len(text_ids)} texts inserted successfully into {schema_name}.{table_name}",
+        "text_ids": text_ids,
+        "batches": batches,
+        "rows_per_second": round(len(text_ids) / seconds, 1) if seconds else None
+    }), 200
+
 # Function to compare a new text's vector to existing stored vectors using COSINE_SIMILARITY
 @app.route('/compare_text_to_existing', methods=['POST'])
+@coalescer.coalesced()
 def compare_text_to_existing():
+    connection = get_connection()
+    
     data = request.get_json()
     schema_name = data.get('schema_name', 'DBUSER')  # Default schema
     query_text = data.get('query_text')
     text_type = data.get('text_type', 'QUERY')
     model_version = data.get('model_version', 'SAP_NEB.20240715')
     
+    # Optional metadata filters, applied before the vector scan, and result size; empty values are no filter
+    start_date = data.get('start_date') or None
+    end_date = data.get('end_date') or None
+    architect = data.get('architect') or None
+    category = data.get('category') or None
+    k = data.get('k', 5)
+    min_similarity = data.get('min_similarity')
+    
     if not query_text:
         return jsonify({"error": "Query text is required"}), 400
-    
-    # Generate the new text's embedding and compare using COSINE_SIMILARITY
-    sql_query = f"""
-        SELECT "solution" AS text,
-               "project_number", 
-               COSINE_SIMILARITY(
-                   "solution_embedding", 
-                   VECTOR_EMBEDDING('{query_text}', '{text_type}', '{model_version}')
-               ) AS similarity
-        FROM {schema_name}.ADVISORIES4
-        UNION ALL
-        SELECT "comment" AS text, 
-               "project_number", 
-               COSINE_SIMILARITY(
-                   "comment_embedding", 
-                   VECTOR_EMBEDDING('{query_text}', '{text_type}', '{model_version}')
-               ) AS similarity
-        FROM {schema_name}.COMMENTS4
-        ORDER BY similarity DESC
-        LIMIT 5
-    """
-    hana_df = dataframe.DataFrame(connection, sql_query)
-    similarities = hana_df.collect()  # Return results as a pandas DataFrame
-
-    # Convert results to a list of dictionaries for JSON response
-    results = similarities.to_dict(orient='records')
+    # Validated once here, since the ANN and snapshot paths use them without going through SQL
+    if not isinstance(k, int) or isinstance(k, bool) or not 1 <= k <= MAX_SIMILARITY_K:
+        return jsonify({"error": f"k must be an integer between 1 and {MAX_SIMILARITY_K}"}), 400
+    if min_similarity is not None:
+        try:
+            min_similarity = float(min_similarity)
+        except (TypeError, ValueError):
+            return jsonify({"error": "min_similarity must be a number"}), 400
+    try:
+        for date in (start_date, end_date):
+            if date is not None:
+                datetime.strptime(date, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        return jsonify({"error": "start_date and end_date must be YYYY-MM-DD"}), 400
+    
+    # Embed the query text once (cached across requests) and bind it to both arms
+    try:
+        query_vector = get_query_embedding(connection, query_text, text_type, model_version)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    # Answer from the in-process ANN mirror when it is enabled and fresh; it has no metadata to filter on
+    filtered = any(value is not None for value in (start_date, end_date, architect, category))
+    if ann_mirror is not None and not filtered and schema_name.upper() == ann_mirror.schema_name.upper():
+        results = ann_mirror.search(query_vector, k=k)
+        if results is not None:
+            if min_similarity is not None:
+                results = [row for row in results if row["SIMILARITY"] >= min_similarity]
+            return jsonify({"similarities": results}), 200
+    
+    # Or from the memory-mapped snapshot: quantized scan, then exact rerank of the candidates in HANA
+    if embedding_snapshot is not None and not filtered and schema_name.upper() == SNAPSHOT_SCHEMA.upper():
+        results = search_texts(connection, embedding_snapshot, [
+            (f'{SNAPSHOT_SCHEMA}.ADVISORIES4.solution_embedding', f'{SNAPSHOT_SCHEMA}.ADVISORIES4', 'index', 'solution'),
+            (f'{SNAPSHOT_SCHEMA}.COMMENTS4.comment_embedding', f'{SNAPSHOT_SCHEMA}.COMMENTS4', 'index', 'comment')
+        ], query_vector, k=k, min_similarity=min_similarity)
+        if results is not None:
+            return jsonify({"similarities": results}), 200
+    
+    # Compare the bound query vector to the stored embeddings using COSINE_SIMILARITY, top k per table
+    try:
+        results = similarity_search(connection, schema_name, query_vector, k=k, min_similarity=min_similarity,
+                                    start_date=start_date, end_date=end_date, architect=architect, category=category)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     return jsonify({"similarities": results}), 200
 
+# Top-k vector search for many queries in one round trip, e.g. for evaluation jobs
+@app.route('/vector_search_batch', methods=['POST'])
+def vector_search_batch():
+    connection = get_connection()
+    
+    data = request.get_json()
+    queries = data.get('queries')
+    k = data.get('k', 5)
+    table_name = data.get('table_name', 'ADVISORIES4')
+    vector_col = data.get('vector_col', 'solution_embedding')
+    columns = data.get('columns', ['project_number', 'solution'])
+    
+    if not isinstance(queries, list) or not queries or not all(isinstance(q, str) and q for q in queries):
+        return jsonify({"error": "queries must be a non-empty list of strings"}), 400
+    if len(queries) > 500:
+        return jsonify({"error": "At most 500 queries per request"}), 400
+    if not isinstance(k, int) or isinstance(k, bool) or k < 1 or k > 100:
+        return jsonify({"error": "k must be between 1 and 100"}), 400
+    if not isinstance(columns, list) or not columns:
+        return jsonify({"error": "columns must be a non-empty list of column names"}), 400
+    # Table and column names are quoted into the statement, so only accept plain identifiers
+    if not all(isinstance(name, str) and IDENTIFIER_PATTERN.match(name) for name in [table_name, vector_col] + columns):
+        return jsonify({"error": "Invalid table or column name"}), 400
+    
+    results = utilities_hana.run_vector_search_batch(connection, queries, k, table_name, vector_col, columns)
+    
+    return jsonify({"results": [
+        {"query": query, "matches": [dict(zip(columns + ["COSINE_SIMILARITY"], row)) for row in rows]}
+        for query, rows in zip(queries, results)
+    ]}), 200
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    gauges = {f"api_pool_{name}": value for name, value in pool.stats().items()}
+    gauges.update({f"api_embedding_cache_{name}": value for name, value in query_embedding_cache.stats().items()})
+    gauges.update({f"api_response_cache_{name}": value for name, value in response_cache.stats().items()})
+    gauges.update({f"api_coalescing_{name}": value for name, value in coalescer.stats().items() if name not in ('enabled', 'routes')})
+    return Response(metrics.render(gauges), mimetype='text/plain; version=0.0.4')
+
+@app.route('/pool_stats', methods=['GET'])
+def pool_stats():
+    return jsonify(pool.stats()), 200
+
+@app.route('/ann_index_stats', methods=['GET'])
+def ann_index_stats():
+    if ann_mirror is None:
+        return jsonify({"error": "ANN index is not enabled"}), 404
+    
+    # Recall@k of the approximate search against exact search over the same vectors
+    try:
+        k = int(request.args.get('k', 5))
+        samples = int(request.args.get('recall_samples', 50))
+    except ValueError:
+        return jsonify({"error": "k and recall_samples must be integers"}), 400
+    if not 1 <= k <= MAX_SIMILARITY_K:
+        return jsonify({"error": f"k must be between 1 and {MAX_SIMILARITY_K}"}), 400
+    if not 1 <= samples <= MAX_RECALL_SAMPLES:
+        return jsonify({"error": f"recall_samples must be between 1 and {MAX_RECALL_SAMPLES}"}), 400
+    stats = ann_mirror.stats()
+    stats["recall"] = ann_mirror.recall(k=k, samples=samples)
+    return jsonify(stats), 200
+
+@app.route('/schema_stats', methods=['GET'])
+def schema_stats():
+    return jsonify(schema_registry.stats()), 200
+
+@app.route('/response_cache_stats', methods=['GET'])
+def response_cache_stats():
+    return jsonify(response_cache.stats()), 200
+
+@app.route('/coalescing_stats', methods=['GET'])
+def coalescing_stats():
+    return jsonify(coalescer.stats()), 200
+
+@app.route('/startup_report', methods=['GET'])
+def get_startup_report():
+    return jsonify(startup_report.as_dict()), 200
+
+@app.route('/embedding_cache_stats', methods=['GET'])
+def embedding_cache_stats():
+    return jsonify(query_embedding_cache.stats()), 200
+
 @app.route('/get_project_details', methods=['GET'])
+@coalescer.coalesced()
 def get_project_details():
+    connection = get_connection()
+    
     schema_name = request.args.get('schema_name', 'DBUSER')
     project_number = request.args.get('project_number')
     
     if not project_number:
         return jsonify({"error": "Project number is required"}), 400
-    
-    # SQL query to join ADVISORIES and COMMENTS tables on project_number
-    sql_query = f"""
-        SELECT a."architect", a."index" AS advisories_index, a."pcb_number", a."project_date", 
-               a."project_number", a."solution", a."topic",
-               c."comment", c."comment_date", c."index" AS comments_index
-        FROM {schema_name}.advisories4 a
-        LEFT JOIN {schema_name}.COMMENTS4 c
-        ON a."project_number" = c."project_number"
-        WHERE a."project_number" = {project_number}
-    """
-    hana_df = dataframe.DataFrame(connection, sql_query)
-    project_details = hana_df.collect()  # Return results as a pandas DataFrame
-
-    # Convert results to a list of dictionaries for JSON response
-    results = project_details.to_dict(orient='records')
+    if not project_number.isdigit():
+        return jsonify({"error": "Project number must be an integer"}), 400
+    
+    # Prepared query joining ADVISORIES and COMMENTS tables on project_number
+    try:
+        results = fetch_records(connection, 'project_details', (int(project_number),), schema=schema_name)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     return jsonify({"project_details": results}), 200
 
 @app.route('/get_all_projects', methods=['GET'])
+@coalescer.coalesced()
 def get_all_projects():
+    connection = get_connection()
+    
     schema_name = request.args.get('schema_name', 'DBUSER')  # Default schema
+    if not IDENTIFIER_PATTERN.match(schema_name):
+        return jsonify({"error": f"Invalid identifier: {schema_name}"}), 400
     
     # SQL query to retrieve all data from ADVISORIES and COMMENTS tables
     sql_query = f"""
@@ -509,8 +768,20 @@ def get_all_projects():
         ) subquery
         WHERE row_num = 1
     """
+    try:
+        limit, after, stream = parse_pagination_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    # Stream all rows as NDJSON, or return one keyset page, when asked to
+    if stream:
+        return stream_ndjson(connection, sql_query, 'project_number', after)
+    if limit is not None:
+        results, next_after = fetch_keyset_page(connection, sql_query, 'project_number', limit, after)
+        return jsonify({"all_projects": results, "next_after": next_after}), 200
+    
     hana_df = dataframe.DataFrame(connection, sql_query)
-    all_projects = hana_df.collect()  # Return results as a pandas DataFrame
+    all_projects = timed_collect(hana_df)  # Return results as a pandas DataFrame
 
     # Convert results to a list of dictionaries for JSON response
     results = all_projects.to_dict(orient='records')
@@ -520,6 +791,11 @@ def get_all_projects():
 def root():
     return 'Embeddings API: Health Check Successfull.', 200
 
+# Everything above ran at import; report where the time went
+startup_report.stage('setup', stage_started)
+startup_report.ready()
+print(startup_report.summary())
+
 def create_app():
     return app
 
@@ -0,0 +1,280 @@
+UNASSIGNED_CATEGORY_ID = -1
+UNASSIGNED_LABEL = 'Unassigned'
+
+# Rows of the scratch table where the scored category ranks at least as high as the lowest stored
+# category, with ties going to the lower category index as in the full ranking
+BEATS_FLOOR = '(r."SCORE" > r."FLOOR_SCORE" OR (r."SCORE" = r."FLOOR_SCORE" AND {category_id} <= r."FLOOR_CATEGORY"))'
+
+# Rows of the scratch table whose advisory gets the scored category in its top N
+ENTERS = f'r."SCORE" IS NOT NULL AND (r."STORED_COUNT" < {{top_n}} OR {BEATS_FLOOR})'
+
+# Rows of the scratch table whose advisory must be scored against all categories again
+FALLEN = f'r."WAS_STORED" = 1 AND r."STORED_COUNT" >= {{top_n}} AND (r."SCORE" IS NULL OR NOT {BEATS_FLOOR})'
+
+
+class CategoryScorer:
+    """Keeps the top-N categories of every advisory, with their scores, up to date.
+
+    The full project x category matrix is only computed when there are no
+    scores yet or most categories changed. Otherwise:
+
+    - new ADVISORIES4 rows are scored against the existing category embeddings;
+    - an added or edited category is scored against every advisory once, and
+      enters or stays in an advisory's top N when it beats the lowest stored
+      score. Only advisories where it dropped out of the top N are scored
+      against all categories again, since their next best category is not
+      stored;
+    - a removed category is dropped, and the advisories that had it in their
+      top N are scored again.
+
+    PROJECT_BY_CATEGORY keeps one assignment per advisory: its best category,
+    or UNASSIGNED_CATEGORY_ID when that scores below ``min_similarity``. It is
+    rewritten only for the projects whose scores changed.
+    """
+
+    def __init__(self, top_n=3, min_similarity=0.0,
+                 advisories_table='ADVISORIES4',
+                 categories_table='CATEGORIES',
+                 scores_table='PROJECT_CATEGORY_SCORES',
+                 rescore_table='CATEGORY_RESCORE',
+                 assignments_table='PROJECT_BY_CATEGORY'):
+        if top_n < 1:
+            raise ValueError("top_n must be at least 1")
+        self.top_n = top_n
+        self.min_similarity = min_similarity
+        self.advisories_table = advisories_table
+        self.categories_table = categories_table
+        self.scores_table = scores_table
+        self.rescore_table = rescore_table
+        self.assignments_table = assignments_table
+
+    def _insert_top_n(self, cursor, advisory_filter=''):
+        # The stored "topic_embedding" and the generated "category_embedding" columns are
+        # compared directly, so no text is embedded again (ties go to the lowest category index)
+        cursor.execute(f"""
+            INSERT INTO "{self.scores_table}" ("ADVISORY_INDEX", "PROJECT_ID", "CATEGORY_ID", "SCORE")
+            SELECT "index", "project_number", "category_id", "score"
+            FROM (
+                SELECT a."index",
+                       a."project_number",
+                       c."index" AS "category_id",
+                       COSINE_SIMILARITY(a."topic_embedding", c."category_embedding") AS "score",
+                       ROW_NUMBER() OVER (
+                           PARTITION BY a."index"
+                           ORDER BY COSINE_SIMILARITY(a."topic_embedding", c."category_embedding") DESC,
+                                    c."index" ASC
+                       ) AS rn
+                FROM "{self.advisories_table}" a
+                CROSS JOIN "{self.categories_table}" c
+                WHERE a."project_number" IS NOT NULL
+                  AND a."topic_embedding" IS NOT NULL
+                  {advisory_filter}
+            ) ranked
+            WHERE rn <= {self.top_n}
+        """)
+        return cursor.rowcount
+
+    def _reassign(self, cursor, projects=None):
+        """Rewrite PROJECT_BY_CATEGORY from the stored scores, for all projects or those selected by ``projects``."""
+        if projects is None:
+            cursor.execute(f'DELETE FROM "{self.assignments_table}"')
+        else:
+            cursor.execute(f'DELETE FROM "{self.assignments_table}" WHERE "PROJECT_ID" IN ({projects})')
+        cursor.execute(f"""
+            INSERT INTO "{self.assignments_table}" ("PROJECT_ID", "CATEGORY_ID")
+            SELECT "PROJECT_ID", CASE WHEN "SCORE" >= ? THEN "CATEGORY_ID" ELSE {UNASSIGNED_CATEGORY_ID} END
+            FROM (
+                SELECT s."PROJECT_ID", s."CATEGORY_ID", s."SCORE",
+                       ROW_NUMBER() OVER (
+                           PARTITION BY s."ADVISORY_INDEX" ORDER BY s."SCORE" DESC, s."CATEGORY_ID" ASC
+                       ) AS rn
+                FROM "{self.scores_table}" s
+                {'' if projects is None else f'WHERE s."PROJECT_ID" IN ({projects})'}
+            ) ranked
+            WHERE rn = 1
+        """, (float(self.min_similarity),))
+        return cursor.rowcount
+
+    def _fill_rescore(self, cursor, category_id, removed=False):
+        # One row per scored advisory with the category's new score (NULL when it was removed), whether
+        # it was stored, the lowest ranked stored category and the number of stored categories;
+        # advisories without scores are left to score_new_advisories
+        cursor.execute(f'DELETE FROM "{self.rescore_table}"')
+        floors = f"""
+            SELECT "ADVISORY_INDEX", "SCORE" AS "FLOOR_SCORE", "CATEGORY_ID" AS "FLOOR_CATEGORY", "STORED_COUNT"
+            FROM (
+                SELECT "ADVISORY_INDEX", "SCORE", "CATEGORY_ID",
+                       COUNT(*) OVER (PARTITION BY "ADVISORY_INDEX") AS "STORED_COUNT",
+                       ROW_NUMBER() OVER (
+                           PARTITION BY "ADVISORY_INDEX" ORDER BY "SCORE" ASC, "CATEGORY_ID" DESC
+                       ) AS rn
+                FROM "{self.scores_table}"
+            ) ranked
+            WHERE rn = 1
+        """
+        if removed:
+            cursor.execute(f"""
+                INSERT INTO "{self.rescore_table}"
+                    ("ADVISORY_INDEX", "PROJECT_ID", "SCORE", "WAS_STORED", "FLOOR_SCORE", "FLOOR_CATEGORY", "STORED_COUNT")
+                SELECT s."ADVISORY_INDEX", s."PROJECT_ID", NULL, 1, f."FLOOR_SCORE", f."FLOOR_CATEGORY", f."STORED_COUNT"
+                FROM "{self.scores_table}" s
+                JOIN ({floors}) f ON f."ADVISORY_INDEX" = s."ADVISORY_INDEX"
+                WHERE s."CATEGORY_ID" = ?
+            """, (category_id,))
+        else:
+            cursor.execute(f"""
+                INSERT INTO "{self.rescore_table}"
+                    ("ADVISORY_INDEX", "PROJECT_ID", "SCORE", "WAS_STORED", "FLOOR_SCORE", "FLOOR_CATEGORY", "STORED_COUNT")
+                SELECT a."index",
+                       a."project_number",
+                       COSINE_SIMILARITY(a."topic_embedding", c."category_embedding"),
+                       CASE WHEN s."CATEGORY_ID" IS NULL THEN 0 ELSE 1 END,
+                       f."FLOOR_SCORE",
+                       f."FLOOR_CATEGORY",
+                       f."STORED_COUNT"
+                FROM "{self.advisories_table}" a
+                JOIN ({floors}) f ON f."ADVISORY_INDEX" = a."index"
+                JOIN "{self.categories_table}" c ON c."index" = ?
+                LEFT JOIN "{self.scores_table}" s
+                    ON s."ADVISORY_INDEX" = a."index" AND s."CATEGORY_ID" = c."index"
+                WHERE a."project_number" IS NOT NULL
+                  AND a."topic_embedding" IS NOT NULL
+            """, (category_id,))
+
+    def _apply_rescore(self, cursor, category_id):
+        """Merge the scratch table into the stored top N; returns the number of advisories scored in full."""
+        fallen = FALLEN.format(top_n=self.top_n, category_id=int(category_id))
+        enters = ENTERS.format(top_n=self.top_n, category_id=int(category_id))
+        cursor.execute(f'DELETE FROM "{self.scores_table}" WHERE "CATEGORY_ID" = ?', (category_id,))
+        cursor.execute(f"""
+            INSERT INTO "{self.scores_table}" ("ADVISORY_INDEX", "PROJECT_ID", "CATEGORY_ID", "SCORE")
+            SELECT r."ADVISORY_INDEX", r."PROJECT_ID", ?, r."SCORE"
+            FROM "{self.rescore_table}" r
+            WHERE {enters}
+        """, (category_id,))
+
+        # Advisories that already had N other categories drop their lowest ranked one
+        cursor.execute(f"""
+            DELETE FROM "{self.scores_table}"
+            WHERE EXISTS (
+                SELECT 1 FROM "{self.rescore_table}" r
+                WHERE r."ADVISORY_INDEX" = "{self.scores_table}"."ADVISORY_INDEX"
+                  AND r."FLOOR_CATEGORY" = "{self.scores_table}"."CATEGORY_ID"
+                  AND r."WAS_STORED" = 0
+                  AND r."STORED_COUNT" >= {self.top_n}
+                  AND {enters}
+            )
+        """)
+
+        # Advisories the category fell out of are scored against all categories again
+        cursor.execute(f"""
+            DELETE FROM "{self.scores_table}"
+            WHERE EXISTS (
+                SELECT 1 FROM "{self.rescore_table}" r
+                WHERE r."ADVISORY_INDEX" = "{self.scores_table}"."ADVISORY_INDEX" AND {fallen}
+            )
+        """)
+        cursor.execute(f'SELECT COUNT(*) FROM "{self.rescore_table}" r WHERE {fallen}')
+        rescored = cursor.fetchone()[0]
+        if rescored:
+            self._insert_top_n(cursor, f'AND a."index" IN (SELECT r."ADVISORY_INDEX" FROM "{self.rescore_table}" r WHERE {fallen})')
+
+        # Only projects with a changed top N get a new assignment
+        self._reassign(cursor, f'SELECT r."PROJECT_ID" FROM "{self.rescore_table}" r WHERE r."WAS_STORED" = 1 OR {enters}')
+        return rescored
+
+    def _transaction(self, connection, fn):
+        hdb = connection.connection
+        hdb.setautocommit(False)
+        cursor = hdb.cursor()
+        try:
+            # One writer at a time: the scratch table is shared
+            cursor.execute(f'LOCK TABLE "{self.scores_table}" IN EXCLUSIVE MODE')
+            result = fn(cursor)
+            hdb.commit()
+            return result
+        except Exception:
+            hdb.rollback()
+            raise
+        finally:
+            cursor.close()
+            hdb.setautocommit(True)
+
+    def score_all(self, cursor):
+        cursor.execute(f'DELETE FROM "{self.scores_table}"')
+        scored = self._insert_top_n(cursor)
+        assigned = self._reassign(cursor)
+        return scored, assigned
+
+    def sync_categories(self, connection, categories, full=False):
+        """Make CATEGORIES match ``categories`` ({label: description}) and update the scores.
+
+        Unchanged categories keep their index and scores. Returns a summary of
+        what was added, changed, removed and scored.
+        """
+        def sync(cursor):
+            cursor.execute(f'SELECT "index", "category_label", "category_descr" FROM "{self.categories_table}"')
+            existing = {label: (index, description) for index, label, description in cursor.fetchall()}
+            added = [label for label in categories if label not in existing]
+            changed = [label for label in categories if label in existing and existing[label][1] != categories[label]]
+            removed = [label for label in existing if label not in categories]
+
+            cursor.execute(f'SELECT COUNT(*) FROM "{self.scores_table}"')
+            has_scores = cursor.fetchone()[0] > 0
+            next_index = max((index for index, _ in existing.values()), default=-1) + 1
+            new_indexes = {label: next_index + position for position, label in enumerate(added)}
+
+            # Write CATEGORIES; the "category_embedding" column is generated on insert and update
+            if removed:
+                cursor.executemany(f'DELETE FROM "{self.categories_table}" WHERE "index" = ?',
+                                   [(existing[label][0],) for label in removed])
+            if changed:
+                cursor.executemany(f'UPDATE "{self.categories_table}" SET "category_descr" = ? WHERE "index" = ?',
+                                   [(categories[label], existing[label][0]) for label in changed])
+            if added:
+                cursor.executemany(f"""
+                    INSERT INTO "{self.categories_table}" ("index", "category_label", "category_descr")
+                    VALUES (?, ?, ?)
+                """, [(new_indexes[label], label, categories[label]) for label in added])
+
+            # Scoring one category costs about as much as one column of the full matrix
+            edits = len(added) + len(changed) + len(removed)
+            summary = {"added": added, "changed": changed, "removed": removed, "top_n": self.top_n,
+                       "min_similarity": self.min_similarity}
+            if full or not has_scores or edits >= len(categories):
+                scored, assigned = self.score_all(cursor)
+                return {**summary, "mode": "full", "scores": scored, "assigned": assigned}
+
+            rescored = 0
+            for label in removed:
+                self._fill_rescore(cursor, existing[label][0], removed=True)
+                rescored += self._apply_rescore(cursor, existing[label][0])
+            for label in changed + added:
+                category_id = existing[label][0] if label in existing else new_indexes[label]
+                self._fill_rescore(cursor, category_id)
+                rescored += self._apply_rescore(cursor, category_id)
+            return {**summary, "mode": "incremental", "advisories_rescored": rescored}
+
+        return self._transaction(connection, sync)
+
+    def score_new_advisories(self, connection):
+        """Score the advisories that have no stored categories yet; returns how many were scored."""
+        def score_new(cursor):
+            cursor.execute(f'DELETE FROM "{self.rescore_table}"')
+            cursor.execute(f"""
+                INSERT INTO "{self.rescore_table}" ("ADVISORY_INDEX", "PROJECT_ID", "WAS_STORED", "STORED_COUNT")
+                SELECT a."index", a."project_number", 0, 0
+                FROM "{self.advisories_table}" a
+                WHERE a."project_number" IS NOT NULL
+                  AND a."topic_embedding" IS NOT NULL
+                  AND NOT EXISTS (
+                      SELECT 1 FROM "{self.scores_table}" s WHERE s."ADVISORY_INDEX" = a."index"
+                  )
+            """)
+            new_advisories = cursor.rowcount
+            if new_advisories:
+                self._insert_top_n(cursor, f'AND a."index" IN (SELECT r."ADVISORY_INDEX" FROM "{self.rescore_table}" r)')
+                self._reassign(cursor, f'SELECT r."PROJECT_ID" FROM "{self.rescore_table}" r')
+            return new_advisories
+
+        return self._transaction(connection, score_new)
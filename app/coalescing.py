@@ -0,0 +1,109 @@
+import functools
+import json
+import threading
+
+from flask import Response, make_response, request
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class RequestCoalescer:
+    """Lets identical concurrent requests share one execution of a route.
+
+    Requests are keyed by route, normalized arguments (query string, JSON
+    body with sorted keys, form) and Accept header. The first request runs
+    the view; duplicates that arrive while it is in flight wait for it and
+    get a copy of its body, status and headers instead of querying HANA
+    themselves. An exception raised by the leader is raised in its waiters
+    too, so a failing query is not repeated by every duplicate. Streamed
+    responses are not shared, and a waiter whose leader took longer than
+    ``wait_seconds`` runs the view on its own.
+    Coalescing is per process, across the threads of one worker.
+    """
+
+    def __init__(self, enabled=True, wait_seconds=30.0):
+        self.enabled = enabled
+        self.wait_seconds = wait_seconds
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.routes = {}
+
+    def _count(self, route, name):
+        with self._lock:
+            counters = self.routes.setdefault(route, {"executions": 0, "coalesced": 0, "fallbacks": 0})
+            counters[name] += 1
+
+    @staticmethod
+    def _key():
+        if request.is_json:
+            body = json.dumps(request.get_json(silent=True), sort_keys=True, separators=(',', ':'))
+        else:
+            body = tuple(sorted(request.form.items(multi=True)))
+        return (request.method, request.path, tuple(sorted(request.args.items(multi=True))), body,
+                request.headers.get('Accept', ''))
+
+    def coalesced(self):
+        """Decorator opting a read-only route into coalescing."""
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self.enabled or request.args.get('format') == 'ndjson':
+                    return view(*args, **kwargs)
+
+                route = request.url_rule.rule
+                key = self._key()
+                with self._lock:
+                    flight = self._flights.get(key)
+                    leader = flight is None
+                    if leader:
+                        flight = self._flights[key] = _Flight()
+                    else:
+                        flight.waiters += 1
+
+                if leader:
+                    try:
+                        response = make_response(view(*args, **kwargs))
+                        if not response.is_streamed:
+                            flight.result = (response.get_data(), response.status_code,
+                                             [(name, value) for name, value in response.headers
+                                              if name.lower() != 'content-length'])
+                        return response
+                    except Exception as e:
+                        flight.error = e
+                        raise
+                    finally:
+                        with self._lock:
+                            del self._flights[key]
+                        flight.done.set()
+                        self._count(route, 'executions')
+
+                # Share the leader's result or error, or run the view if there is none to share
+                if flight.done.wait(self.wait_seconds) and (flight.result is not None or flight.error is not None):
+                    self._count(route, 'coalesced')
+                    if flight.error is not None:
+                        raise flight.error
+                    body, status, headers = flight.result
+                    return Response(body, status=status, headers=headers)
+                self._count(route, 'fallbacks')
+                return view(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def stats(self):
+        with self._lock:
+            routes = {route: dict(counters) for route, counters in self.routes.items()}
+            in_flight = len(self._flights)
+        return {
+            "enabled": self.enabled,
+            "in_flight": in_flight,
+            "executions": sum(counters["executions"] for counters in routes.values()),
+            "db_calls_saved": sum(counters["coalesced"] for counters in routes.values()),
+            "fallbacks": sum(counters["fallbacks"] for counters in routes.values()),
+            "routes": routes
+        }
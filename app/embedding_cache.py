@@ -0,0 +1,128 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Text types and model versions are inlined into VECTOR_EMBEDDING, so only accept known shapes
+VALID_TEXT_TYPES = ('QUERY', 'DOCUMENT')
+MODEL_VERSION_PATTERN = re.compile(r'^[A-Za-z0-9_.]+$')
+
+
+class EmbeddingCache:
+    """Thread-safe LRU cache with a size bound and a TTL for query embeddings."""
+
+    def __init__(self, max_size=1024, ttl_seconds=3600):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, stored_at = entry
+            if self.ttl_seconds and time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_ratio": self.hits / lookups if lookups else 0.0
+            }
+
+
+# Process-wide cache shared by every vector-search path
+query_embedding_cache = EmbeddingCache(
+    max_size=int(os.getenv('EMBEDDING_CACHE_SIZE', '1024')),
+    ttl_seconds=float(os.getenv('EMBEDDING_CACHE_TTL_SECONDS', '3600'))
+)
+
+
+# Return the embedding of a text as a REAL_VECTOR literal ('[0.1,0.2,...]'), embedding it in HANA only on a cache miss
+def get_query_embedding(connection, text, text_type='QUERY', model_version='SAP_NEB.20240715'):
+    if text_type not in VALID_TEXT_TYPES:
+        raise ValueError(f"Unsupported text_type: {text_type}")
+    if not MODEL_VERSION_PATTERN.match(model_version):
+        raise ValueError(f"Unsupported model_version: {model_version}")
+
+    key = (text, text_type, model_version)
+    vector = query_embedding_cache.get(key)
+    if vector is not None:
+        return vector
+
+    sql_embed = f"""
+        SELECT TO_NVARCHAR(VECTOR_EMBEDDING(?, '{text_type}', '{model_version}')) AS EMBEDDING
+        FROM DUMMY
+    """
+    cursor = connection.connection.cursor()
+    cursor.execute(sql_embed, (text,))
+    vector = cursor.fetchone()[0]
+    cursor.close()
+
+    query_embedding_cache.put(key, vector)
+    return vector
+
+
+# Batch variant of get_query_embedding: every text missing from the cache is embedded in one statement
+def get_query_embeddings(connection, texts, text_type='QUERY', model_version='SAP_NEB.20240715'):
+    if text_type not in VALID_TEXT_TYPES:
+        raise ValueError(f"Unsupported text_type: {text_type}")
+    if not MODEL_VERSION_PATTERN.match(model_version):
+        raise ValueError(f"Unsupported model_version: {model_version}")
+
+    vectors = {}
+    for text in texts:
+        vector = query_embedding_cache.get((text, text_type, model_version))
+        if vector is not None:
+            vectors[text] = vector
+
+    missing = list(dict.fromkeys(text for text in texts if text not in vectors))
+    if missing:
+        sql_embed = "\n            UNION ALL\n".join(
+            f"SELECT {i} AS POSITION, TO_NVARCHAR(VECTOR_EMBEDDING(?, '{text_type}', '{model_version}')) AS EMBEDDING FROM DUMMY"
+            for i in range(len(missing))
+        ) + "\n            ORDER BY POSITION"
+        cursor = connection.connection.cursor()
+        cursor.execute(sql_embed, tuple(missing))
+        for position, vector in cursor.fetchall():
+            vectors[missing[position]] = vector
+            query_embedding_cache.put((missing[position], text_type, model_version), vector)
+        cursor.close()
+
+    return [vectors[text] for text in texts]
@@ -0,0 +1,141 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out within the acquire timeout."""
+
+
+class HanaConnectionPool:
+    """Bounded pool of hana_ml ConnectionContext objects.
+
+    Connections are created lazily by the ``connect`` factory, validated on
+    borrow and transparently replaced when they turn out to be dead.
+    """
+
+    def __init__(self, connect, max_size=2, acquire_timeout=30, validate_after_idle=30):
+        self._connect = connect
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.validate_after_idle = validate_after_idle
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._in_use = 0
+
+        # Metrics
+        self.checkouts = 0
+        self.timeouts = 0
+        self.created = 0
+        self.reconnects = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def _is_alive(self, connection, idle_seconds):
+        try:
+            if not connection.connection.isconnected():
+                return False
+            # isconnected() only reflects client-side state, so ping connections that sat idle
+            if idle_seconds >= self.validate_after_idle:
+                cursor = connection.connection.cursor()
+                cursor.execute("SELECT 1 FROM DUMMY")
+                cursor.fetchone()
+                cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def acquire(self):
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            with self._lock:
+                self.timeouts += 1
+            raise PoolTimeout(f"No HANA connection available within {self.acquire_timeout}s")
+        waited = time.monotonic() - started
+
+        try:
+            connection = None
+            try:
+                connection, released_at = self._idle.get_nowait()
+            except queue.Empty:
+                pass
+
+            if connection is not None and not self._is_alive(connection, time.monotonic() - released_at):
+                self._discard(connection)
+                connection = None
+                with self._lock:
+                    self.reconnects += 1
+
+            if connection is None:
+                connection = self._connect()
+                with self._lock:
+                    self.created += 1
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._in_use += 1
+            self.checkouts += 1
+            self.total_wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        return connection
+
+    def release(self, connection, discard=False):
+        if discard:
+            self._discard(connection)
+        else:
+            self._idle.put((connection, time.monotonic()))
+        with self._lock:
+            self._in_use -= 1
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        connection = self.acquire()
+        try:
+            yield connection
+        finally:
+            self.release(connection)
+
+    def reset_after_fork(self):
+        """Forget connections inherited from the parent process without closing them.
+
+        Closing would send a disconnect on a socket the parent still uses;
+        the child opens its own connections on first use instead.
+        """
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.max_size)
+        self._lock = threading.Lock()
+        self._in_use = 0
+
+    def close_all(self):
+        while True:
+            try:
+                connection, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(connection)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_size": self.max_size,
+                "in_use": self._in_use,
+                "idle": self._idle.qsize(),
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "created": self.created,
+                "reconnects": self.reconnects,
+                "total_wait_seconds": self.total_wait_seconds,
+                "max_wait_seconds": self.max_wait_seconds,
+                "avg_wait_seconds": self.total_wait_seconds / self.checkouts if self.checkouts else 0.0
+            }
@@ -0,0 +1,87 @@
+import json
+import time
+
+DEFAULT_BATCH_SIZE = 500
+MAX_BATCH_SIZE = 5000
+MAX_TEXTS = 100000
+
+
+# Read the texts and options of a bulk ingestion request: a JSON array of texts, a JSON
+# object with "texts", or an NDJSON upload with one string or {"text": ...} per line
+def parse_ingest_payload(request):
+    options = dict(request.args)
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        texts = []
+        for line in request.get_data(as_text=True).splitlines():
+            if line.strip():
+                item = json.loads(line)
+                texts.append(item.get('text') if isinstance(item, dict) else item)
+    else:
+        data = request.get_json()
+        if isinstance(data, dict):
+            options.update({key: value for key, value in data.items() if key != 'texts'})
+            texts = data.get('texts')
+        else:
+            texts = data
+
+    if not isinstance(texts, list) or not texts:
+        raise ValueError("No texts provided")
+    if len(texts) > MAX_TEXTS:
+        raise ValueError(f"At most {MAX_TEXTS} texts per request")
+    if not all(isinstance(text, str) and text for text in texts):
+        raise ValueError("Every text must be a non-empty string")
+
+    try:
+        batch_size = int(options.get('batch_size', DEFAULT_BATCH_SIZE))
+    except TypeError:
+        batch_size = 0
+    if batch_size <= 0 or batch_size > MAX_BATCH_SIZE:
+        raise ValueError(f"batch_size must be between 1 and {MAX_BATCH_SIZE}")
+
+    # JSON bodies can carry any type; identifiers are matched against IDENTIFIER_PATTERN later
+    schema_name, table_name = options.get('schema_name', 'DBUSER'), options.get('table_name', 'TCM_SAMPLE')
+    for value in (schema_name, table_name):
+        if not isinstance(value, str):
+            raise ValueError(f"Invalid identifier: {value}")
+    return texts, schema_name, table_name, batch_size
+
+
+def insert_texts(connection, schema_name, table_name, texts, batch_size=DEFAULT_BATCH_SIZE):
+    """Insert texts with executemany batches in one transaction.
+
+    The table is locked for the transaction, so the identity values generated
+    for a batch are consecutive and end at CURRENT_IDENTITY_VALUE(); rows
+    inserted earlier with an explicit TEXT_ID do not affect them. Returns
+    the IDs in insertion order and one throughput entry per batch; the
+    EMBEDDING column is generated by VECTOR_EMBEDDING as each batch is inserted.
+    """
+    table = f"{schema_name}.{table_name}"
+    hdb = connection.connection
+    hdb.setautocommit(False)
+    cursor = hdb.cursor()
+    try:
+        cursor.execute(f"LOCK TABLE {table} IN EXCLUSIVE MODE")
+
+        text_ids, batches = [], []
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            started = time.perf_counter()
+            cursor.executemany(f"INSERT INTO {table} (TEXT) VALUES (?)", [(text,) for text in batch])
+            seconds = time.perf_counter() - started
+            cursor.execute("SELECT CURRENT_IDENTITY_VALUE() FROM DUMMY")
+            last_id = int(cursor.fetchone()[0])
+            text_ids.extend(range(last_id - len(batch) + 1, last_id + 1))
+            batches.append({
+                "rows": len(batch),
+                "seconds": round(seconds, 4),
+                "rows_per_second": round(len(batch) / seconds, 1) if seconds else None
+            })
+
+        hdb.commit()
+    except Exception:
+        hdb.rollback()
+        raise
+    finally:
+        cursor.close()
+        hdb.setautocommit(True)
+    return text_ids, batches
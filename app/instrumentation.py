@@ -0,0 +1,232 @@
+import os
+import threading
+import time
+from collections import defaultdict
+
+from flask.json.provider import DefaultJSONProvider
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500, 1000)
+ROWS_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000, 1000000)
+
+# Statements slower than this are printed with their SQL text; unset disables the log
+SLOW_QUERY_LOG_MS = os.getenv('SLOW_QUERY_LOG_MS')
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram, one series per label value."""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._counts = defaultdict(lambda: [0] * len(buckets))
+        self._sums = defaultdict(float)
+        self._totals = defaultdict(int)
+
+    def observe(self, route, value):
+        counts = self._counts[route]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+        self._sums[route] += value
+        self._totals[route] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for route in sorted(self._totals):
+            for bound, count in zip(self.buckets, self._counts[route]):
+                lines.append(f'{self.name}_bucket{{route="{route}",le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{route="{route}",le="+Inf"}} {self._totals[route]}')
+            lines.append(f'{self.name}_sum{{route="{route}"}} {self._sums[route]}')
+            lines.append(f'{self.name}_count{{route="{route}"}} {self._totals[route]}')
+        return lines
+
+
+class RequestStats:
+    def __init__(self, route):
+        self.route = route
+        self.started = time.perf_counter()
+        self.round_trips = 0
+        self.db_seconds = 0.0
+        self.fetch_seconds = 0.0
+        self.rows_fetched = 0
+        self.collect_seconds = 0.0
+        self.serialize_seconds = 0.0
+
+
+class Metrics:
+    """Per-route request metrics of this worker process.
+
+    Each uwsgi worker keeps its own registry, so a scrape of /metrics
+    reflects the worker that served it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.histograms = {
+            "request": Histogram('api_request_duration_seconds', 'Total request handling time', SECONDS_BUCKETS),
+            "db": Histogram('api_db_execute_seconds', 'Time spent executing SQL statements per request', SECONDS_BUCKETS),
+            "fetch": Histogram('api_db_fetch_seconds', 'Time spent fetching result rows per request', SECONDS_BUCKETS),
+            "collect": Histogram('api_collect_seconds', 'Time spent in DataFrame.collect() per request, including pandas conversion', SECONDS_BUCKETS),
+            "serialize": Histogram('api_serialize_seconds', 'Time spent serializing JSON per request', SECONDS_BUCKETS),
+            "round_trips": Histogram('api_db_round_trips', 'SQL statements executed per request', COUNT_BUCKETS),
+            "rows": Histogram('api_db_rows_fetched', 'Rows fetched from HANA per request', ROWS_BUCKETS),
+        }
+
+    @property
+    def current(self):
+        return getattr(self._local, 'stats', None)
+
+    def start_request(self, route):
+        self._local.stats = RequestStats(route)
+
+    def finish_request(self):
+        stats = self.current
+        if stats is None:
+            return
+        self._local.stats = None
+        with self._lock:
+            self.histograms["request"].observe(stats.route, time.perf_counter() - stats.started)
+            self.histograms["db"].observe(stats.route, stats.db_seconds)
+            self.histograms["fetch"].observe(stats.route, stats.fetch_seconds)
+            self.histograms["collect"].observe(stats.route, stats.collect_seconds)
+            self.histograms["serialize"].observe(stats.route, stats.serialize_seconds)
+            self.histograms["round_trips"].observe(stats.route, stats.round_trips)
+            self.histograms["rows"].observe(stats.route, stats.rows_fetched)
+
+    def render(self, gauges=None):
+        with self._lock:
+            lines = []
+            for histogram in self.histograms.values():
+                lines.extend(histogram.render())
+        # Point-in-time values such as pool and cache statistics
+        for name, value in (gauges or {}).items():
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def _record_statement(operation, started, rowcount=None):
+    elapsed = time.perf_counter() - started
+    stats = metrics.current
+    if stats is not None:
+        stats.round_trips += 1
+        stats.db_seconds += elapsed
+    if SLOW_QUERY_LOG_MS is not None and elapsed * 1000 >= float(SLOW_QUERY_LOG_MS):
+        route = stats.route if stats is not None else '-'
+        print(f"SLOW QUERY {elapsed * 1000:.1f} ms route={route} rowcount={rowcount}: {' '.join(operation.split())[:2000]}")
+
+
+def _record_fetch(started, rows):
+    stats = metrics.current
+    if stats is not None:
+        stats.fetch_seconds += time.perf_counter() - started
+        stats.rows_fetched += rows
+
+
+class InstrumentedCursor:
+    """hdbcli cursor proxy that times statements and fetches."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._cursor.close()
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def execute(self, operation, *args, **kwargs):
+        started = time.perf_counter()
+        result = self._cursor.execute(operation, *args, **kwargs)
+        _record_statement(operation, started, getattr(self._cursor, 'rowcount', None))
+        return result
+
+    def executemany(self, operation, *args, **kwargs):
+        started = time.perf_counter()
+        result = self._cursor.executemany(operation, *args, **kwargs)
+        _record_statement(operation, started, getattr(self._cursor, 'rowcount', None))
+        return result
+
+    def prepare(self, operation, *args, **kwargs):
+        started = time.perf_counter()
+        result = self._cursor.prepare(operation, *args, **kwargs)
+        self._prepared_operation = operation
+        _record_statement(operation, started)
+        return result
+
+    def executeprepared(self, *args, **kwargs):
+        started = time.perf_counter()
+        result = self._cursor.executeprepared(*args, **kwargs)
+        _record_statement(getattr(self, '_prepared_operation', ''), started, getattr(self._cursor, 'rowcount', None))
+        return result
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = self._cursor.fetchone()
+        _record_fetch(started, 0 if row is None else 1)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        started = time.perf_counter()
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        _record_fetch(started, len(rows))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = self._cursor.fetchall()
+        _record_fetch(started, len(rows))
+        return rows
+
+
+class InstrumentedConnection:
+    """hdbcli connection proxy whose cursors are instrumented."""
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._connection.cursor(*args, **kwargs))
+
+
+# Route every statement of a hana_ml ConnectionContext (including collect()) through the instrumented cursor
+def instrument_connection(connection_context):
+    connection_context.connection = InstrumentedConnection(connection_context.connection)
+    return connection_context
+
+
+# Time a DataFrame.collect() (statement, transfer and pandas conversion)
+def timed_collect(hana_df):
+    started = time.perf_counter()
+    result = hana_df.collect()
+    stats = metrics.current
+    if stats is not None:
+        stats.collect_seconds += time.perf_counter() - started
+    return result
+
+
+class InstrumentedJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that records how long jsonify() spends serializing."""
+
+    def dumps(self, obj, **kwargs):
+        started = time.perf_counter()
+        result = super().dumps(obj, **kwargs)
+        stats = metrics.current
+        if stats is not None:
+            stats.serialize_seconds += time.perf_counter() - started
+        return result
@@ -0,0 +1,208 @@
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+if 'VCAP_APPLICATION' in os.environ:
+    from app.schema import SchemaRegistry  # works in CF
+else:
+    from schema import SchemaRegistry  # works in local machine
+
+ACTIVE_STATUSES = ('QUEUED', 'RUNNING')
+
+
+class JobRunner:
+    """Runs long pipelines in background threads and tracks them in a HANA table.
+
+    Job state lives in HANA rather than in process memory, so any uwsgi worker
+    can answer a status poll and concurrent submissions of the same job are
+    coalesced across workers. Each running job uses its own connection from
+    the ``connect`` factory so it never holds a request pool slot.
+
+    The process that owns a queued or running job touches its UPDATED_AT every
+    ``heartbeat_seconds``. A job not touched for ``stale_after_seconds`` belongs
+    to a process that died, so it no longer blocks its coalesce key and is
+    marked FAILED by the next submission. The jobs table is created by the
+    ``schema_registry`` together with the API's other tables.
+    """
+
+    table_name = 'CLUSTERING_JOBS'
+
+    def __init__(self, connect, schema_registry=None, max_workers=1, stale_after_seconds=120,
+                 heartbeat_seconds=30):
+        self._connect = connect
+        self.schema_registry = schema_registry or SchemaRegistry()
+        self.stale_after_seconds = stale_after_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._lock = threading.Lock()
+        self._active = set()
+        self._active_lock = threading.Lock()
+        self._heartbeat_thread = None
+
+    def reset_after_fork(self):
+        # Worker threads do not survive a fork, so a child needs its own executor and heartbeat
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='job')
+        self._lock = threading.Lock()
+        self._active = set()
+        self._active_lock = threading.Lock()
+        self._heartbeat_thread = None
+
+    def _start_heartbeat(self):
+        with self._active_lock:
+            if self._heartbeat_thread is None:
+                self._heartbeat_thread = threading.Thread(target=self._heartbeat, name='job-heartbeat', daemon=True)
+                self._heartbeat_thread.start()
+
+    # Keep the jobs this process owns fresh, on a connection of its own
+    def _heartbeat(self):
+        while True:
+            time.sleep(self.heartbeat_seconds)
+            with self._active_lock:
+                job_ids = list(self._active)
+            if not job_ids:
+                continue
+            try:
+                connection = self._connect()
+                try:
+                    cursor = connection.connection.cursor()
+                    cursor.execute(f"""
+                        UPDATE {self.table_name} SET UPDATED_AT = CURRENT_UTCTIMESTAMP
+                        WHERE JOB_ID IN ({', '.join('?' for _ in job_ids)}) AND STATUS IN ('QUEUED', 'RUNNING')
+                    """, tuple(job_ids))
+                    cursor.close()
+                finally:
+                    connection.close()
+            except Exception as e:
+                print(f"Job heartbeat failed: {e}")
+
+    def submit(self, connection, job_type, params, fn):
+        """Queue ``fn(connection, progress, **params)`` unless an identical job is already active.
+
+        Returns ``(job_id, created)``; ``created`` is False when the request was
+        coalesced into a job that is already queued or running.
+        """
+        self.schema_registry.ensure_static_tables(connection)
+        coalesce_key = job_type + ':' + json.dumps(params, sort_keys=True)
+
+        with self._lock:
+            # Lock the jobs table so two workers cannot both start the same job
+            hdb = connection.connection
+            hdb.setautocommit(False)
+            cursor = hdb.cursor()
+            try:
+                cursor.execute(f"LOCK TABLE {self.table_name} IN EXCLUSIVE MODE")
+                cursor.execute(f"""
+                    UPDATE {self.table_name}
+                    SET STATUS = 'FAILED', ERROR = 'The worker running the job stopped responding'
+                    WHERE STATUS IN ('QUEUED', 'RUNNING')
+                      AND SECONDS_BETWEEN(UPDATED_AT, CURRENT_UTCTIMESTAMP) >= ?
+                """, (self.stale_after_seconds,))
+                cursor.execute(f"""
+                    SELECT TOP 1 JOB_ID FROM {self.table_name}
+                    WHERE COALESCE_KEY = ?
+                      AND STATUS IN ('QUEUED', 'RUNNING')
+                      AND SECONDS_BETWEEN(UPDATED_AT, CURRENT_UTCTIMESTAMP) < ?
+                    ORDER BY CREATED_AT DESC
+                """, (coalesce_key, self.stale_after_seconds))
+                row = cursor.fetchone()
+                if row:
+                    hdb.commit()
+                    return row[0], False
+
+                job_id = str(uuid.uuid4())
+                cursor.execute(f"""
+                    INSERT INTO {self.table_name}
+                        (JOB_ID, JOB_TYPE, COALESCE_KEY, PARAMS, STATUS, STAGE, PROGRESS, STAGES, CREATED_AT, UPDATED_AT)
+                    VALUES (?, ?, ?, ?, 'QUEUED', NULL, 0, '[]', CURRENT_UTCTIMESTAMP, CURRENT_UTCTIMESTAMP)
+                """, (job_id, job_type, coalesce_key, json.dumps(params)))
+                hdb.commit()
+            except Exception:
+                hdb.rollback()
+                raise
+            finally:
+                cursor.close()
+                hdb.setautocommit(True)
+
+        with self._active_lock:
+            self._active.add(job_id)
+        self._start_heartbeat()
+        self._executor.submit(self._run, job_id, fn, params)
+        return job_id, True
+
+    def _update(self, connection, job_id, **fields):
+        assignments = ', '.join(f"{column} = ?" for column in fields)
+        cursor = connection.connection.cursor()
+        cursor.execute(
+            f"UPDATE {self.table_name} SET {assignments}, UPDATED_AT = CURRENT_UTCTIMESTAMP WHERE JOB_ID = ?",
+            tuple(fields.values()) + (job_id,)
+        )
+        cursor.close()
+
+    def _run(self, job_id, fn, params):
+        connection = None
+        stages = []
+        current = {}
+
+        # Callback handed to the pipeline: marks the start of a stage and its overall progress (0-1)
+        def progress(stage, fraction):
+            now = time.monotonic()
+            if current:
+                stages.append({"stage": current["stage"], "seconds": now - current["started"]})
+            current.update(stage=stage, started=now)
+            self._update(connection, job_id, STAGE=stage, PROGRESS=float(fraction), STAGES=json.dumps(stages))
+
+        try:
+            connection = self._connect()
+            self._update(connection, job_id, STATUS='RUNNING')
+            result = fn(connection, progress, **params)
+            if current:
+                stages.append({"stage": current["stage"], "seconds": time.monotonic() - current["started"]})
+            self._update(connection, job_id, STATUS='SUCCEEDED', STAGE='done', PROGRESS=1.0,
+                         STAGES=json.dumps(stages), RESULT=json.dumps(result, default=str))
+        except Exception as e:
+            self._fail(connection, job_id, stages, e)
+        finally:
+            with self._active_lock:
+                self._active.discard(job_id)
+            if connection is not None:
+                connection.close()
+
+    def _fail(self, connection, job_id, stages, error):
+        fields = dict(STATUS='FAILED', STAGES=json.dumps(stages), ERROR=str(error)[:5000])
+        try:
+            if connection is not None:
+                self._update(connection, job_id, **fields)
+                return
+            # The job connection could not be opened: record the failure on a new one. If that
+            # fails too, the job goes stale once the heartbeat stops touching it
+            connection = self._connect()
+            try:
+                self._update(connection, job_id, **fields)
+            finally:
+                connection.close()
+        except Exception as e:
+            print(f"Could not mark job {job_id} as failed: {e}")
+
+    def get(self, connection, job_id):
+        self.schema_registry.ensure_static_tables(connection)
+        cursor = connection.connection.cursor()
+        cursor.execute(f"""
+            SELECT JOB_ID, JOB_TYPE, PARAMS, STATUS, STAGE, PROGRESS, STAGES, RESULT, ERROR, CREATED_AT, UPDATED_AT
+            FROM {self.table_name} WHERE JOB_ID = ?
+        """, (job_id,))
+        row = cursor.fetchone()
+        cursor.close()
+        if row is None:
+            return None
+
+        job = dict(zip(['job_id', 'job_type', 'params', 'status', 'stage', 'progress', 'stages',
+                        'result', 'error', 'created_at', 'updated_at'], row))
+        for column in ('params', 'stages', 'result'):
+            job[column] = json.loads(job[column]) if job[column] else None
+        job['created_at'] = str(job['created_at'])
+        job['updated_at'] = str(job['updated_at'])
+        return job
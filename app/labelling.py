@@ -0,0 +1,209 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+if 'VCAP_APPLICATION' in os.environ:
+    from app.schema import SchemaRegistry  # works in CF
+else:
+    from schema import SchemaRegistry  # works in local machine
+
+# CLUSTERING_DATA.CLUSTER_DESCRIPTION is NVARCHAR(255)
+MAX_LABEL_LENGTH = 255
+
+
+class MalformedLabel(Exception):
+    """Raised when a completion does not contain a usable label."""
+
+
+class LocalCompletions:
+    """Offline stand-in for ``chat.completions`` that labels a cluster with its most frequent topic words.
+
+    ``latency_seconds`` simulates the round trip to the model, so the
+    labelling path can be benchmarked without GenAI Hub.
+    """
+
+    def __init__(self, latency_seconds=0.0):
+        self.latency_seconds = latency_seconds
+        self.calls = 0
+
+    def create(self, model_name=None, messages=(), timeout=None, **kwargs):
+        self.calls += 1
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        topics = [line[2:] for line in messages[-1]["content"].splitlines() if line.startswith('- ')]
+        words = Counter(word.lower() for topic in topics for word in re.findall(r'[A-Za-z][A-Za-z0-9]+', topic))
+        label = ' '.join(word.capitalize() for word, _ in words.most_common(3)) or 'Miscellaneous'
+        return _LocalResponse(label)
+
+
+class _LocalResponse:
+    def __init__(self, content):
+        self.content = content
+
+    def to_dict(self):
+        return {"choices": [{"message": {"role": "assistant", "content": self.content}}]}
+
+
+# Completions client chosen by LLM_COMPLETION_BACKEND: GenAI Hub (default) or the local stand-in
+def default_completions():
+    if os.getenv('LLM_COMPLETION_BACKEND', 'genai_hub') == 'local':
+        return LocalCompletions(latency_seconds=float(os.getenv('LOCAL_COMPLETION_LATENCY_MS', '0')) / 1000)
+    from gen_ai_hub.proxy.native.openai import chat  # imported on first use, it needs the AI Core credentials
+    return chat.completions
+
+
+def topics_hash(topics):
+    return hashlib.sha1('\n'.join(sorted(set(topics))).encode('utf-8')).hexdigest()
+
+
+def parse_label(content):
+    """Take the label out of a completion, tolerating quotes, prefixes and extra lines."""
+    lines = [line.strip() for line in (content or '').splitlines() if line.strip()]
+    if not lines:
+        raise MalformedLabel("Empty completion")
+    label = re.sub(r'^(cluster\s*\d*\s*[:\-]|label\s*[:\-])\s*', '', lines[0], flags=re.I)
+    label = label.strip().strip('"\'*').strip()
+    if not label:
+        raise MalformedLabel(f"No label in completion: {content[:200]}")
+    return label[:MAX_LABEL_LENGTH]
+
+
+class ClusterLabeller:
+    """Labels clusters with one LLM request per cluster, reusing labels of unchanged clusters.
+
+    Labels are cached in a HANA table keyed by a hash of the cluster's
+    representative topics, so a refresh in any worker only labels clusters
+    whose topic set is new. Requests run concurrently, each with a timeout
+    and retries; a cluster that still fails gets a placeholder label that is
+    not cached. The cache table is created by the ``schema_registry``.
+    """
+
+    table_name = 'CLUSTER_LABEL_CACHE'
+
+    def __init__(self, completions=None, schema_registry=None, model_name='gpt-4o',
+                 max_workers=4, timeout_seconds=60, retries=2):
+        self._completions = completions
+        self.schema_registry = schema_registry or SchemaRegistry()
+        self.model_name = model_name
+        self.max_workers = max_workers
+        self.timeout_seconds = timeout_seconds
+        self.retries = retries
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.cache_hits = 0
+        self.requests = 0
+        self.failures = 0
+
+    @property
+    def completions(self):
+        with self._lock:
+            if self._completions is None:
+                self._completions = default_completions()
+            return self._completions
+
+    def _cached_labels(self, connection, hashes):
+        if not hashes:
+            return {}
+        cursor = connection.connection.cursor()
+        cursor.execute(
+            f"SELECT TOPICS_HASH, LABEL FROM {self.table_name} WHERE TOPICS_HASH IN ({', '.join('?' * len(hashes))})",
+            tuple(hashes)
+        )
+        labels = dict(cursor.fetchall())
+        cursor.close()
+        return labels
+
+    def _store_labels(self, connection, labels):
+        if not labels:
+            return
+        cursor = connection.connection.cursor()
+        cursor.executemany(
+            f"UPSERT {self.table_name} (TOPICS_HASH, LABEL, CREATED_AT) VALUES (?, ?, CURRENT_UTCTIMESTAMP) WITH PRIMARY KEY",
+            list(labels.items())
+        )
+        cursor.close()
+
+    def _prompt(self, topics):
+        topic_lines = '\n'.join(f"- {topic}" for topic in topics)
+        return (
+            "You will help to analyze the result of a machine learning algorithm for clustering on text data. "
+            "The algorithm was used to find clusters in topics of customer advisory services around various "
+            "services of the SAP Cloud platform (BTP). Find a good label for the cluster below based on the "
+            "topics of its most representative datapoints. Return only the label, in at most ten words.\n"
+            f"{topic_lines}"
+        )
+
+    def label_one(self, topics):
+        """Request a label for one cluster, retrying on errors, timeouts and malformed responses."""
+        messages = [{"role": "user", "content": self._prompt(topics)}]
+        for attempt in range(self.retries + 1):
+            try:
+                with self._lock:
+                    self.requests += 1
+                response = self.completions.create(model_name=self.model_name, messages=messages,
+                                                   timeout=self.timeout_seconds)
+                return parse_label(response.to_dict()["choices"][0]["message"]["content"])
+            except Exception:
+                if attempt == self.retries:
+                    raise
+                time.sleep(min(2 ** attempt, 10))
+
+    def label(self, connection, cluster_topics):
+        """Return {cluster_id: label} for a dict of cluster_id -> representative topics."""
+        self.schema_registry.ensure_static_tables(connection)
+        hashes = {cluster_id: topics_hash(topics) for cluster_id, topics in cluster_topics.items()}
+        cached = self._cached_labels(connection, sorted(set(hashes.values())))
+
+        labels = {cluster_id: cached[h] for cluster_id, h in hashes.items() if h in cached}
+        with self._lock:
+            self.cache_hits += len(labels)
+        pending = {cluster_id: topics for cluster_id, topics in cluster_topics.items() if cluster_id not in labels}
+
+        # Fan the remaining clusters out; the overall wait covers every retry of the slowest cluster
+        new_labels = {}
+        if pending:
+            executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='label')
+            futures = {cluster_id: executor.submit(self.label_one, topics) for cluster_id, topics in pending.items()}
+            deadline = time.monotonic() + self.timeout_seconds * (self.retries + 1) + 2 ** self.retries
+            for cluster_id, future in futures.items():
+                try:
+                    label = future.result(timeout=max(0.0, deadline - time.monotonic()))
+                    labels[cluster_id] = label
+                    new_labels[hashes[cluster_id]] = label
+                except Exception as e:
+                    with self._lock:
+                        self.failures += 1
+                    print(f"Labelling cluster {cluster_id} failed: {e}")
+                    labels[cluster_id] = f"Cluster {cluster_id}"
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        self._store_labels(connection, new_labels)
+        return labels
+
+    def stats(self):
+        with self._lock:
+            return {
+                "cache_hits": self.cache_hits,
+                "requests": self.requests,
+                "failures": self.failures,
+                "max_workers": self.max_workers,
+                "timeout_seconds": self.timeout_seconds,
+                "retries": self.retries
+            }
+
+
+# Process-wide labeller used by the clustering pipeline
+cluster_labeller = ClusterLabeller(
+    max_workers=int(os.getenv('LABEL_MAX_WORKERS', '4')),
+    timeout_seconds=float(os.getenv('LABEL_TIMEOUT_SECONDS', '60')),
+    retries=int(os.getenv('LABEL_RETRIES', '2'))
+)
+
+
+def label_clusters(connection, cluster_topics):
+    return cluster_labeller.label(connection, cluster_topics)
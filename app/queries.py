@@ -0,0 +1,199 @@
+import os
+import weakref
+from collections import OrderedDict
+
+if 'VCAP_APPLICATION' in os.environ:
+    from app.category_scores import UNASSIGNED_LABEL  # works in CF
+    from app.schema import IDENTIFIER_PATTERN
+else:
+    from category_scores import UNASSIGNED_LABEL  # works in local machine
+    from schema import IDENTIFIER_PATTERN
+
+# Named statements for the hot read and write paths; values are always bound
+STATEMENTS = {
+    'project_details': """
+        SELECT a."architect", a."index" AS advisories_index, a."pcb_number", a."project_date",
+               a."project_number", a."solution", a."topic",
+               c."comment", c."comment_date", c."index" AS comments_index
+        FROM {schema}.advisories4 a
+        LEFT JOIN {schema}.COMMENTS4 c
+        ON a."project_number" = c."project_number"
+        WHERE a."project_number" = ?
+    """,
+    'advisories_by_expert_and_category': f"""
+        SELECT COALESCE(c."category_label", '{UNASSIGNED_LABEL}') AS category, COUNT(a."project_number") AS projects
+        FROM "PROJECT_BY_CATEGORY" pbc
+        LEFT JOIN "CATEGORIES" c ON pbc."CATEGORY_ID" = c."index"
+        JOIN "ADVISORIES4" a ON pbc."PROJECT_ID" = a."project_number"
+        WHERE a."architect" = ?
+        GROUP BY COALESCE(c."category_label", '{UNASSIGNED_LABEL}')
+    """,
+    'project_category_scores': """
+        SELECT s."ADVISORY_INDEX", s."PROJECT_ID", s."CATEGORY_ID", c."category_label", s."SCORE",
+               ROW_NUMBER() OVER (PARTITION BY s."ADVISORY_INDEX" ORDER BY s."SCORE" DESC, s."CATEGORY_ID" ASC) AS "RANK"
+        FROM "PROJECT_CATEGORY_SCORES" s
+        JOIN "CATEGORIES" c ON s."CATEGORY_ID" = c."index"
+        WHERE s."PROJECT_ID" = ?
+        ORDER BY s."ADVISORY_INDEX", "RANK"
+    """,
+    'projects_by_architect_and_cluster': """
+        SELECT a."architect", c."CLUSTER_ID", COUNT(a."project_number") AS project_count
+        FROM "CLUSTERING" c
+        JOIN "ADVISORIES4" a ON c."PROJECT_NUMBER" = a."project_number"
+        GROUP BY a."architect", c."CLUSTER_ID"
+    """,
+    'projects_by_cluster_for_architect': """
+        SELECT a."architect", c."CLUSTER_ID", COUNT(a."project_number") AS project_count
+        FROM "CLUSTERING" c
+        JOIN "ADVISORIES4" a ON c."PROJECT_NUMBER" = a."project_number"
+        WHERE a."architect" = ?
+        GROUP BY a."architect", c."CLUSTER_ID"
+    """,
+    'insert_text': """
+        INSERT INTO {schema}.{table} (TEXT) VALUES (?)
+    """,
+}
+
+MAX_SIMILARITY_K = 100
+
+
+# Projects of one category (or of the unassigned bucket), for the category filter of the similarity search
+CATEGORY_PROJECTS = f"""SELECT pbc."PROJECT_ID" FROM "PROJECT_BY_CATEGORY" pbc
+                       LEFT JOIN "CATEGORIES" c ON pbc."CATEGORY_ID" = c."index"
+                       WHERE COALESCE(c."category_label", '{UNASSIGNED_LABEL}') = ?"""
+
+
+# One arm of the similarity search: metadata filters run before the vector scan and the
+# arm keeps only its own top k, so the merge sorts at most 2 * k rows; k is bound like every
+# other value, so one prepared statement serves all k
+def _similarity_arm(table, text_column, vector_column, date_column, architect_filter, filters):
+    dated, by_architect, by_category = filters
+    conditions = []
+    if dated:
+        conditions.append(f'{date_column} BETWEEN TO_DATE(?) AND TO_DATE(?)')
+    if by_architect:
+        conditions.append(architect_filter)
+    if by_category:
+        conditions.append(f'"project_number" IN ({CATEGORY_PROJECTS})')
+    where = ('WHERE ' + '\n                  AND '.join(conditions)) if conditions else ''
+    return f"""
+        SELECT * FROM (
+            SELECT * FROM (
+                SELECT {text_column} AS text,
+                       "project_number",
+                       COSINE_SIMILARITY({vector_column}, TO_REAL_VECTOR(?)) AS similarity
+                FROM {table}
+                {where}
+            ) scored
+            WHERE similarity >= ?
+            ORDER BY similarity DESC
+            LIMIT ?
+        )"""
+
+
+def _similarity_search(*filters):
+    advisories = _similarity_arm('{schema}.ADVISORIES4', '"solution"', '"solution_embedding"', '"project_date"',
+                                 '"architect" = ?', filters)
+    comments = _similarity_arm('{schema}.COMMENTS4', '"comment"', '"comment_embedding"', '"comment_date"',
+                               '"project_number" IN (SELECT "project_number" FROM {schema}.ADVISORIES4 WHERE "architect" = ?)',
+                               filters)
+    return f"""{advisories}
+        UNION ALL{comments}
+        ORDER BY similarity DESC
+        LIMIT ?
+    """
+
+
+def _similarity_search_name(dated, by_architect, by_category):
+    return 'compare_text_to_existing' + ''.join(suffix for flag, suffix in ((dated, ':dated'), (by_architect, ':architect'),
+                                                                              (by_category, ':category')) if flag)
+
+
+# One statement per combination of filters, so every variant is prepared once per connection
+for _dated in (False, True):
+    for _by_architect in (False, True):
+        for _by_category in (False, True):
+            STATEMENTS[_similarity_search_name(_dated, _by_architect, _by_category)] = \
+                _similarity_search(_dated, _by_architect, _by_category)
+
+# Prepared cursors per pooled ConnectionContext, dropped together with the connection; each
+# connection keeps at most MAX_PREPARED_PER_CONNECTION, closing the least recently used
+MAX_PREPARED_PER_CONNECTION = 32
+_prepared = weakref.WeakKeyDictionary()
+
+
+def _statement_text(name, identifiers):
+    for value in identifiers.values():
+        if not IDENTIFIER_PATTERN.match(value):
+            raise ValueError(f"Invalid identifier: {value}")
+    return STATEMENTS[name].format(**identifiers)
+
+
+# Return a cursor on which the named statement is prepared, preparing it on first use per connection
+def _prepared_cursor(connection, name, identifiers):
+    statements = _prepared.setdefault(connection, OrderedDict())
+    key = (name,) + tuple(sorted(identifiers.items()))
+    cursor = statements.get(key)
+    if cursor is not None:
+        statements.move_to_end(key)
+        return cursor
+    cursor = connection.connection.cursor()
+    try:
+        cursor.prepare(_statement_text(name, identifiers))
+    except Exception:
+        cursor.close()
+        raise
+    statements[key] = cursor
+    while len(statements) > MAX_PREPARED_PER_CONNECTION:
+        statements.popitem(last=False)[1].close()
+    return cursor
+
+
+# Execute on the prepared cursor; a failed statement is prepared again on the next call,
+# e.g. after its table was re-created
+def _execute_prepared(connection, name, params, identifiers):
+    cursor = _prepared_cursor(connection, name, identifiers)
+    try:
+        cursor.executeprepared(tuple(params))
+    except Exception:
+        _prepared.get(connection, {}).pop((name,) + tuple(sorted(identifiers.items())), None)
+        cursor.close()
+        raise
+    return cursor
+
+
+def execute_statement(connection, name, params=(), **identifiers):
+    """Execute a named write statement with bound values; returns the row count."""
+    cursor = _execute_prepared(connection, name, params, identifiers)
+    return cursor.rowcount
+
+
+def fetch_records(connection, name, params=(), **identifiers):
+    """Execute a named query with bound values; returns the rows as a list of dictionaries."""
+    cursor = _execute_prepared(connection, name, params, identifiers)
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def similarity_search(connection, schema_name, query_vector, k=5, min_similarity=None,
+                      start_date=None, end_date=None, architect=None, category=None):
+    """Top-k advisories and comments by cosine similarity to the query vector.
+
+    Dates filter "project_date" and "comment_date"; architect and category
+    (a CATEGORIES label) restrict both arms to the matching projects.
+    """
+    if not isinstance(k, int) or k < 1 or k > MAX_SIMILARITY_K:
+        raise ValueError(f"k must be between 1 and {MAX_SIMILARITY_K}")
+    dated = start_date is not None or end_date is not None
+
+    arm_params = [query_vector]
+    if dated:
+        arm_params += [start_date or '1900-01-01', end_date or '9999-12-31']
+    if architect is not None:
+        arm_params.append(architect)
+    if category is not None:
+        arm_params.append(category)
+    arm_params += [-1.0 if min_similarity is None else float(min_similarity), k]
+
+    name = _similarity_search_name(dated, architect is not None, category is not None)
+    return fetch_records(connection, name, arm_params * 2 + [k], schema=schema_name)
@@ -0,0 +1,134 @@
+import functools
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Response, make_response, request
+
+
+class DataVersions:
+    """Generation counters of the cached data sets, stored in a HANA table.
+
+    Every uwsgi worker reads the same rows, so a bump by one worker (or by a
+    background job) invalidates the responses cached by all of them. Reads are
+    reused for ``check_seconds``, which bounds how long another worker may
+    keep serving the previous generation.
+    """
+
+    def __init__(self, table_name='API_DATA_VERSIONS', check_seconds=2.0):
+        self.table_name = table_name
+        self.check_seconds = check_seconds
+        self._lock = threading.Lock()
+        self._generations = {}
+        self._checked_at = None
+
+    def current(self, connect, names):
+        with self._lock:
+            fresh = self._checked_at is not None and time.monotonic() - self._checked_at <= self.check_seconds
+            generations = self._generations
+        if not fresh:
+            cursor = connect().connection.cursor()
+            cursor.execute(f"SELECT NAME, GENERATION FROM {self.table_name}")
+            generations = {name: int(generation) for name, generation in cursor.fetchall()}
+            cursor.close()
+            with self._lock:
+                self._generations = generations
+                self._checked_at = time.monotonic()
+        return tuple(generations.get(name, 0) for name in names)
+
+    def bump(self, connection, name):
+        """Advance the generation of one data set after it was written."""
+        # Increment in place, so concurrent bumps from other workers are never lost
+        increment = f"UPDATE {self.table_name} SET GENERATION = GENERATION + 1 WHERE NAME = ?"
+        cursor = connection.connection.cursor()
+        try:
+            cursor.execute(increment, (name,))
+            if cursor.rowcount == 0:
+                try:
+                    cursor.execute(f"INSERT INTO {self.table_name} (NAME, GENERATION) VALUES (?, 1)", (name,))
+                except Exception:
+                    # Another worker inserted the row first
+                    cursor.execute(increment, (name,))
+                    if cursor.rowcount == 0:
+                        raise
+        finally:
+            cursor.close()
+        with self._lock:
+            self._checked_at = None
+
+
+class ResponseCache:
+    """Per-process cache of JSON responses, invalidated by DataVersions generations.
+
+    Entries are keyed by path, query arguments and Accept header. The ETag is
+    derived from the key and the generations, so a matching If-None-Match is
+    answered with 304 before the view runs.
+    """
+
+    def __init__(self, versions, connect, max_entries=256):
+        self.versions = versions
+        self._connect = connect
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def cached(self, *names):
+        """Decorator for a read route whose data only changes when one of ``names`` is bumped."""
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                # Streamed responses are neither cached nor tagged
+                if request.args.get('format') == 'ndjson':
+                    return view(*args, **kwargs)
+
+                key = (request.path, tuple(sorted(request.args.items(multi=True))), request.headers.get('Accept', ''))
+                generations = self.versions.current(self._connect, names)
+                etag = hashlib.sha1(repr((key, generations)).encode()).hexdigest()
+
+                if etag in request.if_none_match:
+                    with self._lock:
+                        self.not_modified += 1
+                    response = Response(status=304)
+                else:
+                    with self._lock:
+                        entry = self._entries.get(key)
+                        if entry is not None and entry[0] == generations:
+                            self._entries.move_to_end(key)
+                            self.hits += 1
+                        else:
+                            entry = None
+                            self.misses += 1
+
+                    if entry is not None:
+                        response = Response(entry[1], status=200, mimetype=entry[2])
+                    else:
+                        response = make_response(view(*args, **kwargs))
+                        if response.status_code != 200 or response.is_streamed:
+                            return response
+                        with self._lock:
+                            self._entries[key] = (generations, response.get_data(), response.mimetype)
+                            self._entries.move_to_end(key)
+                            while len(self._entries) > self.max_entries:
+                                self._entries.popitem(last=False)
+
+                response.set_etag(etag)
+                response.headers['Cache-Control'] = 'no-cache'
+                return response
+            return wrapper
+        return decorator
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,225 @@
+import re
+import threading
+
+# Schema and table names cannot be bound, so they are substituted into DDL and
+# statement text and must be plain identifiers
+IDENTIFIER_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+# HANA error code for "invalid table name: Could not find table/view"
+TABLE_NOT_FOUND_ERRORCODE = 259
+
+# Tables of the current schema that the API reads and writes
+STATIC_TABLES = {
+    'CATEGORIES': """
+        CREATE TABLE CATEGORIES (
+            "index" INTEGER,
+            "category_label" NVARCHAR(100),
+            "category_descr" NVARCHAR(5000),
+            "category_embedding" REAL_VECTOR
+                GENERATED ALWAYS AS VECTOR_EMBEDDING("category_descr", 'DOCUMENT', 'SAP_NEB.20240715')
+        );
+    """,
+    'PROJECT_BY_CATEGORY': """
+        CREATE TABLE PROJECT_BY_CATEGORY (
+            PROJECT_ID INT,
+            CATEGORY_ID INT
+        );
+    """,
+    'PROJECT_CATEGORY_SCORES': """
+        CREATE TABLE PROJECT_CATEGORY_SCORES (
+            ADVISORY_INDEX INT,
+            PROJECT_ID INT,
+            CATEGORY_ID INT,
+            SCORE DOUBLE,
+            PRIMARY KEY (ADVISORY_INDEX, CATEGORY_ID)
+        );
+    """,
+    'CATEGORY_RESCORE': """
+        CREATE TABLE CATEGORY_RESCORE (
+            ADVISORY_INDEX INT PRIMARY KEY,
+            PROJECT_ID INT,
+            SCORE DOUBLE,
+            WAS_STORED INT,
+            FLOOR_SCORE DOUBLE,
+            FLOOR_CATEGORY INT,
+            STORED_COUNT INT
+        );
+    """,
+    'CLUSTERING': """
+        CREATE TABLE CLUSTERING (
+            PROJECT_NUMBER NVARCHAR(255),
+            "x" DOUBLE,
+            "y" DOUBLE,
+            CLUSTER_ID INT,
+            DISTANCE DOUBLE
+        );
+    """,
+    'CLUSTERING_DATA': """
+        CREATE TABLE CLUSTERING_DATA (
+            CLUSTER_ID INT,
+            CLUSTER_DESCRIPTION NVARCHAR(255),
+            EMBEDDING REAL_VECTOR GENERATED ALWAYS AS VECTOR_EMBEDDING(CLUSTER_DESCRIPTION, 'DOCUMENT', 'SAP_NEB.20240715')
+        );
+    """,
+    'API_DATA_VERSIONS': """
+        CREATE TABLE API_DATA_VERSIONS (
+            NAME NVARCHAR(100) PRIMARY KEY,
+            GENERATION BIGINT
+        );
+    """,
+    'CLUSTERING_JOBS': """
+        CREATE TABLE CLUSTERING_JOBS (
+            JOB_ID NVARCHAR(36) PRIMARY KEY,
+            JOB_TYPE NVARCHAR(100),
+            COALESCE_KEY NVARCHAR(1000),
+            PARAMS NVARCHAR(1000),
+            STATUS NVARCHAR(20),
+            STAGE NVARCHAR(100),
+            PROGRESS DOUBLE,
+            STAGES NVARCHAR(5000),
+            RESULT NVARCHAR(5000),
+            ERROR NVARCHAR(5000),
+            CREATED_AT TIMESTAMP,
+            UPDATED_AT TIMESTAMP
+        );
+    """,
+    'CLUSTER_LABEL_CACHE': """
+        CREATE TABLE CLUSTER_LABEL_CACHE (
+            TOPICS_HASH NVARCHAR(40) PRIMARY KEY,
+            LABEL NVARCHAR(255),
+            CREATED_AT TIMESTAMP
+        );
+    """,
+}
+
+# Per-schema tables written by /insert_text_and_vector
+TEXT_TABLE_DDL = """
+        CREATE TABLE {schema_name}.{table_name} (
+            TEXT_ID INT GENERATED BY DEFAULT AS IDENTITY,
+            TEXT NVARCHAR(5000),
+            EMBEDDING REAL_VECTOR GENERATED ALWAYS AS VECTOR_EMBEDDING(TEXT, 'DOCUMENT', 'SAP_NEB.20240715')
+        );
+"""
+
+
+def is_table_not_found(error):
+    return getattr(error, 'errorcode', None) == TABLE_NOT_FOUND_ERRORCODE or 'invalid table name' in str(error).lower()
+
+
+def _create_if_missing(table_name, schema_expression, ddl):
+    return f"""
+            SELECT COUNT(*) INTO table_exists
+            FROM SYS.TABLES
+            WHERE TABLE_NAME = '{table_name}' AND SCHEMA_NAME = {schema_expression};
+
+            IF table_exists = 0 THEN
+                {ddl.strip()}
+            END IF;
+    """
+
+
+class SchemaRegistry:
+    """Creates the API's tables once per process and remembers which exist.
+
+    Requests no longer run a DDL block on every call: the static tables are
+    ensured together in one anonymous block, and each text table the first
+    time it is used. The registry only checks again after a statement failed
+    with a table-not-found error, e.g. because a table was dropped.
+    """
+
+    def __init__(self, text_tables=()):
+        self.text_tables = [self._key(schema_name, table_name) for schema_name, table_name in text_tables]
+        self._lock = threading.Lock()
+        self._static_ready = False
+        self._all_ready = False
+        self._bootstrapped = False
+        self._known_text_tables = set()
+        self.ddl_runs = 0
+        self.rechecks = 0
+
+    @staticmethod
+    def _key(schema_name, table_name):
+        for value in (schema_name, table_name):
+            if not IDENTIFIER_PATTERN.match(value or ''):
+                raise ValueError(f"Invalid identifier: {value}")
+        return schema_name.upper(), table_name.upper()
+
+    def _run(self, connection, blocks):
+        sql = "DO BEGIN\n            DECLARE table_exists INT;\n" + ''.join(blocks) + "\n        END;"
+        cursor = connection.connection.cursor()
+        cursor.execute(sql)
+        cursor.close()
+        self.ddl_runs += 1
+
+    def ensure_all(self, connection):
+        """Create the static tables and the configured text tables in a single round trip, once per process."""
+        if self._all_ready:
+            return
+        with self._lock:
+            if self._all_ready:
+                return
+            blocks = [_create_if_missing(name, 'CURRENT_SCHEMA', ddl) for name, ddl in STATIC_TABLES.items()]
+            blocks += [_create_if_missing(table_name, f"'{schema_name}'",
+                                          TEXT_TABLE_DDL.format(schema_name=schema_name, table_name=table_name))
+                       for schema_name, table_name in self.text_tables]
+            self._run(connection, blocks)
+            self._static_ready = self._all_ready = True
+            self._known_text_tables.update(self.text_tables)
+
+    def bootstrap(self, connection):
+        """ensure_all on the first connection of the process; a failure is reported and not retried,
+        since every route still ensures the tables it uses."""
+        if self._bootstrapped:
+            return
+        self._bootstrapped = True
+        try:
+            self.ensure_all(connection)
+        except Exception as e:
+            print(f"Could not create the API tables up front: {e}")
+
+    def ensure_static_tables(self, connection):
+        if self._static_ready:
+            return
+        with self._lock:
+            if self._static_ready:
+                return
+            self._run(connection, [_create_if_missing(name, 'CURRENT_SCHEMA', ddl) for name, ddl in STATIC_TABLES.items()])
+            self._static_ready = True
+
+    def ensure_text_table(self, connection, schema_name, table_name):
+        key = self._key(schema_name, table_name)
+        if key in self._known_text_tables:
+            return
+        with self._lock:
+            if key in self._known_text_tables:
+                return
+            self._run(connection, [_create_if_missing(key[1], f"'{key[0]}'",
+                                                      TEXT_TABLE_DDL.format(schema_name=schema_name, table_name=table_name))])
+            self._known_text_tables.add(key)
+
+    def invalidate(self):
+        with self._lock:
+            self._static_ready = False
+            self._known_text_tables.clear()
+
+    def retry_if_table_missing(self, connection, fn, text_table=None):
+        """Call ``fn()``; after a table-not-found error, re-ensure the tables and call it once more."""
+        try:
+            return fn()
+        except Exception as e:
+            if not is_table_not_found(e):
+                raise
+            self.rechecks += 1
+            self.invalidate()
+            self.ensure_static_tables(connection)
+            if text_table is not None:
+                self.ensure_text_table(connection, *text_table)
+            return fn()
+
+    def stats(self):
+        return {
+            "static_tables_ready": self._static_ready,
+            "known_text_tables": sorted('.'.join(key) for key in self._known_text_tables),
+            "ddl_runs": self.ddl_runs,
+            "rechecks": self.rechecks
+        }
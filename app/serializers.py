@@ -0,0 +1,33 @@
+import importlib.util
+
+# Arrow output is optional; pyarrow is only imported when a client asks for it
+ARROW_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+
+
+# List of row objects, built column-wise by pandas instead of iterating rows in Python
+def to_records(df, columns):
+    return df[columns].to_dict(orient='records')
+
+
+# One array per column, e.g. {"x": [...], "y": [...]}: far fewer bytes than repeating the keys per row
+def to_columnar(df, columns):
+    return {column: df[column].tolist() for column in columns}
+
+
+# Whether the client prefers Arrow IPC over JSON (and Arrow is available)
+def wants_arrow(request):
+    if not ARROW_AVAILABLE:
+        return False
+    return request.accept_mimetypes.best_match(['application/json', ARROW_MIMETYPE]) == ARROW_MIMETYPE
+
+
+# Arrow IPC stream bytes for the given columns
+def to_arrow_ipc(df, columns):
+    import pyarrow as pa
+    table = pa.Table.from_pandas(df[columns], preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
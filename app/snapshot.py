@@ -0,0 +1,257 @@
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+if 'VCAP_APPLICATION' in os.environ:
+    from app.ann_index import parse_real_vector  # works in CF
+else:
+    from ann_index import parse_real_vector  # works in local machine
+
+SNAPSHOT_DTYPES = ('float16', 'int8')
+SCAN_CHUNK_ROWS = 65536
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _top_k(scores, k):
+    k = min(k, len(scores))
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def _write_current(root, version):
+    # Readers poll CURRENT, so it is swapped atomically
+    tmp_path = os.path.join(root, 'CURRENT.tmp')
+    with open(tmp_path, 'w') as f:
+        f.write(version)
+    os.replace(tmp_path, os.path.join(root, 'CURRENT'))
+
+
+def export_snapshot(connection, root, sources, dtype='int8', keep_versions=2, fetch_size=5000, progress=None):
+    """Write the embedding columns of ``sources`` into a new snapshot version under ``root``.
+
+    Each source ({"table", "key", "vector"}) becomes an id array and a
+    quantized matrix of L2-normalized vectors (float16, or int8 with one scale
+    per row), as .npy files written through memory maps so the exporter's
+    memory stays flat. The manifest records the highest exported key of each
+    source, so searches can add the rows inserted after the export. The new
+    version becomes current only once it is complete.
+    """
+    if dtype not in SNAPSHOT_DTYPES:
+        raise ValueError(f"dtype must be one of {SNAPSHOT_DTYPES}")
+    os.makedirs(root, exist_ok=True)
+    version = time.strftime('%Y%m%dT%H%M%S', time.gmtime()) + f'{time.time() % 1:.6f}'[1:] + f'-{os.getpid()}'
+    tmp_dir = os.path.join(root, f'.{version}.tmp')
+    os.makedirs(tmp_dir)
+
+    manifest = {"version": version, "created_at": time.time(), "dtype": dtype, "sources": {}}
+    try:
+        for position, source in enumerate(sources):
+            name = f'{source["table"]}.{source["vector"]}'
+            if progress is not None:
+                progress(name, position / len(sources))
+
+            cursor = connection.connection.cursor()
+            cursor.execute(f'SELECT COUNT(*), MAX("{source["key"]}") FROM {source["table"]} WHERE "{source["vector"]}" IS NOT NULL')
+            count, max_key = cursor.fetchone()
+            cursor.execute(f"""
+                SELECT "{source['key']}", "{source['vector']}"
+                FROM {source['table']}
+                WHERE "{source['vector']}" IS NOT NULL AND "{source['key']}" <= ?
+                ORDER BY "{source['key']}"
+            """, (max_key,))
+
+            ids = vectors = scales = None
+            rows = 0
+            while True:
+                batch = cursor.fetchmany(fetch_size)
+                if not batch:
+                    break
+                batch = batch[:max(0, count - rows)]  # Rows inserted after the count are left for the next export
+                if not batch:
+                    break
+                block = _normalize(np.vstack([parse_real_vector(row[1]) for row in batch]).astype(np.float32))
+                if ids is None:
+                    dim = block.shape[1]
+                    path = lambda suffix: os.path.join(tmp_dir, f'{name}.{suffix}.npy')
+                    ids = np.lib.format.open_memmap(path('ids'), mode='w+', dtype=np.int64, shape=(count,))
+                    vectors = np.lib.format.open_memmap(path('vectors'), mode='w+', dtype=np.dtype(dtype), shape=(count, dim))
+                    if dtype == 'int8':
+                        scales = np.lib.format.open_memmap(path('scales'), mode='w+', dtype=np.float32, shape=(count,))
+
+                end = rows + len(batch)
+                ids[rows:end] = [row[0] for row in batch]
+                if dtype == 'int8':
+                    row_scales = np.abs(block).max(axis=1) / 127.0
+                    row_scales[row_scales == 0] = 1.0
+                    vectors[rows:end] = np.round(block / row_scales[:, None]).astype(np.int8)
+                    scales[rows:end] = row_scales
+                else:
+                    vectors[rows:end] = block.astype(np.float16)
+                rows = end
+            cursor.close()
+
+            for array in (ids, vectors, scales):
+                if array is not None:
+                    array.flush()
+            manifest["sources"][name] = {**source, "rows": rows, "dim": 0 if vectors is None else vectors.shape[1],
+                                         "max_key": None if max_key is None else int(max_key)}
+
+        with open(os.path.join(tmp_dir, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.rename(tmp_dir, os.path.join(root, version))
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    _write_current(root, version)
+
+    # Drop old versions; workers that still map them keep their open files
+    versions = sorted(entry for entry in os.listdir(root)
+                      if os.path.isfile(os.path.join(root, entry, 'manifest.json')))
+    for old in versions[:-keep_versions]:
+        shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+    return manifest
+
+
+class EmbeddingSnapshot:
+    """Read-only view of the current snapshot, memory-mapped so all workers share one copy.
+
+    A search scans the quantized matrix in chunks and returns the keys of the
+    ``oversample * k`` best candidates, which search_texts reranks with the
+    exact vectors in HANA. The current version is re-checked at most every
+    ``check_seconds``; a snapshot older than ``max_age_seconds`` is not used,
+    so callers fall back to HANA.
+    """
+
+    def __init__(self, root, max_age_seconds=86400, check_seconds=30, oversample=4):
+        self.root = root
+        self.max_age_seconds = max_age_seconds
+        self.check_seconds = check_seconds
+        self.oversample = oversample
+        self._lock = threading.Lock()
+        self._checked_at = None
+        self.manifest = None
+        self.arrays = {}
+        self.searches = 0
+
+    def _load(self):
+        try:
+            with open(os.path.join(self.root, 'CURRENT')) as f:
+                version = f.read().strip()
+        except FileNotFoundError:
+            return
+        if self.manifest is not None and self.manifest["version"] == version:
+            return
+
+        directory = os.path.join(self.root, version)
+        with open(os.path.join(directory, 'manifest.json')) as f:
+            manifest = json.load(f)
+        arrays = {}
+        for name, source in manifest["sources"].items():
+            if not source["rows"]:
+                continue
+            load = lambda suffix: np.load(os.path.join(directory, f'{name}.{suffix}.npy'), mmap_mode='r')
+            arrays[name] = {
+                "ids": load('ids')[:source["rows"]],
+                "vectors": load('vectors')[:source["rows"]],
+                "scales": load('scales')[:source["rows"]] if manifest["dtype"] == 'int8' else None
+            }
+        self.manifest, self.arrays = manifest, arrays
+
+    def current(self):
+        """The loaded manifest, or None when there is no snapshot or it is too old."""
+        with self._lock:
+            if self._checked_at is None or time.monotonic() - self._checked_at > self.check_seconds:
+                self._load()
+                self._checked_at = time.monotonic()
+            if self.manifest is None or time.time() - self.manifest["created_at"] > self.max_age_seconds:
+                return None
+            return self.manifest
+
+    def candidates(self, name, query_vector, k):
+        """Keys of the ``oversample * k`` nearest rows of one source by quantized score, or None when the snapshot cannot be used."""
+        manifest = self.current()
+        if manifest is None or name not in manifest["sources"]:
+            return None
+        if name not in self.arrays:
+            return np.empty(0, dtype=np.int64)
+        arrays = self.arrays[name]
+        query = _normalize(parse_real_vector(query_vector).astype(np.float32))
+
+        scores = np.empty(len(arrays["ids"]), dtype=np.float32)
+        for start in range(0, len(scores), SCAN_CHUNK_ROWS):
+            block = np.asarray(arrays["vectors"][start:start + SCAN_CHUNK_ROWS], dtype=np.float32)
+            scores[start:start + SCAN_CHUNK_ROWS] = block @ query
+        if arrays["scales"] is not None:
+            scores *= arrays["scales"]
+
+        with self._lock:
+            self.searches += 1
+        return np.asarray(arrays["ids"][np.sort(_top_k(scores, k * self.oversample))])
+
+    def stats(self):
+        manifest = self.current()
+        with self._lock:
+            if manifest is None:
+                return {"loaded": False, "root": self.root, "searches": self.searches}
+            return {
+                "loaded": True,
+                "version": manifest["version"],
+                "dtype": manifest["dtype"],
+                "age_seconds": time.time() - manifest["created_at"],
+                "sources": {name: {"rows": source["rows"], "dim": source["dim"]}
+                            for name, source in manifest["sources"].items()},
+                "searches": self.searches
+            }
+
+
+def search_texts(connection, snapshot, arms, query_vector, k=5, min_similarity=None):
+    """compare_text_to_existing over the snapshot: top k of each arm merged.
+
+    ``arms`` lists (source name, table, key column, text column). Each arm
+    reranks the snapshot's candidates, together with the rows inserted after
+    the export, by exact cosine similarity in HANA in one statement. Returns
+    None when the snapshot cannot serve the query.
+    """
+    matches = []
+    for name, table, key, text_column in arms:
+        ids = snapshot.candidates(name, query_vector, k)
+        if ids is None:
+            return None
+        source = snapshot.manifest["sources"][name]
+
+        conditions, params = [], [query_vector]
+        if len(ids):
+            conditions.append(f'"{key}" IN ({", ".join("?" * len(ids))})')
+            params += [int(i) for i in ids]
+        if source.get("max_key") is not None:
+            conditions.append(f'"{key}" > ?')
+            params.append(source["max_key"])
+        if not conditions:
+            continue
+        cursor = connection.connection.cursor()
+        cursor.execute(f"""
+            SELECT TOP {int(k)} "{text_column}", "project_number",
+                   COSINE_SIMILARITY("{source['vector']}", TO_REAL_VECTOR(?)) AS "SIMILARITY"
+            FROM {table}
+            WHERE "{source['vector']}" IS NOT NULL AND ({' OR '.join(conditions)})
+            ORDER BY "SIMILARITY" DESC
+        """, tuple(params))
+        matches.extend({"TEXT": row[0], "project_number": row[1], "SIMILARITY": float(row[2])}
+                       for row in cursor.fetchall())
+        cursor.close()
+
+    if min_similarity is not None:
+        matches = [match for match in matches if match["SIMILARITY"] >= float(min_similarity)]
+    return sorted(matches, key=lambda match: match["SIMILARITY"], reverse=True)[:k]
@@ -0,0 +1,103 @@
+import importlib
+import os
+import threading
+import time
+
+
+class StartupReport:
+    """Where a worker's startup went: import stages, deferred imports and its first HANA connection.
+
+    ``started`` is the perf_counter value at the top of app/api.py. Deferred
+    imports are recorded when they happen, which is at preload time in the
+    uwsgi master or on the first request that needs them in a worker.
+    """
+
+    def __init__(self, started):
+        self.started = started
+        self.pid = os.getpid()
+        self.parent_pid = None
+        self.preloaded = []
+        self.stages = []
+        self.lazy_imports = {}
+        self.ready_seconds = None
+        self.first_connection_seconds = None
+        self._lock = threading.Lock()
+
+    def stage(self, name, since):
+        """Record a stage that began at perf_counter value ``since``; returns the time it ended."""
+        now = time.perf_counter()
+        with self._lock:
+            self.stages.append({"stage": name, "seconds": round(now - since, 4)})
+        return now
+
+    def record_import(self, name, seconds):
+        with self._lock:
+            self.lazy_imports[name] = {"seconds": round(seconds, 4), "pid": os.getpid()}
+
+    def record_connection(self, seconds):
+        with self._lock:
+            if self.first_connection_seconds is None:
+                self.first_connection_seconds = round(seconds, 4)
+
+    def ready(self):
+        self.ready_seconds = round(time.perf_counter() - self.started, 4)
+
+    def after_fork(self):
+        # Import stages stay as measured in the parent; connection timings are per worker
+        self.parent_pid, self.pid = self.pid, os.getpid()
+        self._lock = threading.Lock()
+        self.first_connection_seconds = None
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "pid": self.pid,
+                "forked_from": self.parent_pid,
+                "preloaded": list(self.preloaded),
+                "import_ready_seconds": self.ready_seconds,
+                "stages": list(self.stages),
+                "lazy_imports": dict(self.lazy_imports),
+                "first_connection_seconds": self.first_connection_seconds
+            }
+
+    def summary(self):
+        stages = ', '.join(f"{stage['stage']} {stage['seconds']:.3f}s" for stage in self.stages)
+        preloaded = f"; preloaded {', '.join(self.preloaded)}" if self.preloaded else ''
+        return f"API ready in {self.ready_seconds:.3f}s ({stages}){preloaded}"
+
+
+class LazyModule:
+    """Stand-in for a module that is imported on first attribute access.
+
+    Lets the API defer hana_ml, pandas and the PAL pipeline until a route
+    needs them, while call sites keep the ``module.name`` form. Tests and the
+    benchmark can still replace the module attribute on app.api.
+    """
+
+    def __init__(self, name, report=None):
+        self.module_name = name
+        self._report = report
+        self._module = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    started = time.perf_counter()
+                    module = importlib.import_module(self.module_name)
+                    if self._report is not None:
+                        self._report.record_import(self.module_name, time.perf_counter() - started)
+                    self._module = module
+        return self._module
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def __getattr__(self, attribute):
+        # Only called for attributes not set in __init__, i.e. the module's own
+        return getattr(self.load(), attribute)
+
+    def __repr__(self):
+        return f"<LazyModule {self.module_name} ({'loaded' if self.loaded else 'not loaded'})>"
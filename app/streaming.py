@@ -0,0 +1,89 @@
+from flask import Response, current_app, stream_with_context
+
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10000
+STREAM_BATCH_SIZE = 1000
+
+
+# Read limit / after / format from the query string; limit is None when the caller wants everything
+def parse_pagination_args(args):
+    limit = args.get('limit')
+    if limit is not None:
+        limit = int(limit)
+        if limit <= 0 or limit > MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    after = args.get('after')
+    stream = args.get('format') == 'ndjson'
+    if limit is None and after is not None and not stream:
+        limit = DEFAULT_PAGE_SIZE
+    return limit, after, stream
+
+
+# Wrap a query so it is ordered by key_column and starts after the cursor value
+def keyset_sql(base_sql, key_column, after=None, limit=None):
+    sql = f'SELECT * FROM ({base_sql}) page'
+    if after is not None:
+        sql += f' WHERE page."{key_column}" > ?'
+    sql += f' ORDER BY page."{key_column}"'
+    if limit is not None:
+        sql += f' LIMIT {int(limit)}'
+    return sql, ((after,) if after is not None else ())
+
+
+def _records(cursor, rows):
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in rows]
+
+
+# Fetch one page of at most `limit` rows; returns the records and the cursor for the next page (None at the end).
+# A key with more than `limit` rows is returned whole, as one larger page
+def fetch_keyset_page(connection, base_sql, key_column, limit, after=None, params=()):
+    # One extra row tells whether another page exists
+    sql, keyset_params = keyset_sql(base_sql, key_column, after, limit + 1)
+    cursor = connection.connection.cursor()
+    cursor.execute(sql, tuple(params) + keyset_params)
+    records = _records(cursor, cursor.fetchall())
+
+    if len(records) <= limit:
+        cursor.close()
+        return records, None
+
+    # Never split the rows of one key across pages, since the next page starts strictly after it
+    page = records[:limit]
+    boundary_key = records[limit][key_column]
+    if page[-1][key_column] == boundary_key:
+        page = [record for record in page if record[key_column] != boundary_key]
+        if not page:
+            # Every row of the page has the boundary key: extend the page to all of its rows
+            cursor.execute(f'SELECT * FROM ({base_sql}) page WHERE page."{key_column}" = ?',
+                           tuple(params) + (boundary_key,))
+            page = _records(cursor, cursor.fetchall())
+    cursor.close()
+    return page, page[-1][key_column]
+
+
+# Stream the rows of a query as NDJSON, pulling them with fetchmany so memory stays flat
+def stream_ndjson(connection, base_sql, key_column, after=None, params=(), batch_size=STREAM_BATCH_SIZE):
+    sql, keyset_params = keyset_sql(base_sql, key_column, after)
+
+    # Execute before streaming so statement errors still produce an error response
+    cursor = connection.connection.cursor()
+    try:
+        cursor.execute(sql, tuple(params) + keyset_params)
+    except Exception:
+        cursor.close()
+        raise
+    columns = [column[0] for column in cursor.description]
+
+    def generate():
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield ''.join(current_app.json.dumps(dict(zip(columns, row))) + '\n' for row in rows)
+        finally:
+            cursor.close()
+
+    # stream_with_context keeps the request (and its pooled connection) alive until the stream ends
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
@@ -1,12 +1,30 @@
+import os
 from datetime import datetime
-from hana_ml.dataframe import ConnectionContext
+from hana_ml.dataframe import ConnectionContext, create_dataframe_from_pandas
 import pandas as pd
+import numpy as np
 
 from hana_ml.algorithms.pal.decomposition import CATPCA
 from hana_ml.algorithms.pal.tsne import TSNE
 from hana_ml.algorithms.pal.clustering import KMeans
 
-from gen_ai_hub.proxy.native.openai import chat
+if 'VCAP_APPLICATION' in os.environ:
+    from app.embedding_cache import get_query_embedding, get_query_embeddings  # works in CF
+    from app.labelling import label_clusters
+else:
+    from embedding_cache import get_query_embedding, get_query_embeddings  # works in local machine
+    from labelling import label_clusters
+
+# Layout stage settings. angle > 0 uses Barnes-Hut gradients instead of the exact O(n^2) ones
+# (TSNE_ANGLE=0 restores the exact fit); inputs larger than `landmarks` rows embed only that many
+# evenly spaced points and place the others from their nearest landmarks (0 embeds every point).
+# PAL runs a fixed number of iterations, so n_iter is the bound that stands in for early stopping
+TSNE_SETTINGS = {
+    "angle": float(os.getenv('TSNE_ANGLE', '0.5')),
+    "n_iter": int(os.getenv('TSNE_N_ITER', '1000')),
+    "landmarks": int(os.getenv('TSNE_LANDMARKS', '5000')),
+    "n_neighbors": int(os.getenv('TSNE_PLACEMENT_NEIGHBORS', '5'))
+}
 
 def kmeans_and_tsne(connection,                                     
                     table_name,                                     
@@ -14,55 +32,60 @@ def kmeans_and_tsne(connection,
                     n_components,                                   
                     perplexity= 5,                                  
                     start_date='1900-01-01',                       
-                    end_date=datetime.now().strftime('%Y-%m-%d')    
+                    end_date=datetime.now().strftime('%Y-%m-%d'),
+                    progress=None,                                  ## optional callback(stage, fraction) for job status
+                    tsne_settings=None,                             ## overrides of TSNE_SETTINGS
+                    refit_projection=False                          ## fit CATPCA again instead of reusing the persisted model
                     ): 
     
-    # Retrieve knowledge base data
-    hdf = connection.table(table_name) 
+    # Report the start of each stage to the caller, if it asked for it
+    def report(stage, fraction):
+        if progress is not None:
+            progress(stage, fraction)
     
-    # Reduce embeddings dimensions
-    cpc = CATPCA(scaling=True,
-                 thread_ratio=0.9,
-                 scores=True,
-                 n_components=n_components,
-                 component_tol=1e-5)
+    # Dates are inlined into the statements below, so only accept YYYY-MM-DD
+    for value in (start_date, end_date):
+        datetime.strptime(value, '%Y-%m-%d')
+    
+    # Retrieve knowledge base data in the date window only, so CATPCA and
+    # t-SNE cost in proportion to the rows the refresh covers
+    hdf = window_embeddings(connection, table_name, start_date, end_date)
     
-    # Fit the model
-    cpc.fit(data=hdf.select(['project_number','topic_embedding']), key='project_number') 
+    # Reduce embeddings dimensions, reusing the persisted projection when it was fitted on this data
+    report('catpca', 0.0)
+    pca_scores = project_embeddings(connection,
+                                    hdf,
+                                    model_table=f'{result_table_name}_CATPCA_MODEL',
+                                    n_components=n_components,
+                                    window=(table_name, start_date, end_date),
+                                    refit=refit_projection)
     
     # Categorical PCA outputs components as rows, which need to be transposed for analysis
-    compl_pcavecs_pivot = cpc.scores_.pivot_table(  columns = 'COMPONENT_ID',
-                                                    values = 'COMPONENT_SCORE',
-                                                    index = 'project_number',
-                                                    aggfunc = 'AVG')
+    compl_pcavecs_pivot = pca_scores.pivot_table(columns = 'COMPONENT_ID',
+                                                 values = 'COMPONENT_SCORE',
+                                                 index = 'project_number',
+                                                 aggfunc = 'AVG')
 
-    # Display embeddings in a 2-dim space with T-SNE algorithm
-    tsne = TSNE(n_iter = 5000,
-                random_state = 1,
-                n_components = 2,
-                angle = 0.0,
-                exaggeration = 20,
-                learning_rate = 10,
-                perplexity = perplexity,
-                object_frequency = 50,
-                thread_ratio = 0.5)
+    # Persist the projected vectors, so the pivot is computed once and new projects can
+    # later be placed without refitting (see assign_new_projects_to_clusters)
+    compl_pcavecs_pivot.save(f'{result_table_name}_PCA', force=True)
+    compl_pcavecs_pivot = connection.table(f'{result_table_name}_PCA')
 
-    # Fit the model
-    df_tsne_res, stats, obj = tsne.fit_predict(data = compl_pcavecs_pivot, 
-                                                key = 'project_number')
-    
-    ## Add project date in pca results
-    compl_pcavecs_pivot = compl_pcavecs_pivot.set_index("project_number").join(
-        hdf.select(['project_number','project_date']).set_index("project_number"))
-    
-    ## Filter projects by dates & remove project_date from the pca results
-    filter_str=f" PROJECT_DATE >= TO_DATE('{start_date}') AND PROJECT_DATE < TO_DATE('{end_date}')"
-    compl_pcavecs_pivot = compl_pcavecs_pivot.rename_columns({'project_date' : 'PROJECT_DATE'})
-    compl_pcavecs_pivot = compl_pcavecs_pivot.filter(filter_str).deselect('PROJECT_DATE')
+    # Display embeddings in a 2-dim space with T-SNE algorithm
+    report('tsne', 0.2)
+    df_tsne_res, layout_stats = tsne_layout(connection,
+                                            compl_pcavecs_pivot,
+                                            key='project_number',
+                                            perplexity=perplexity,
+                                            result_table_name=result_table_name,
+                                            settings=tsne_settings)
+    print(f"t-SNE layout: {layout_stats}")
     
     # Run the clustering algorithm on the filtered data
+    report('kmeans', 0.6)
     km = KMeans(n_clusters_min=5, n_clusters_max=10, max_iter=5000, distance_level='euclidean')    
     df_clusters  = km.fit_predict(data=compl_pcavecs_pivot, key='project_number')
+    km.cluster_centers_.save(f'{result_table_name}_CENTROIDS', force=True)
 
      # Merge Cluster Results with T-SNE data
     df_clusters_1 = df_clusters.select('project_number', 'CLUSTER_ID','DISTANCE')
@@ -73,74 +96,276 @@ def kmeans_and_tsne(connection,
                                                     condition = 'PROJECT_NUMBER = PROJECT_NUMBER_1')
     df_tsne_with_cluster = df_tsne_with_cluster.drop('PROJECT_NUMBER_1')
 
+    report('save', 0.75)
     df_tsne_with_cluster.save(result_table_name, force=True )
 
-    # Select and rename columns in hdf, then collect the data
-    hdf_processed = hdf.deselect(['topic_embedding', 'solution_embedding']) \
-                        .rename_columns({'project_number' : 'PROJECT_NUMBER'}) \
-                        .collect()
-
-    # Collect df_tsne_with_cluster data
-    df_tsne_processed = df_tsne_with_cluster.collect()
+    # Select the 20 most representative topics (closest to the centroid) of each cluster in
+    # HANA, so only those rows are transferred instead of the whole advisory table
+    report('profiling', 0.8)
+    representative_topics = connection.sql(f"""
+        SELECT "CLUSTER_ID", "topic"
+        FROM (
+            SELECT c."CLUSTER_ID", a."topic",
+                   ROW_NUMBER() OVER (PARTITION BY c."CLUSTER_ID"
+                                      ORDER BY c."DISTANCE" ASC, a."index" ASC) AS rn
+            FROM "{result_table_name}" c
+            JOIN "{table_name}" a ON a."project_number" = c."PROJECT_NUMBER"
+        ) ranked
+        WHERE rn <= 20
+        ORDER BY "CLUSTER_ID", rn
+    """).collect()
 
-    # Merge the two dataframes
-    clustered_df = pd.merge(
-        hdf_processed, 
-        df_tsne_processed, 
-        how='left', 
-        on='PROJECT_NUMBER'
-    )
+    cluster_topics = {}
+    for name, group in representative_topics.groupby('CLUSTER_ID', sort=True):
+        cluster_topics["{:0.0f}".format(float(name))] = group['topic'].tolist()
 
-    # Initialize the profiling string
-    profiling_string = ""
+    # Label only clusters whose topic set is not in the label cache, one concurrent request per cluster
+    report('labelling', 0.85)
+    clusters_dict = label_clusters(connection, cluster_topics)
+    
+    return df_tsne_with_cluster, clusters_dict
 
-    # Loop through each cluster and its corresponding group
-    for name, group in clustered_df.groupby('CLUSTER_ID'):
-        # Add cluster header to profiling string
-        profiling_string += f"CLUSTER {name}\n"
-        
-        # Sort the group by distance
-        sorted_group = group.sort_values(by='DISTANCE', ascending=True)
-        
-        # Get the top 20 most representative topics
-        most_representative_topics = sorted_group.reindex().topic.tolist()[:20]
-        
-        # Add each topic to the profiling string
-        for topic in most_representative_topics:
-            profiling_string += f"- {topic}\n"
+# CATPCA keeps its fitted model as a list of tables: the loadings, the scaling statistics and,
+# when the data has categorical columns, the quantification. Each one is persisted to its own
+# table and the list is rebuilt in the same order, which is the order PAL_CATPCA_PROJECT expects
+CATPCA_MODEL_PARTS = ('LOADINGS', 'SCALING', 'QUANTIFICATION')
 
-    generated_labels=label_clusters(profiling_string)
+def save_catpca_model(connection, cpc, model_table):
+    for part, model in zip(CATPCA_MODEL_PARTS, cpc.model_):
+        model.save(f'{model_table}_{part}', force=True)
     
-    # Extract cluster labels from the generated labels
-    clusters_labels = [x.split(':') for x in generated_labels.split('CLUSTER')]
+    # A quantification left over from an earlier fit must not be read back with this one
+    cursor = connection.connection.cursor()
+    for part in CATPCA_MODEL_PARTS[len(cpc.model_):]:
+        if connection.has_table(f'{model_table}_{part}'):
+            cursor.execute(f'DROP TABLE "{model_table}_{part}"')
+    cursor.close()
 
-    # Filter out entries that do not contain exactly two elements
-    valid_clusters = [label for label in clusters_labels if len(label) == 2]
+def window_embeddings(connection, table_name, start_date, end_date):
+    return connection.sql(f"""
+        SELECT "project_number", "topic_embedding"
+        FROM "{table_name}"
+        WHERE "topic_embedding" IS NOT NULL
+          AND "project_date" >= TO_DATE('{start_date}') AND "project_date" < TO_DATE('{end_date}')
+    """)
 
-    # Initialize an empty dictionary for cluster names
-    clusters_dict = {}
+# The persisted projection only stands in for a new fit when the requested window lies inside the
+# one it was fitted on and that window still holds the same rows (none added, deleted or backfilled)
+def _fitted_window_covers(connection, model_table, window):
+    if not connection.has_table(f'{model_table}_WINDOW'):
+        return False
+    table_name, start_date, end_date = window
+    fitted = connection.table(f'{model_table}_WINDOW').collect().iloc[0]
+    if fitted['TABLE_NAME'] != table_name or not (fitted['START_DATE'] <= start_date and end_date <= fitted['END_DATE']):
+        return False
+    return window_embeddings(connection, table_name, fitted['START_DATE'], fitted['END_DATE']).count() == int(fitted['ROW_COUNT'])
 
-    # Iterate through each valid cluster and assign its name to the dictionary
-    for cluster in valid_clusters:
-        key = cluster[0].strip()  # Extract and clean the key
-        key = "{:0.0f}".format(float(key))  # Format key as a string without decimals
-        clusters_dict[key] = cluster[1]  # Assign the corresponding cluster name
+def load_catpca_model(connection, model_table):
+    parts = [part for part in CATPCA_MODEL_PARTS if connection.has_table(f'{model_table}_{part}')]
+    if parts[:2] != list(CATPCA_MODEL_PARTS[:2]):
+        return None
+    return [connection.table(f'{model_table}_{part}') for part in parts]
 
-    # Return the resulting dictionary
-    clusters_dict
+# Project the embeddings with the persisted CATPCA model, or fit one and persist it (with the
+# window it was fitted on) so later refreshes and assign_new_projects_to_clusters can transform with it.
+# window is the (table_name, start_date, end_date) hdf was selected with
+def project_embeddings(connection, hdf, model_table, n_components, window, refit=False):
+    cpc = CATPCA(scaling=True,
+                 thread_ratio=0.9,
+                 scores=True,
+                 n_components=n_components,
+                 component_tol=1e-5)
     
-    return df_tsne_with_cluster, clusters_dict
+    reuse = not refit and _fitted_window_covers(connection, model_table, window)
+    model = load_catpca_model(connection, model_table) if reuse else None
+    if model is not None:
+        cpc.model_ = model
+        return cpc.transform(data=hdf, key='project_number', n_components=n_components)
+    
+    cpc.fit(data=hdf, key='project_number')
+    save_catpca_model(connection, cpc, model_table)
+    table_name, start_date, end_date = window
+    create_dataframe_from_pandas(connection,
+                                 pd.DataFrame({"TABLE_NAME": [table_name], "START_DATE": [start_date],
+                                               "END_DATE": [end_date], "ROW_COUNT": [int(hdf.count())]}),
+                                 f'{model_table}_WINDOW',
+                                 force=True)
+    return cpc.scores_
+
+# PAL cannot resume or stop a fit early, so the layout is a single run of n_iter iterations
+def _fit_tsne(data, key, perplexity, settings):
+    tsne = TSNE(n_iter = settings["n_iter"],
+                random_state = 1,
+                n_components = 2,
+                angle = settings["angle"],
+                exaggeration = 20,
+                learning_rate = 10,
+                perplexity = perplexity,
+                object_frequency = 50,
+                thread_ratio = 0.5)
+    df_tsne_res, _, _ = tsne.fit_predict(data = data, key = key)
+    return df_tsne_res
+
+# Place points at the inverse-distance weighted mean of their nearest fitted neighbours'
+# 2-D coordinates (chunked to bound the distance matrix)
+def place_by_neighbours(vectors, fitted_vectors, fitted_xy, n_neighbors=5):
+    k = min(n_neighbors, len(fitted_vectors))
+    positions = np.empty((len(vectors), 2))
+    for start in range(0, len(vectors), 512):
+        chunk = vectors[start:start + 512]
+        chunk_distances = np.linalg.norm(chunk[:, None, :] - fitted_vectors[None, :, :], axis=2)
+        neighbours = np.argpartition(chunk_distances, k - 1, axis=1)[:, :k]
+        neighbour_distances = np.take_along_axis(chunk_distances, neighbours, axis=1)
+        weights = 1.0 / (neighbour_distances + 1e-9)
+        weights /= weights.sum(axis=1, keepdims=True)
+        positions[start:start + 512] = np.einsum('nk,nkd->nd', weights, fitted_xy[neighbours])
+    return positions
+
+# Compute the 2-D t-SNE layout of the projected vectors; returns the layout and a summary of how it was computed
+def tsne_layout(connection, data, key, perplexity, result_table_name, settings=None):
+    settings = {**TSNE_SETTINGS, **(settings or {})}
+    n_rows = data.count()
+    
+    # Small inputs (or sampling disabled): embed every point
+    if not settings["landmarks"] or n_rows <= settings["landmarks"]:
+        df_tsne_res = _fit_tsne(data, key, perplexity, settings)
+        return df_tsne_res, {"rows": n_rows, "landmarks": n_rows, "n_iter": settings["n_iter"], "angle": settings["angle"]}
+    
+    # Embed exactly `landmarks` points evenly spaced in key order, so the same data gives the
+    # same sample (and layout) on every run; materialized so it stays fixed while it is used
+    landmarks, columns = settings["landmarks"], ', '.join(f'"{c}"' for c in data.columns)
+    landmarks_table = f'{result_table_name}_TSNE_LANDMARKS'
+    connection.sql(f"""
+        SELECT {columns} FROM (
+            SELECT {columns}, ROW_NUMBER() OVER (ORDER BY "{key}") AS LANDMARK_RN
+            FROM ({data.select_statement})
+        ) WHERE MOD(LANDMARK_RN * {landmarks}, {n_rows}) < {landmarks}
+    """).save(landmarks_table, force=True)
+    landmark_res = _fit_tsne(connection.table(landmarks_table), key, perplexity, settings)
+    
+    # Place the remaining points out-of-sample from their nearest landmarks
+    vectors = data.collect()
+    vectors.columns = [str(c) for c in vectors.columns]
+    layout = landmark_res.collect()
+    x_col, y_col = layout.columns[1], layout.columns[2]
+    feature_cols = [c for c in vectors.columns if c != key]
+    
+    landmarks = vectors.merge(layout, on=key)
+    rest = vectors[~vectors[key].isin(layout[key])]
+    positions = place_by_neighbours(rest[feature_cols].to_numpy(dtype=np.float64),
+                                    landmarks[feature_cols].to_numpy(dtype=np.float64),
+                                    landmarks[[x_col, y_col]].to_numpy(dtype=np.float64),
+                                    settings["n_neighbors"])
+    placed = pd.DataFrame({key: rest[key].to_numpy(), x_col: positions[:, 0], y_col: positions[:, 1]})
+    
+    full_layout = pd.concat([layout, placed], ignore_index=True)
+    df_tsne_res = create_dataframe_from_pandas(connection, full_layout, f'{result_table_name}_TSNE', force=True)
+    return df_tsne_res, {"rows": n_rows, "landmarks": len(layout), "n_iter": settings["n_iter"], "angle": settings["angle"]}
 
-def label_clusters(profiling_string):
-    prompt=f"You will help to analyze the result of a machine learnirn algorithm for clustering on text data. \
-    The algorithm was used to find clusters in topics of customer advisory servises around various services of the SAP Cloud platform (BTP). \
-    For each cluster, find a good label based on the topics of a few datapoint samples.\
-    Return the output in the following format: \n CLUSTER 1 : label CLUSTER 2 : label ....\ \n do not add anythng other than clusters named and labels\
-    \n{profiling_string} "
-    messages = [{"role": "user", "content": prompt} ]
-    kwargs = dict(model_name='gpt-4o', messages=messages)
-    response = chat.completions.create(**kwargs)
-    return response.to_dict()["choices"][0]["message"]["content"].strip()
+# Place projects that are not yet in the clustering result using the persisted CATPCA
+# projection, KMeans centroids and t-SNE layout instead of recomputing everything
+def assign_new_projects_to_clusters(connection,
+                                    table_name,
+                                    result_table_name,
+                                    n_components,
+                                    start_date='1900-01-01',
+                                    end_date=datetime.now().strftime('%Y-%m-%d'),
+                                    n_neighbors=5,                  ## neighbours used to interpolate the 2-D position
+                                    drift_threshold=1.5             ## max ratio of new vs. fitted mean centroid distance
+                                    ):
+    
+    model_table = f'{result_table_name}_CATPCA_MODEL'
+    pca_table = f'{result_table_name}_PCA'
+    centroids_table = f'{result_table_name}_CENTROIDS'
+    
+    # Without a persisted fit there is nothing to assign against
+    model = load_catpca_model(connection, model_table)
+    if model is None or not all(connection.has_table(t) for t in (result_table_name, pca_table, centroids_table)):
+        return {"assigned": 0, "refit_required": True, "reason": "no persisted clustering model"}
+    
+    # Projects in the date window that are not placed on the map yet
+    new_hdf = connection.sql(f"""
+        SELECT a."project_number", a."topic_embedding"
+        FROM "{table_name}" a
+        WHERE a."topic_embedding" IS NOT NULL
+          AND a."project_date" >= TO_DATE('{start_date}') AND a."project_date" < TO_DATE('{end_date}')
+          AND a."project_number" NOT IN (SELECT "PROJECT_NUMBER" FROM "{result_table_name}")
+    """)
+    
+    # Project the new embeddings with the stored CATPCA model
+    cpc = CATPCA(scaling=True,
+                 thread_ratio=0.9,
+                 scores=True,
+                 n_components=n_components,
+                 component_tol=1e-5)
+    cpc.model_ = model
+    new_scores = cpc.transform(data=new_hdf, key='project_number', n_components=n_components)
+    new_pivot = new_scores.pivot_table(columns = 'COMPONENT_ID',
+                                       values = 'COMPONENT_SCORE',
+                                       index = 'project_number',
+                                       aggfunc = 'AVG').collect()
+    
+    if new_pivot.empty:
+        return {"assigned": 0, "refit_required": False}
+    
+    # Align projected components with the centroid columns by name
+    centroids = connection.table(centroids_table).collect()
+    centroids.columns = [str(c) for c in centroids.columns]
+    new_pivot.columns = [str(c) for c in new_pivot.columns]
+    feature_cols = [c for c in centroids.columns if c != 'CLUSTER_ID']
+    
+    new_vectors = new_pivot[feature_cols].to_numpy(dtype=np.float64)
+    centroid_vectors = centroids[feature_cols].to_numpy(dtype=np.float64)
+    
+    # Nearest centroid (KMeans was fitted with euclidean distance)
+    centroid_distances = np.linalg.norm(new_vectors[:, None, :] - centroid_vectors[None, :, :], axis=2)
+    nearest_centroid = centroid_distances.argmin(axis=1)
+    cluster_ids = centroids['CLUSTER_ID'].to_numpy()[nearest_centroid]
+    distances = centroid_distances[np.arange(len(new_vectors)), nearest_centroid]
+    
+    # Existing layout and projected vectors of the already placed projects
+    layout = connection.sql(f'SELECT "PROJECT_NUMBER", "x", "y", "DISTANCE" FROM "{result_table_name}"').collect()
+    fitted = connection.table(pca_table).collect()
+    fitted.columns = [str(c) for c in fitted.columns]
+    fitted = fitted.rename(columns={'project_number': 'PROJECT_NUMBER'}).merge(layout, on='PROJECT_NUMBER')
+    fitted_vectors = fitted[feature_cols].to_numpy(dtype=np.float64)
+    fitted_xy = fitted[['x', 'y']].to_numpy(dtype=np.float64)
+    
+    if len(fitted_vectors) == 0:
+        return {"assigned": 0, "new_projects": len(new_vectors), "refit_required": True,
+                "reason": "no placed projects to interpolate from"}
+    
+    # Place each new project from its nearest neighbours' t-SNE coordinates
+    positions = place_by_neighbours(new_vectors, fitted_vectors, fitted_xy, n_neighbors)
+    
+    # Drift: how much farther from their centroids the new projects are than the fitted ones
+    fitted_mean_distance = float(layout['DISTANCE'].mean()) if not layout.empty else 0.0
+    drift_ratio = float(distances.mean()) / fitted_mean_distance if fitted_mean_distance > 0 else float('inf')
+    refit_required = drift_ratio > drift_threshold
+    
+    if not refit_required:
+        project_numbers = new_pivot['project_number'].tolist()
+        cursor = connection.connection.cursor()
+        cursor.executemany(
+            f'INSERT INTO "{result_table_name}" ("PROJECT_NUMBER", "x", "y", "CLUSTER_ID", "DISTANCE") VALUES (?, ?, ?, ?, ?)',
+            [(project_numbers[i], float(positions[i, 0]), float(positions[i, 1]), int(cluster_ids[i]), float(distances[i]))
+             for i in range(len(project_numbers))]
+        )
+        # Keep the projected vectors so later increments can use these projects as neighbours
+        pca_columns = ', '.join(f'"{c}"' for c in ['project_number'] + feature_cols)
+        placeholders = ', '.join('?' for _ in range(len(feature_cols) + 1))
+        cursor.executemany(
+            f'INSERT INTO "{pca_table}" ({pca_columns}) VALUES ({placeholders})',
+            [(project_numbers[i],) + tuple(float(v) for v in new_vectors[i]) for i in range(len(project_numbers))]
+        )
+        cursor.close()
+    
+    return {
+        "assigned": 0 if refit_required else len(new_vectors),
+        "new_projects": len(new_vectors),
+        "drift_ratio": drift_ratio,
+        "refit_required": refit_required
+    }
 
 #Perform a vector search on the table using the specified metric and return the top k results
 def run_vector_search(cc: ConnectionContext,\
@@ -150,6 +375,9 @@ def run_vector_search(cc: ConnectionContext,\
                       vector_col, \
                       columns_to_return):
     
+    # Reuse the cached query embedding and bind it instead of embedding the text in every statement
+    query_vector = get_query_embedding(cc, query, 'QUERY', 'SAP_NEB.20240715')
+    
     cursor = cc.connection.cursor()
     
     return_columns_string = '''  '''
@@ -157,9 +385,57 @@ def run_vector_search(cc: ConnectionContext,\
        return_columns_string+=''' "{}", '''.format(c) 
         
     sql = '''SELECT TOP {k} {cols}  
-        COSINE_SIMILARITY("{vector_col}", VECTOR_EMBEDDING('{query}', 'QUERY', 'SAP_NEB.20240715')) AS "COSINE_SIMILARITY"
+        COSINE_SIMILARITY("{vector_col}", TO_REAL_VECTOR(?)) AS "COSINE_SIMILARITY"
         FROM "{table_name}"
-        ORDER BY "COSINE_SIMILARITY" DESC'''.format(k=k, cols=return_columns_string,vector_col=vector_col, query=query, table_name=table_name)
-    cursor.execute(sql)
+        ORDER BY "COSINE_SIMILARITY" DESC'''.format(k=k, cols=return_columns_string,vector_col=vector_col, table_name=table_name)
+    cursor.execute(sql, (query_vector,))
     hdf = cursor.fetchall()
+    cursor.close()
     return hdf[:k]
+
+#Perform one vector search per query in a single statement and return the top k results of each query
+def run_vector_search_batch(cc: ConnectionContext,\
+                            queries, \
+                            k, \
+                            table_name, \
+                            vector_col, \
+                            columns_to_return):
+    
+    if not queries:
+        return []
+    
+    # Embed all queries at once, reusing cached embeddings
+    query_vectors = get_query_embeddings(cc, queries, 'QUERY', 'SAP_NEB.20240715')
+    
+    # One row per query with its bound vector
+    queries_sql = "\n            UNION ALL\n            ".join(
+        f"SELECT {i} AS QUERY_ID, TO_REAL_VECTOR(?) AS QUERY_VECTOR FROM DUMMY" for i in range(len(queries))
+    )
+    return_columns_string = ''.join(f't."{c}", ' for c in columns_to_return)
+    outer_columns_string = ''.join(f'"{c}", ' for c in columns_to_return)
+    
+    # Rank the rows per query and only transfer the top k of each
+    sql = f'''SELECT QUERY_ID, {outer_columns_string}"COSINE_SIMILARITY" FROM (
+            SELECT QUERY_ID, {outer_columns_string}"COSINE_SIMILARITY",
+                   ROW_NUMBER() OVER (PARTITION BY QUERY_ID ORDER BY "COSINE_SIMILARITY" DESC) AS SEARCH_RANK
+            FROM (
+                SELECT q.QUERY_ID, {return_columns_string}
+                       COSINE_SIMILARITY(t."{vector_col}", q.QUERY_VECTOR) AS "COSINE_SIMILARITY"
+                FROM "{table_name}" t
+                CROSS JOIN (
+            {queries_sql}
+                ) q
+            ) scored
+        ) ranked
+        WHERE SEARCH_RANK <= {int(k)}
+        ORDER BY QUERY_ID, SEARCH_RANK'''
+    cursor = cc.connection.cursor()
+    cursor.execute(sql, tuple(query_vectors))
+    rows = cursor.fetchall()
+    cursor.close()
+    
+    # Group the rows back by query, keeping the query order
+    results = [[] for _ in queries]
+    for row in rows:
+        results[row[0]].append(tuple(row[1:]))
+    return results
@@ -1,6 +1,6 @@
 import os
+import time
 import configparser
-import pandas as pd
 
 from flask import Flask, request, jsonify
 from flask_cors import CORS
@@ -11,12 +11,16 @@ from hana_ml.text.pal_embeddings import PALEmbeddings
 
 # Check if the application is running on Cloud Foundry
 if 'VCAP_APPLICATION' in os.environ:
+    from app.embedding_cache import get_query_embedding  # works in CF
+    
     # Running on Cloud Foundry, use environment variables
     hanaURL = os.getenv('DB_ADDRESS')
     hanaPort = os.getenv('DB_PORT')
     hanaUser = os.getenv('DB_USER')
     hanaPW = os.getenv('DB_PASSWORD')
 else:
+    from embedding_cache import get_query_embedding  # works in local machine
+    
     # Not running on Cloud Foundry, read from config.ini file
     config = configparser.ConfigParser()
     config.read('config.ini')
@@ -30,64 +34,167 @@ connection = dataframe.ConnectionContext(hanaURL, hanaPort, hanaUser, hanaPW)
 app = Flask(__name__)
 CORS(app)
 
+# Function to create the BACKFILL_CHECKPOINT table if it doesn't exist
+def create_backfill_checkpoint_table_if_not_exists():
+    create_table_sql = """
+        DO BEGIN
+            DECLARE table_exists INT;
+            SELECT COUNT(*) INTO table_exists
+            FROM SYS.TABLES 
+            WHERE TABLE_NAME = 'BACKFILL_CHECKPOINT' AND SCHEMA_NAME = 'DBUSER';
+            
+            IF table_exists = 0 THEN
+                CREATE COLUMN TABLE DBUSER.BACKFILL_CHECKPOINT (
+                    JOB_NAME NVARCHAR(100) PRIMARY KEY,
+                    LAST_ID NVARCHAR(255),
+                    ROWS_PROCESSED BIGINT,
+                    UPDATED_AT TIMESTAMP
+                );
+            END IF;
+        END;
+    """
+    
+    # Execute the query
+    cursor = connection.connection.cursor()
+    cursor.execute(create_table_sql)
+    cursor.close()
+
+# Read the last processed ID and row count of a backfill job, if it was interrupted
+def load_backfill_checkpoint(job_name):
+    cursor = connection.connection.cursor()
+    cursor.execute("SELECT LAST_ID, ROWS_PROCESSED FROM DBUSER.BACKFILL_CHECKPOINT WHERE JOB_NAME = ?", (job_name,))
+    row = cursor.fetchone()
+    cursor.close()
+    return (row[0], row[1]) if row else (None, 0)
+
+def save_backfill_checkpoint(job_name, last_id, rows_processed):
+    cursor = connection.connection.cursor()
+    cursor.execute("""
+        UPSERT DBUSER.BACKFILL_CHECKPOINT (JOB_NAME, LAST_ID, ROWS_PROCESSED, UPDATED_AT)
+        VALUES (?, ?, ?, CURRENT_UTCTIMESTAMP) WITH PRIMARY KEY
+    """, (job_name, str(last_id), rows_processed))
+    cursor.close()
+
+def clear_backfill_checkpoint(job_name):
+    cursor = connection.connection.cursor()
+    cursor.execute("DELETE FROM DBUSER.BACKFILL_CHECKPOINT WHERE JOB_NAME = ?", (job_name,))
+    cursor.close()
+
+# Session temporary table holding the rows of the current backfill batch
+def create_backfill_batch_table():
+    cursor = connection.connection.cursor()
+    cursor.execute("SELECT COUNT(*) FROM M_TEMPORARY_TABLES WHERE TABLE_NAME = '#BACKFILL_BATCH' AND CONNECTION_ID = CURRENT_CONNECTION")
+    if cursor.fetchone()[0] == 0:
+        cursor.execute("""
+            CREATE LOCAL TEMPORARY COLUMN TABLE #BACKFILL_BATCH AS (
+                SELECT ID, TOPIC, SOLUTION FROM DBUSER.KNOWLEDGE_BASE_MANUAL
+            ) WITH NO DATA
+        """)
+    cursor.close()
+
 @app.route('/generate_text_embeddings_my_knowledgebase', methods=['POST'])
 def update_embeddings_in_db():
+    job_name = 'KNOWLEDGE_BASE_MANUAL'
+    data = request.get_json(silent=True) or {}
+    restart = data.get('restart', False)  # Ignore a previous checkpoint
     try:
-        # Run a lightweight query to get only the TEXT_IDs that need embeddings:
-        sql_select_ids = """
-            SELECT ID FROM DBUSER.KNOWLEDGE_BASE_MANUAL WHERE TOPIC_EMBEDDING IS NULL
-        """
-        text_id_df = connection.sql(sql_select_ids).collect()
+        batch_size = int(data.get('batch_size', 100))  # Rows embedded per PALEmbeddings call
+        # Optional limit per call; the next call resumes from the checkpoint
+        max_batches = None if data.get('max_batches') is None else int(data.get('max_batches'))
+    except (TypeError, ValueError):
+        return jsonify({"error": "batch_size and max_batches must be integers"}), 400
+    
+    if batch_size <= 0 or (max_batches is not None and max_batches <= 0):
+        return jsonify({"error": "batch_size and max_batches must be positive"}), 400
+    
+    try:
+        create_backfill_checkpoint_table_if_not_exists()
+        
+        # Resume after the last ID of an interrupted run
+        if restart:
+            clear_backfill_checkpoint(job_name)
+        last_id, total_processed = load_backfill_checkpoint(job_name)
         
-        if text_id_df.empty:
-            return jsonify({"message": "No records found without embeddings."}), 200
+        sql_update = """
+            UPDATE DBUSER.KNOWLEDGE_BASE_MANUAL
+            SET TOPIC_EMBEDDING = ?,
+            SOLUTION_EMBEDDING = ?
+            WHERE ID = ?
+        """
         
-        # Ensure it's now a DataFrame-like structure
-        if isinstance(text_id_df, pd.DataFrame):
-            # Extract TEXT_IDs into a list
-            text_id_list = text_id_df['ID'].tolist()
-        else:
-            return jsonify({"error": "Unexpected data format for IDs"}), 500
+        # Next batch of rows without embeddings, in ID order so the checkpoint is meaningful. The
+        # batch is copied into a session temporary table with bound values, since PALEmbeddings
+        # reads a hana_ml DataFrame and ConnectionContext.sql takes no parameters
+        create_backfill_batch_table()
+        sql_select_batch = """
+            INSERT INTO #BACKFILL_BATCH
+            SELECT ID, TOPIC, SOLUTION FROM (
+                SELECT ID, TOPIC, SOLUTION
+                FROM DBUSER.KNOWLEDGE_BASE_MANUAL
+                WHERE TOPIC_EMBEDDING IS NULL {id_filter}
+                ORDER BY ID
+                LIMIT ?
+            )
+        """
         
-        # Initialize a counter for the number of records processed
+        pe = PALEmbeddings()
         records_processed = 0
+        batches = 0
+        completed = False
+        started = time.monotonic()
         
-        # Loop through the TEXT_IDs and fetch their corresponding TEXT values one by one:
-        for text_id in text_id_list:
-            sql_select_text = f"""
-                SELECT ID, TOPIC, SOLUTION FROM DBUSER.KNOWLEDGE_BASE_MANUAL WHERE ID = '{text_id}'
-            """
+        while max_batches is None or batches < max_batches:
+            cursor = connection.connection.cursor()
+            cursor.execute("DELETE FROM #BACKFILL_BATCH")
+            if last_id is None:
+                cursor.execute(sql_select_batch.format(id_filter=""), (batch_size,))
+            else:
+                cursor.execute(sql_select_batch.format(id_filter="AND ID > ?"), (last_id, batch_size))
+            cursor.execute("SELECT COUNT(*), MAX(ID) FROM #BACKFILL_BATCH")
+            batch_rows, batch_last_id = cursor.fetchone()
+            cursor.close()
+            
+            if not batch_rows:
+                completed = True
+                break
+            batch_hdf = connection.table('#BACKFILL_BATCH')
+            
+            # Generate the embeddings of the whole batch in one PAL call
+            embedding_df = pe.fit_transform(data=batch_hdf, key="ID", target=["TOPIC", "SOLUTION"])
+            embedding_records = embedding_df.collect().to_dict(orient="records")
+            
+            # Write the batch back in a single round trip
+            cursor = connection.connection.cursor()
+            cursor.executemany(sql_update, [
+                (record["VECTOR_COL_TOPIC"], record["VECTOR_COL_SOLUTION"], record["ID"])
+                for record in embedding_records
+            ])
+            cursor.close()
+            
+            last_id = batch_last_id
+            records_processed += len(embedding_records)
+            batches += 1
+            save_backfill_checkpoint(job_name, last_id, total_processed + records_processed)
             
-            text_df = connection.sql(sql_select_text)
-
-            # Check if text_df is not empty
-            if not text_df.collect().empty:
-                # Generate embedding
-                pe = PALEmbeddings()
-                embedding_df = pe.fit_transform(data=text_df, key="ID", target=["TOPIC", "SOLUTION"])
-
-                # Convert embedding to proper format
-                embedding_records = embedding_df.collect().to_dict(orient="records")
-                
-                if embedding_records:
-                    # Update database
-                    sql_update = """
-                        UPDATE DBUSER.KNOWLEDGE_BASE_MANUAL
-                        SET TOPIC_EMBEDDING = ?,
-                        SOLUTION_EMBEDDING = ?
-                        WHERE ID = ?
-                    """
-                    cursor = connection.connection.cursor()
-                    cursor.execute(sql_update, 
-                                   (embedding_records[0]["VECTOR_COL_TOPIC"], 
-                                    embedding_records[0]["VECTOR_COL_SOLUTION"], 
-                                    text_id))
-                    cursor.close()
-                    
-                    # Increment the counter
-                    records_processed += 1
-                    
-        return jsonify({"message": f"Embeddings updated successfully. Records processed: {records_processed}"}), 200
+            elapsed = time.monotonic() - started
+            print(f"Backfill batch {batches}: {len(embedding_records)} rows, "
+                  f"{records_processed / elapsed:.1f} rows/sec, last ID {last_id}")
+        
+        # A finished run starts from scratch next time, so later inserts are picked up
+        if completed:
+            clear_backfill_checkpoint(job_name)
+        
+        elapsed = time.monotonic() - started
+        return jsonify({
+            "message": f"Embeddings updated successfully. Records processed: {records_processed}",
+            "records_processed": records_processed,
+            "total_records_processed": total_processed + records_processed,
+            "batches": batches,
+            "elapsed_seconds": elapsed,
+            "rows_per_second": records_processed / elapsed if elapsed > 0 else 0.0,
+            "last_id": None if last_id is None else str(last_id),
+            "completed": completed
+        }), 200
     
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -169,22 +276,26 @@ def compare_text_to_existing():
     text_type = data.get('text_type', 'QUERY')
     model_version = data.get('model_version', 'SAP_NEB.20240715')
 
-    # Generate the new text's embedding and compare using COSINE_SIMILARITY
-    sql_query = f"""
+    # Embed the query text once (cached across requests) and bind it to the similarity query
+    try:
+        query_vector = get_query_embedding(connection, query_text, text_type, model_version)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    sql_query = """
         SELECT TOP 5
             TEXT, 
-            COSINE_SIMILARITY(
-                VECTOR, 
-                VECTOR_EMBEDDING('{query_text}', '{text_type}', '{model_version}')
-            ) AS SIMILARITY
+            COSINE_SIMILARITY(VECTOR, TO_REAL_VECTOR(?)) AS SIMILARITY
         FROM tcm_sample
         ORDER BY SIMILARITY DESC
     """
-    hana_df = dataframe.DataFrame(connection, sql_query)
-    similarities = hana_df.collect()  # Return results as a pandas DataFrame
+    cursor = connection.connection.cursor()
+    cursor.execute(sql_query, (query_vector,))
+    columns = [column[0] for column in cursor.description]
 
     # Convert results to a list of dictionaries for JSON response
-    results = similarities.to_dict(orient='records')
+    results = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    cursor.close()
     return jsonify({"similarities": results}), 200
 
 @app.route('/', methods=['GET'])
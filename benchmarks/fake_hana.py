@@ -0,0 +1,382 @@
+"""SQLite-backed stand-in for the parts of hana_ml/hdbcli used by app/api.py.
+
+SQL is translated just enough for the statements the API issues, and the
+HANA vector functions are provided as SQLite functions backed by NumPy with a
+deterministic hash embedder. Vectors are stored in the fvecs layout hdbcli
+returns for REAL_VECTOR (uint32 dimension followed by float32 values).
+"""
+import hashlib
+import re
+import sqlite3
+import struct
+import threading
+from datetime import datetime
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+EMBEDDING_DIM = 256
+SCHEMAS = ('DBUSER',)
+
+
+# Deterministic bag-of-words hash embedding, L2-normalized
+def hash_embedding(text):
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    for token in re.findall(r'\w+', (text or '').lower()):
+        digest = hashlib.blake2b(token.encode(), digest_size=8).digest()
+        bucket = int.from_bytes(digest[:4], 'little') % EMBEDDING_DIM
+        vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def to_fvecs(vector):
+    return struct.pack('<I', len(vector)) + np.asarray(vector, dtype='<f4').tobytes()
+
+
+def from_fvecs(value):
+    dim = struct.unpack_from('<I', value)[0]
+    return np.frombuffer(value, dtype='<f4', count=dim, offset=4)
+
+
+def _vector_embedding(text, text_type=None, model_version=None):
+    return to_fvecs(hash_embedding(text))
+
+
+def _cosine_similarity(a, b):
+    if a is None or b is None:
+        return None
+    a, b = from_fvecs(a), from_fvecs(b)
+    denominator = float(np.linalg.norm(a) * np.linalg.norm(b))
+    return float(a @ b) / denominator if denominator else 0.0
+
+
+def _to_real_vector(value):
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value)
+    return to_fvecs([float(x) for x in str(value).strip('[] ').split(',') if x.strip()])
+
+
+def _to_nvarchar(value):
+    if isinstance(value, (bytes, bytearray)):
+        return '[' + ','.join(repr(float(x)) for x in from_fvecs(value)) + ']'
+    return None if value is None else str(value)
+
+
+def _seconds_between(start, end):
+    parse = lambda value: datetime.fromisoformat(str(value))
+    return (parse(end) - parse(start)).total_seconds()
+
+
+def _translate_column(definition):
+    definition = definition.strip()
+    name, rest = definition.split(None, 1)
+    # HANA stores unquoted identifiers in upper case
+    if not name.startswith('"') and name.upper() not in ('PRIMARY', 'UNIQUE', 'CONSTRAINT', 'FOREIGN'):
+        name = f'"{name.upper()}"'
+    embedding = re.search(r'GENERATED ALWAYS AS (VECTOR_EMBEDDING\(.*\))', rest, re.S)
+    if embedding:
+        return f'{name} BLOB GENERATED ALWAYS AS ({embedding.group(1)}) STORED'
+    if 'GENERATED BY DEFAULT AS IDENTITY' in rest:
+        return f'{name} INTEGER PRIMARY KEY'
+    column_type = re.sub(r'N?VARCHAR\(\d+\)', 'TEXT', rest)
+    column_type = re.sub(r'\b(DOUBLE|REAL)\b', 'REAL', column_type)
+    column_type = re.sub(r'\bREAL_VECTOR\b', 'BLOB', column_type)
+    column_type = re.sub(r'\b(TIMESTAMP|DATE)\b', 'TEXT', column_type)
+    column_type = re.sub(r'\b(BIGINT|INT|INTEGER)\b', 'INTEGER', column_type)
+    return f'{name} {column_type}'
+
+
+def _split_columns(body):
+    columns, depth, current = [], 0, ''
+    for char in body:
+        depth += char == '('
+        depth -= char == ')'
+        if char == ',' and depth == 0:
+            columns.append(current)
+            current = ''
+        else:
+            current += char
+    columns.append(current)
+    return [column for column in columns if column.strip()]
+
+
+# Rewrite a HANA statement into one or more SQLite statements
+def translate(sql):
+    for schema in SCHEMAS:
+        sql = re.sub(rf'\b{schema}\.', '', sql, flags=re.I)
+
+    # Anonymous DDL blocks only ever create missing tables
+    if re.match(r'\s*DO\s+BEGIN', sql, re.I):
+        statements = []
+        for name, body in re.findall(r'CREATE (?:COLUMN )?TABLE\s+([\w"]+)\s*\((.*?)\)\s*;', sql, re.S | re.I):
+            columns = ', '.join(_translate_column(column) for column in _split_columns(body))
+            statements.append(f'CREATE TABLE IF NOT EXISTS {name} ({columns})')
+        return statements
+
+    # SQLite locks the whole database; a no-op write takes the write lock up front
+    if re.match(r'\s*LOCK TABLE', sql, re.I):
+        return ['UPDATE DUMMY SET DUMMY = DUMMY WHERE 0']
+
+    sql = re.sub(r'^\s*TRUNCATE TABLE', 'DELETE FROM', sql, flags=re.I)
+    sql = re.sub(r'^\s*UPSERT\s+([\w"]+)\s*', r'INSERT OR REPLACE INTO \1 ', sql, flags=re.I)
+    sql = re.sub(r'WITH PRIMARY KEY\s*$', '', sql.rstrip(), flags=re.I)
+    sql = sql.replace('CURRENT_UTCTIMESTAMP', 'CURRENT_TIMESTAMP')
+    sql = sql.replace('CURRENT_IDENTITY_VALUE()', 'last_insert_rowid()')
+
+    # SELECT TOP n ... -> SELECT ... LIMIT n (outermost statement only)
+    top = re.match(r'\s*SELECT\s+TOP\s+(\d+)\s', sql, re.I)
+    if top:
+        sql = re.sub(r'TOP\s+\d+\s', '', sql, count=1, flags=re.I) + f' LIMIT {top.group(1)}'
+    return [sql]
+
+
+class RoundTripCounter(threading.local):
+    """Per-thread count of statements and fetched rows, reset by the benchmark per request."""
+
+    def __init__(self):
+        self.round_trips = 0
+        self.rows_fetched = 0
+
+
+counter = RoundTripCounter()
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self._connection = connection
+        self._cursor = connection._db.cursor()
+        self._sql = ''
+        self.description = None
+        self.rowcount = -1
+
+    def _describe(self):
+        if self._cursor.description is None:
+            self.description = None
+            return
+        # HANA upper-cases unquoted identifiers and aliases; columns that only come from a
+        # SELECT * keep the name they were created with
+        self.description = [
+            (name if f'"{name}"' in self._sql or not re.search(rf'\b{re.escape(name)}\b', self._sql)
+             else name.upper(),) + tuple(column[1:])
+            for column in self._cursor.description
+            for name in [column[0]]
+        ]
+
+    def execute(self, sql, parameters=()):
+        counter.round_trips += 1
+        self._sql = sql
+        for statement in translate(sql):
+            self._cursor.execute(statement, tuple(parameters))
+        self.rowcount = self._cursor.rowcount
+        self._describe()
+        if self._connection.autocommit:
+            self._connection._db.commit()
+        return True
+
+    def executemany(self, sql, parameters):
+        counter.round_trips += 1
+        self._sql = sql
+        for statement in translate(sql):
+            self._cursor.executemany(statement, [tuple(p) for p in parameters])
+        self.rowcount = self._cursor.rowcount
+        self._describe()
+        if self._connection.autocommit:
+            self._connection._db.commit()
+
+    def prepare(self, sql):
+        counter.round_trips += 1
+        self._prepared_sql = sql
+
+    def executeprepared(self, parameters=()):
+        return self.execute(self._prepared_sql, parameters)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        counter.rows_fetched += row is not None
+        return row
+
+    def fetchmany(self, size=1):
+        rows = self._cursor.fetchmany(size)
+        counter.rows_fetched += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        counter.rows_fetched += len(rows)
+        return rows
+
+    def close(self):
+        self._cursor.close()
+
+
+class FakeHdbConnection:
+    """The subset of the hdbcli dbapi Connection used by the API."""
+
+    def __init__(self, path):
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.create_function('VECTOR_EMBEDDING', 3, _vector_embedding, deterministic=True)
+        self._db.create_function('COSINE_SIMILARITY', 2, _cosine_similarity, deterministic=True)
+        self._db.create_function('TO_REAL_VECTOR', 1, _to_real_vector, deterministic=True)
+        self._db.create_function('TO_NVARCHAR', 1, _to_nvarchar, deterministic=True)
+        self._db.create_function('TO_DATE', 1, lambda value: value, deterministic=True)
+        self._db.create_function('SECONDS_BETWEEN', 2, _seconds_between)
+        self.autocommit = True
+        self._closed = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def isconnected(self):
+        return not self._closed
+
+    def setautocommit(self, autocommit):
+        if not autocommit and self.autocommit:
+            self._db.execute('BEGIN')
+        elif autocommit and self._db.in_transaction:
+            self._db.commit()
+        self.autocommit = autocommit
+
+    def commit(self):
+        if self._db.in_transaction:
+            self._db.commit()
+        if not self.autocommit:
+            self._db.execute('BEGIN')
+
+    def rollback(self):
+        if self._db.in_transaction:
+            self._db.rollback()
+        if not self.autocommit:
+            self._db.execute('BEGIN')
+
+    def close(self):
+        self._closed = True
+        self._db.close()
+
+
+class FakeDataFrame:
+    """hana_ml.dataframe.DataFrame stand-in: a SQL statement that can be collected."""
+
+    def __init__(self, connection_context, select_statement):
+        self.connection_context = connection_context
+        self.select_statement = select_statement
+
+    def collect(self):
+        cursor = self.connection_context.connection.cursor()
+        cursor.execute(self.select_statement)
+        rows = cursor.fetchall()
+        columns = [column[0] for column in cursor.description]
+        cursor.close()
+        return pd.DataFrame(rows, columns=columns)
+
+    @property
+    def columns(self):
+        cursor = self.connection_context.connection.cursor()
+        cursor.execute(f'SELECT * FROM ({self.select_statement}) LIMIT 0')
+        columns = [column[0] for column in cursor.description]
+        cursor.close()
+        return columns
+
+    def count(self):
+        cursor = self.connection_context.connection.cursor()
+        cursor.execute(f'SELECT COUNT(*) FROM ({self.select_statement})')
+        rows = cursor.fetchone()[0]
+        cursor.close()
+        return rows
+
+    def save(self, table, force=False):
+        cursor = self.connection_context.connection.cursor()
+        if force:
+            cursor.execute(f'DROP TABLE IF EXISTS "{table}"')
+        cursor.execute(f'CREATE TABLE "{table}" AS {self.select_statement}')
+        cursor.close()
+        return self.connection_context.table(table)
+
+
+class FakeConnectionContext:
+    """hana_ml.dataframe.ConnectionContext stand-in over a shared SQLite file."""
+
+    def __init__(self, path):
+        self.connection = FakeHdbConnection(path)
+
+    def sql(self, sql):
+        return FakeDataFrame(self, sql)
+
+    def table(self, table):
+        return FakeDataFrame(self, f'SELECT * FROM "{table}"')
+
+    def has_table(self, table, schema=None):
+        cursor = self.connection._db.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+        return cursor.fetchone()[0] > 0
+
+    def close(self):
+        self.connection.close()
+
+
+# hana_ml.dataframe.create_dataframe_from_pandas stand-in
+def create_dataframe_from_pandas(connection_context, pandas_df, table_name, force=False, **kwargs):
+    pandas_df.to_sql(table_name, connection_context.connection._db, index=False,
+                     if_exists='replace' if force else 'append')
+    return connection_context.table(table_name)
+
+
+# Drop-in for the `dataframe` module imported by app/api.py
+fake_dataframe_module = SimpleNamespace(ConnectionContext=FakeConnectionContext, DataFrame=FakeDataFrame,
+                                        create_dataframe_from_pandas=create_dataframe_from_pandas)
+
+
+# Create the knowledge-base tables and fill them with synthetic advisories and comments
+def seed_database(path, projects=1000, comments_per_project=2, architects=20, seed=0):
+    rng = np.random.default_rng(seed)
+    vocabulary = [f'topic{i}' for i in range(500)] + ['integration', 'security', 'analytics', 'workflow',
+                                                      'extension', 'migration', 'hana', 'kyma', 'cap', 'ai']
+    sentence = lambda n: ' '.join(rng.choice(vocabulary, size=n))
+
+    db = FakeHdbConnection(path)
+    db._db.executescript("""
+        CREATE TABLE IF NOT EXISTS DUMMY (DUMMY TEXT);
+        DELETE FROM DUMMY;
+        INSERT INTO DUMMY VALUES ('X');
+        CREATE TABLE IF NOT EXISTS ADVISORIES4 (
+            "index" INTEGER, "architect" TEXT, "pcb_number" TEXT, "project_date" TEXT,
+            "project_number" INTEGER, "solution" TEXT, "topic" TEXT,
+            "topic_embedding" BLOB, "solution_embedding" BLOB
+        );
+        CREATE TABLE IF NOT EXISTS COMMENTS4 (
+            "index" INTEGER, "project_number" INTEGER, "comment" TEXT, "comment_date" TEXT,
+            "comment_embedding" BLOB
+        );
+        DELETE FROM ADVISORIES4;
+        DELETE FROM COMMENTS4;
+    """)
+
+    advisories, comments = [], []
+    for project in range(projects):
+        topic, solution = sentence(8), sentence(40)
+        date = f'{2020 + project % 5}-{1 + project % 12:02d}-{1 + project % 28:02d}'
+        advisories.append((project, f'architect{project % architects}', f'PCB{project}', date, project,
+                           solution, topic, to_fvecs(hash_embedding(topic)), to_fvecs(hash_embedding(solution))))
+        for _ in range(comments_per_project):
+            comment = sentence(20)
+            comments.append((len(comments), project, comment, date, to_fvecs(hash_embedding(comment))))
+
+    db._db.executemany('INSERT INTO ADVISORIES4 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', advisories)
+    db._db.executemany('INSERT INTO COMMENTS4 VALUES (?, ?, ?, ?, ?)', comments)
+
+    # A finished clustering run, as refresh_clusters would leave it (PAL is not available locally)
+    db._db.executescript("""
+        CREATE TABLE IF NOT EXISTS CLUSTERING (PROJECT_NUMBER TEXT, "x" REAL, "y" REAL, CLUSTER_ID INTEGER, DISTANCE REAL);
+        CREATE TABLE IF NOT EXISTS CLUSTERING_DATA (CLUSTER_ID INTEGER, CLUSTER_DESCRIPTION TEXT, EMBEDDING BLOB);
+        DELETE FROM CLUSTERING;
+        DELETE FROM CLUSTERING_DATA;
+    """)
+    db._db.executemany('INSERT INTO CLUSTERING VALUES (?, ?, ?, ?, ?)', [
+        (project, float(rng.normal()), float(rng.normal()), project % 8, float(rng.random()))
+        for project in range(projects)
+    ])
+    db._db.executemany('INSERT INTO CLUSTERING_DATA (CLUSTER_ID, CLUSTER_DESCRIPTION) VALUES (?, ?)',
+                       [(cluster, f'Cluster {cluster}') for cluster in range(8)])
+    db._db.commit()
+    db.close()
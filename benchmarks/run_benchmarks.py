@@ -0,0 +1,185 @@
+"""Benchmark the routes of app/api.py against the SQLite stand-in in fake_hana.
+
+Run from the repository root:
+
+    python -m benchmarks.run_benchmarks --projects 2000 --requests 50 --concurrency 4
+
+For every route it reports p50/p99 latency, throughput, SQL round trips and
+rows fetched per request, and the process peak RSS after the route ran.
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fake_hana import FakeConnectionContext, counter, fake_dataframe_module, seed_database
+
+CATEGORIES = {
+    "Integration": "Integration of SAP and third-party systems, APIs and events",
+    "Security": "Authentication, authorization, identity and data protection",
+    "Analytics": "Reporting, dashboards, data warehousing and analytics",
+    "Extensions": "Side-by-side extensions, CAP applications and Kyma workloads",
+    "AI": "Generative AI, machine learning and vector search scenarios"
+}
+QUERIES = ["integration security", "analytics dashboards", "kyma extension", "hana vector search", "workflow migration"]
+
+# (rule, method, path, request kwargs built from the request number)
+SCENARIOS = [
+    ('/', 'GET', '/', lambda i: {}),
+    ('/update_categories_and_projects', 'POST', '/update_categories_and_projects?full=true', lambda i: {"json": CATEGORIES}),
+    ('/update_categories_and_projects', 'POST', '/update_categories_and_projects',
+     lambda i: {"json": {**CATEGORIES, "AI": f"{CATEGORIES['AI']} (revision {i})"}}),
+    ('/score_new_projects', 'POST', '/score_new_projects', lambda i: {}),
+    ('/get_project_category_scores', 'GET', '/get_project_category_scores',
+     lambda i: {"query_string": {"project_number": i}}),
+    ('/get_all_project_categories', 'GET', '/get_all_project_categories', lambda i: {}),
+    ('/get_categories', 'GET', '/get_categories', lambda i: {}),
+    ('/get_advisories_by_expert_and_category', 'GET', '/get_advisories_by_expert_and_category',
+     lambda i: {"query_string": {"expert": f"architect{i % 20}"}}),
+    ('/get_clusters', 'GET', '/get_clusters', lambda i: {}),
+    ('/get_clusters', 'GET', '/get_clusters?format=columnar', lambda i: {}),
+    ('/get_clusters_description', 'GET', '/get_clusters_description', lambda i: {}),
+    ('/get_projects_by_architect_and_cluster', 'GET', '/get_projects_by_architect_and_cluster', lambda i: {}),
+    ('/insert_text_and_vector', 'POST', '/insert_text_and_vector',
+     lambda i: {"json": {"text": f"benchmark text {i} about integration"}}),
+    ('/insert_texts_and_vectors', 'POST', '/insert_texts_and_vectors',
+     lambda i: {"json": {"texts": [f"bulk text {i}-{j} about analytics" for j in range(200)], "batch_size": 100}}),
+    ('/insert_texts_and_vectors', 'POST', '/insert_texts_and_vectors',
+     lambda i: {"data": '\n'.join(json.dumps({"text": f"ndjson text {i}-{j}"}) for j in range(200)),
+                "content_type": 'application/x-ndjson'}),
+    ('/compare_text_to_existing', 'POST', '/compare_text_to_existing',
+     lambda i: {"json": {"query_text": QUERIES[i % len(QUERIES)]}}),
+    ('/compare_text_to_existing', 'POST', '/compare_text_to_existing',
+     lambda i: {"json": {"query_text": QUERIES[i % len(QUERIES)], "architect": f"architect{i % 20}",
+                         "start_date": "2022-01-01", "k": 10, "min_similarity": 0.1}}),
+    ('/vector_search_batch', 'POST', '/vector_search_batch',
+     lambda i: {"json": {"queries": [f"{query} {i}" for query in QUERIES * 10], "k": 5}}),
+    ('/get_project_details', 'GET', '/get_project_details', lambda i: {"query_string": {"project_number": i}}),
+    ('/get_all_projects', 'GET', '/get_all_projects', lambda i: {}),
+    ('/get_all_projects', 'GET', '/get_all_projects?limit=100', lambda i: {}),
+    ('/get_all_projects', 'GET', '/get_all_projects?format=ndjson', lambda i: {}),
+    ('/pool_stats', 'GET', '/pool_stats', lambda i: {}),
+    ('/metrics', 'GET', '/metrics', lambda i: {}),
+    ('/response_cache_stats', 'GET', '/response_cache_stats', lambda i: {}),
+    ('/schema_stats', 'GET', '/schema_stats', lambda i: {}),
+    ('/embedding_cache_stats', 'GET', '/embedding_cache_stats', lambda i: {}),
+    ('/coalescing_stats', 'GET', '/coalescing_stats', lambda i: {}),
+    ('/startup_report', 'GET', '/startup_report', lambda i: {}),
+]
+
+# Routes that need PAL or a running job and cannot be exercised against SQLite
+UNSUPPORTED = {
+    '/refresh_clusters': 'runs PAL CATPCA/TSNE/KMeans',
+    '/refresh_clusters/<job_id>': 'polls a refresh job',
+    '/ann_index_stats': 'returns 404 unless ANN_INDEX_ENABLED=true',
+    '/embedding_snapshot': 'returns 404 unless EMBEDDING_SNAPSHOT_DIR is set',
+    '/embedding_snapshot/<job_id>': 'polls a snapshot export job',
+}
+
+
+# Import app/api.py with every HANA connection replaced by the SQLite stand-in
+def load_api(db_path, pool_size):
+    os.environ.setdefault('VCAP_APPLICATION', '{}')
+    os.environ.setdefault('HANA_POOL_SIZE', str(pool_size))
+    for name in ('DB_ADDRESS', 'DB_PORT', 'DB_USER', 'DB_PASSWORD'):
+        os.environ.setdefault(name, 'benchmark')
+
+    from app import api
+
+    connect = lambda: api.instrument_connection(FakeConnectionContext(db_path))
+    api.dataframe = fake_dataframe_module
+    api.pool._connect = connect
+    api.job_runner._connect = connect
+    if api.ann_mirror is not None:
+        api.ann_mirror._connect = connect
+    # Create the tables up front, so the first measured requests do not run the DDL
+    connection = connect()
+    api.schema_registry.bootstrap(connection)
+    connection.close()
+    return api
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_scenario(app, method, path, build_kwargs, requests, concurrency):
+    client = app.test_client()
+
+    def one(i):
+        counter.round_trips = counter.rows_fetched = 0
+        started = time.perf_counter()
+        response = client.open(path, method=method, **build_kwargs(i))
+        response.get_data()  # Drain streamed responses
+        return time.perf_counter() - started, response.status_code, counter.round_trips, counter.rows_fetched
+
+    one(0)  # Warm-up
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(one, range(requests)))
+    wall = time.perf_counter() - started
+
+    latencies = [result[0] for result in results]
+    return {
+        "requests": requests,
+        "errors": sum(1 for result in results if result[1] >= 400),
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "throughput_rps": requests / wall,
+        "round_trips_per_request": sum(result[2] for result in results) / requests,
+        "rows_fetched_per_request": sum(result[3] for result in results) / requests,
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--projects', type=int, default=1000, help='advisories in the synthetic knowledge base')
+    parser.add_argument('--comments-per-project', type=int, default=2)
+    parser.add_argument('--requests', type=int, default=50, help='timed requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=2, help='concurrent clients per scenario')
+    parser.add_argument('--routes', help='comma-separated routes to run (default: all)')
+    parser.add_argument('--json', dest='json_path', help='also write the results to this file')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, 'fake_hana.db')
+        seed_database(db_path, projects=args.projects, comments_per_project=args.comments_per_project)
+        api = load_api(db_path, pool_size=args.concurrency)
+
+        selected = set(args.routes.split(',')) if args.routes else None
+        results = {}
+        print(f"{'scenario':<58} {'p50 ms':>9} {'p99 ms':>9} {'req/s':>9} {'SQL/req':>8} {'rows/req':>9} {'RSS MB':>8} {'err':>4}")
+        for rule, method, path, build_kwargs in SCENARIOS:
+            if selected is not None and rule not in selected:
+                continue
+            result = run_scenario(api.app, method, path, build_kwargs, args.requests, args.concurrency)
+            results[f'{method} {path}'] = result
+            print(f"{method + ' ' + path:<58} {result['p50_ms']:>9.2f} {result['p99_ms']:>9.2f} "
+                  f"{result['throughput_rps']:>9.1f} {result['round_trips_per_request']:>8.1f} "
+                  f"{result['rows_fetched_per_request']:>9.1f} {result['peak_rss_mb']:>8.1f} {result['errors']:>4}")
+
+        # Make sure new routes do not silently go unmeasured
+        covered = {scenario[0] for scenario in SCENARIOS}
+        for rule in sorted({r.rule for r in api.app.url_map.iter_rules() if r.endpoint != 'static'}):
+            if rule not in covered:
+                print(f"not benchmarked: {rule} ({UNSUPPORTED.get(rule, 'no scenario')})")
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Benchmark the cluster labelling step offline with the local completions stand-in.
+
+Run from the repository root:
+
+    python -m benchmarks.run_labelling_benchmark --clusters 10 --latency-ms 800
+
+Reports the wall time and model requests of a cold run (no cached labels),
+a run where a few clusters changed and a fully cached run, each with serial
+and concurrent requests.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.fake_hana import FakeConnectionContext, seed_database
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app'))
+from labelling import ClusterLabeller, LocalCompletions  # noqa: E402
+from schema import SchemaRegistry  # noqa: E402
+
+
+def make_clusters(n_clusters, topics_per_cluster, seed):
+    rng = np.random.default_rng(seed)
+    vocabulary = [f'topic{i}' for i in range(500)] + ['integration', 'security', 'analytics', 'kyma', 'hana']
+    return {str(cluster_id): [' '.join(rng.choice(vocabulary, size=4)) for _ in range(topics_per_cluster)]
+            for cluster_id in range(n_clusters)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clusters', type=int, default=10)
+    parser.add_argument('--topics', type=int, default=20, help='representative topics per cluster')
+    parser.add_argument('--changed', type=int, default=2, help='clusters whose topics change between runs')
+    parser.add_argument('--latency-ms', type=float, default=500, help='simulated model latency per request')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, 'fake_hana.db')
+        seed_database(db_path, projects=10)
+
+        print(f"{'run':<34} {'seconds':>9} {'requests':>9} {'cache hits':>11}")
+        for max_workers in (1, 4):
+            connection = FakeConnectionContext(db_path)
+            registry = SchemaRegistry()
+            registry.ensure_static_tables(connection)
+            cursor = connection.connection.cursor()
+            cursor.execute(f'DELETE FROM {ClusterLabeller.table_name}')  # every setting starts cold
+            cursor.close()
+            clusters = make_clusters(args.clusters, args.topics, seed=0)
+            changed = dict(clusters)
+            changed.update(make_clusters(args.changed, args.topics, seed=1))
+
+            for run, cluster_topics in (('cold', clusters), ('changed', changed), ('cached', changed)):
+                completions = LocalCompletions(latency_seconds=args.latency_ms / 1000)
+                labeller = ClusterLabeller(completions=completions, schema_registry=registry, max_workers=max_workers)
+                started = time.perf_counter()
+                labels = labeller.label(connection, cluster_topics)
+                seconds = time.perf_counter() - started
+                assert len(labels) == len(cluster_topics)
+                print(f"{f'{run}, {max_workers} worker(s)':<34} {seconds:>9.2f} {completions.calls:>9} {labeller.cache_hits:>11}")
+            connection.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""Shared fixtures: the app modules run against the SQLite stand-in in benchmarks/fake_hana.py.
+
+The app is imported the way it runs on Cloud Foundry (``app.<module>``), as
+the benchmark does, so VCAP_APPLICATION is set before any app module is imported.
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+os.environ.setdefault('VCAP_APPLICATION', '{}')
+for name in ('DB_ADDRESS', 'DB_PORT', 'DB_USER', 'DB_PASSWORD'):
+    os.environ.setdefault(name, 'test')
+
+from benchmarks.fake_hana import FakeConnectionContext, seed_database  # noqa: E402
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'fake_hana.db')
+    seed_database(path, projects=60, comments_per_project=1)
+    return path
+
+
+@pytest.fixture
+def connection(db_path):
+    connection = FakeConnectionContext(db_path)
+    yield connection
+    connection.close()
+
+
+@pytest.fixture(scope='session')
+def api(tmp_path_factory):
+    """app.api wired to one seeded database for the whole session, as the benchmark wires it."""
+    from benchmarks.run_benchmarks import load_api
+
+    path = str(tmp_path_factory.mktemp('api') / 'fake_hana.db')
+    seed_database(path, projects=60, comments_per_project=1)
+    return load_api(path, pool_size=2)
+
+
+@pytest.fixture
+def client(api):
+    return api.app.test_client()
@@ -0,0 +1,59 @@
+import pytest
+
+from app.ann_index import AnnMirror
+from benchmarks.fake_hana import FakeConnectionContext, hash_embedding, to_fvecs
+
+SOURCES = {
+    'ADVISORIES4': {"key": "index", "text": "solution", "vector": "solution_embedding"},
+    'COMMENTS4': {"key": "index", "text": "comment", "vector": "comment_embedding"}
+}
+
+
+@pytest.fixture
+def mirror(db_path):
+    return AnnMirror(lambda: FakeConnectionContext(db_path), 'DBUSER', SOURCES)
+
+
+def execute(connection, sql, params=()):
+    cursor = connection.connection.cursor()
+    cursor.execute(sql, params)
+    cursor.close()
+
+
+def test_sync_appends_new_rows_without_rebuilding(mirror, connection):
+    mirror.sync()
+    assert mirror.stats()["vectors"] == 120 and mirror.rebuilds == 1
+
+    execute(connection, 'INSERT INTO ADVISORIES4 ("index", "solution", "project_number", "solution_embedding") VALUES (?, ?, ?, ?)',
+            (100, 'kyma eventing extension', 100, to_fvecs(hash_embedding('kyma eventing extension'))))
+    mirror.sync()
+    assert mirror.stats()["vectors"] == 121 and mirror.rebuilds == 1
+    assert mirror.search(to_fvecs(hash_embedding('kyma eventing extension')), k=1)[0]["project_number"] == 100
+
+
+@pytest.mark.parametrize('change', [
+    'DELETE FROM COMMENTS4 WHERE "index" = 3',
+    'UPDATE ADVISORIES4 SET "solution_embedding" = NULL WHERE "index" = 5',
+])
+def test_deleted_rows_and_removed_embeddings_trigger_a_rebuild(mirror, connection, change):
+    mirror.sync()
+    execute(connection, change)
+    mirror.sync()
+    assert mirror.stats()["vectors"] == 119 and mirror.rebuilds == 2
+
+
+def test_backfilled_embedding_triggers_a_rebuild(mirror, connection):
+    execute(connection, 'UPDATE ADVISORIES4 SET "solution_embedding" = NULL WHERE "index" = 5')
+    mirror.sync()
+    execute(connection, 'UPDATE ADVISORIES4 SET "solution_embedding" = ? WHERE "index" = 5',
+            (to_fvecs(hash_embedding('backfilled')),))
+    mirror.sync()
+    assert mirror.stats()["vectors"] == 120 and mirror.rebuilds == 2
+    assert mirror.search(to_fvecs(hash_embedding('backfilled')), k=1)[0]["project_number"] == 5
+
+
+def test_mirror_is_rebuilt_periodically(db_path):
+    mirror = AnnMirror(lambda: FakeConnectionContext(db_path), 'DBUSER', SOURCES, rebuild_seconds=0)
+    mirror.sync()
+    mirror.sync()
+    assert mirror.rebuilds == 2
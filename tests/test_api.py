@@ -0,0 +1,73 @@
+import pytest
+
+
+@pytest.mark.parametrize('body', [
+    {"k": 0}, {"k": 101}, {"k": "5"}, {"k": 2.5}, {"k": True}, {"min_similarity": "high"}, {"min_similarity": [0.1]},
+    {"start_date": "2024-13-01"}, {"end_date": "yesterday"}, {"start_date": 20240101},
+])
+def test_compare_text_to_existing_rejects_bad_arguments(client, body):
+    response = client.post('/compare_text_to_existing', json={"query_text": "integration security", **body})
+    assert response.status_code == 400
+
+
+def test_compare_text_to_existing_treats_empty_filters_as_absent(client):
+    plain = client.post('/compare_text_to_existing', json={"query_text": "integration security", "k": 3})
+    empty = client.post('/compare_text_to_existing', json={"query_text": "integration security", "k": 3,
+                                                           "architect": "", "category": ""})
+    assert plain.status_code == empty.status_code == 200
+    assert empty.get_json() == plain.get_json() and len(plain.get_json()["similarities"]) == 3
+
+
+@pytest.mark.parametrize('columns', ["solution", [], ["solution", 3], {"solution": True}, None])
+def test_vector_search_batch_rejects_columns_that_are_not_a_list_of_names(client, columns):
+    response = client.post('/vector_search_batch', json={"queries": ["integration"], "columns": columns})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('k', [True, False, 0, 101, "3"])
+def test_vector_search_batch_rejects_bad_k(client, k):
+    response = client.post('/vector_search_batch', json={"queries": ["integration"], "k": k})
+    assert response.status_code == 400
+
+
+def test_vector_search_batch_returns_the_requested_columns(client):
+    response = client.post('/vector_search_batch', json={"queries": ["integration", "security"], "k": 2,
+                                                         "columns": ["project_number"]})
+    assert response.status_code == 200
+    results = response.get_json()["results"]
+    assert [len(result["matches"]) for result in results] == [2, 2]
+    assert set(results[0]["matches"][0]) == {"project_number", "COSINE_SIMILARITY"}
+
+
+@pytest.mark.parametrize('drift_threshold', ['abc', '0', '-1.5', 'nan', 'inf'])
+def test_refresh_clusters_rejects_bad_drift_threshold(client, drift_threshold):
+    response = client.post('/refresh_clusters', data={"mode": "incremental", "drift_threshold": drift_threshold})
+    assert response.status_code == 400
+
+
+class StubMirror:
+    def stats(self):
+        return {"vectors": 10}
+
+    def recall(self, k, samples):
+        return 1.0
+
+
+@pytest.mark.parametrize('args', [{"k": "five"}, {"k": "0"}, {"k": "101"}, {"recall_samples": "1.5"},
+                                  {"recall_samples": "-3"}, {"recall_samples": "100000"}])
+def test_ann_index_stats_rejects_bad_k_and_recall_samples(api, client, monkeypatch, args):
+    monkeypatch.setattr(api, 'ann_mirror', StubMirror())
+    assert client.get('/ann_index_stats', query_string=args).status_code == 400
+    assert client.get('/ann_index_stats').get_json() == {"vectors": 10, "recall": 1.0}
+
+
+@pytest.mark.parametrize('args', [{}, {"limit": "5"}, {"format": "ndjson"}])
+def test_get_all_projects_rejects_invalid_schema_name(client, args):
+    response = client.get('/get_all_projects', query_string={"schema_name": "DBUSER.x; DROP", **args})
+    assert response.status_code == 400
+
+
+def test_compare_text_to_existing_filters_by_date(client):
+    response = client.post('/compare_text_to_existing', json={"query_text": "integration security", "k": 3,
+                                                              "start_date": "1900-01-01", "end_date": "9999-12-31"})
+    assert response.status_code == 200 and len(response.get_json()["similarities"]) == 3
@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+
+from app.category_scores import CategoryScorer, UNASSIGNED_CATEGORY_ID
+from app.schema import SchemaRegistry
+from benchmarks.fake_hana import hash_embedding, to_fvecs
+
+TOP_N = 3
+MIN_SIMILARITY = 0.05
+CATEGORIES = {
+    "Integration": "integration of systems apis and events topic1 topic2",
+    "Security": "security identity and data protection topic3",
+    "Analytics": "analytics dashboards and reporting topic4 topic5",
+    "Extensions": "extension cap and kyma workloads topic6",
+    "AI": "ai machine learning and vector search hana"
+}
+
+
+def rows(connection, sql):
+    cursor = connection.connection.cursor()
+    cursor.execute(sql)
+    result = cursor.fetchall()
+    cursor.close()
+    return result
+
+
+def expected_state(connection):
+    """Top-N categories per advisory and the resulting assignments, computed from scratch."""
+    scored = rows(connection, """
+        SELECT a."index", a."project_number", c."index", COSINE_SIMILARITY(a."topic_embedding", c."category_embedding")
+        FROM ADVISORIES4 a CROSS JOIN CATEGORIES c WHERE a."topic_embedding" IS NOT NULL
+    """)
+    by_advisory = {}
+    for advisory, project, category, score in scored:
+        by_advisory.setdefault((advisory, project), []).append((-score, category))
+    scores, assignments = set(), set()
+    for (advisory, project), candidates in by_advisory.items():
+        top = sorted(candidates)[:TOP_N]
+        scores |= {(advisory, category, round(-score, 9)) for score, category in top}
+        best_score, best_category = top[0]
+        assignments.add((project, best_category if -best_score >= MIN_SIMILARITY else UNASSIGNED_CATEGORY_ID))
+    return scores, assignments
+
+
+def stored_state(connection):
+    scores = {(advisory, category, round(score, 9)) for advisory, category, score in
+              rows(connection, 'SELECT "ADVISORY_INDEX", "CATEGORY_ID", "SCORE" FROM PROJECT_CATEGORY_SCORES')}
+    assignments = set(rows(connection, 'SELECT "PROJECT_ID", "CATEGORY_ID" FROM PROJECT_BY_CATEGORY'))
+    return scores, assignments
+
+
+@pytest.fixture
+def scorer(connection):
+    SchemaRegistry().ensure_static_tables(connection)
+    return CategoryScorer(top_n=TOP_N, min_similarity=MIN_SIMILARITY)
+
+
+def test_first_sync_scores_everything(scorer, connection):
+    summary = scorer.sync_categories(connection, CATEGORIES)
+    assert summary["mode"] == "full"
+    assert stored_state(connection) == expected_state(connection)
+
+
+def test_incremental_edits_match_a_full_recompute(scorer, connection):
+    rng = np.random.default_rng(1)
+    vocabulary = ['integration', 'security', 'analytics', 'extension', 'ai', 'hana', 'kyma'] + \
+                 [f'topic{i}' for i in range(10)]
+    categories = dict(CATEGORIES)
+    scorer.sync_categories(connection, categories)
+
+    for step in range(12):
+        categories = dict(categories)
+        action = step % 3
+        if action == 0:
+            label = sorted(categories)[rng.integers(len(categories))]
+            categories[label] = ' '.join(rng.choice(vocabulary, size=4))
+        elif action == 1:
+            categories[f'New {step}'] = ' '.join(rng.choice(vocabulary, size=4))
+        else:
+            del categories[sorted(categories)[rng.integers(len(categories))]]
+
+        summary = scorer.sync_categories(connection, categories)
+        assert summary["mode"] == "incremental"
+        assert stored_state(connection) == expected_state(connection), f"diverged after step {step}: {summary}"
+
+
+def test_new_advisories_are_scored_incrementally(scorer, connection):
+    scorer.sync_categories(connection, CATEGORIES)
+    cursor = connection.connection.cursor()
+    cursor.executemany('INSERT INTO ADVISORIES4 ("index", "project_number", "topic", "topic_embedding") VALUES (?, ?, ?, ?)',
+                       [(100 + i, 100 + i, text, to_fvecs(hash_embedding(text)))
+                        for i, text in enumerate(['kyma extension topic6', 'vector search ai', 'unrelated words'])])
+    cursor.close()
+
+    assert scorer.score_new_advisories(connection) == 3
+    assert scorer.score_new_advisories(connection) == 0
+    assert stored_state(connection) == expected_state(connection)
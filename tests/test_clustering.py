@@ -0,0 +1,132 @@
+import pytest
+
+from app import utilities_hana
+from benchmarks import fake_hana
+
+MODEL_TABLE = 'CLUSTERING_CATPCA_MODEL'
+
+
+class StubCATPCA:
+    """Records what PAL would be called with; fit returns a model shaped like hana_ml 2.30's."""
+
+    calls = []
+
+    def __init__(self, **kwargs):
+        self.model_ = None
+
+    def fit(self, data, key):
+        connection = data.connection_context
+        StubCATPCA.calls.append(('fit', data.count()))
+        self.model_ = [connection.sql("SELECT 'loadings' AS PART"),
+                       connection.sql("SELECT 'scaling' AS PART"),
+                       connection.sql("SELECT 'quantification' AS PART")]
+        self.scores_ = connection.sql('SELECT 1 AS COMPONENT_ID')
+
+    def transform(self, data, key, n_components):
+        StubCATPCA.calls.append(('transform', [model.collect()['PART'][0] for model in self.model_]))
+        return data.connection_context.sql('SELECT 1 AS COMPONENT_ID')
+
+
+@pytest.fixture
+def catpca(monkeypatch):
+    StubCATPCA.calls = []
+    monkeypatch.setattr(utilities_hana, 'CATPCA', StubCATPCA)
+    monkeypatch.setattr(utilities_hana, 'create_dataframe_from_pandas', fake_hana.create_dataframe_from_pandas)
+    return StubCATPCA
+
+
+def project(connection, start_date='1900-01-01', end_date='2030-01-01', refit=False):
+    window = ('ADVISORIES4', start_date, end_date)
+    hdf = utilities_hana.window_embeddings(connection, *window)
+    return utilities_hana.project_embeddings(connection, hdf, MODEL_TABLE, n_components=3, window=window, refit=refit)
+
+
+def test_refresh_persists_model_parts_and_reuse_rebuilds_them_in_order(connection, catpca):
+    project(connection)
+    for part in utilities_hana.CATPCA_MODEL_PARTS:
+        assert connection.has_table(f'{MODEL_TABLE}_{part}')
+
+    project(connection)
+    assert catpca.calls == [('fit', 60), ('transform', ['loadings', 'scaling', 'quantification'])]
+
+
+def test_refit_drops_stale_quantification(connection, catpca, monkeypatch):
+    project(connection)
+
+    # A numeric-only fit has no quantification table
+    fit = StubCATPCA.fit
+    def fit_without_quantification(self, data, key):
+        fit(self, data, key)
+        self.model_ = self.model_[:2]
+    monkeypatch.setattr(catpca, 'fit', fit_without_quantification)
+    project(connection, refit=True)
+
+    assert not connection.has_table(f'{MODEL_TABLE}_QUANTIFICATION')
+    assert len(utilities_hana.load_catpca_model(connection, MODEL_TABLE)) == 2
+
+
+def test_projection_is_refitted_for_a_window_it_does_not_cover(connection, catpca):
+    project(connection, start_date='2021-01-01', end_date='2023-01-01')
+    project(connection, start_date='2021-06-01', end_date='2022-06-01')
+    project(connection, start_date='2020-01-01', end_date='2023-01-01')
+    assert [call[0] for call in catpca.calls] == ['fit', 'transform', 'fit']
+
+
+def test_projection_is_refitted_when_the_fitted_window_changed(connection, catpca):
+    project(connection)
+    cursor = connection.connection.cursor()
+    cursor.execute('UPDATE ADVISORIES4 SET "topic_embedding" = NULL WHERE "project_number" = 1')
+    cursor.close()
+
+    project(connection)
+    assert catpca.calls == [('fit', 60), ('fit', 59)]
+
+
+def test_no_persisted_model_requires_refit(connection):
+    assert utilities_hana.load_catpca_model(connection, 'CLUSTERING_CATPCA_MODEL') is None
+    result = utilities_hana.assign_new_projects_to_clusters(connection, 'ADVISORIES4', 'CLUSTERING', n_components=3)
+    assert result["refit_required"] and result["assigned"] == 0
+
+
+class StubTSNE:
+    fitted = []
+
+    def __init__(self, **kwargs):
+        self.settings = kwargs
+
+    def fit_predict(self, data, key):
+        StubTSNE.fitted.append((self.settings, sorted(data.collect()[key])))
+        return data.connection_context.sql(f'SELECT "{key}", "{key}" * 1.0 AS "x", 0.0 AS "y" FROM ({data.select_statement})'), None, None
+
+
+def test_tsne_layout_embeds_a_deterministic_landmark_sample(connection, monkeypatch):
+    StubTSNE.fitted = []
+    monkeypatch.setattr(utilities_hana, 'TSNE', StubTSNE)
+    monkeypatch.setattr(utilities_hana, 'create_dataframe_from_pandas', fake_hana.create_dataframe_from_pandas)
+    cursor = connection.connection.cursor()
+    cursor.execute('CREATE TABLE PCA AS SELECT "project_number", "index" * 0.5 AS "1", "index" * 0.25 AS "2" FROM ADVISORIES4')
+    cursor.close()
+
+    layouts = [utilities_hana.tsne_layout(connection, connection.table('PCA'), 'project_number', 5, 'CLUSTERING',
+                                          settings={"landmarks": 16})
+               for _ in range(2)]
+
+    (settings, first), (_, second) = StubTSNE.fitted
+    assert first == second and len(first) == 16
+    assert settings["angle"] == 0.5 and settings["n_iter"] == 1000
+    assert layouts[0][1] == {"rows": 60, "landmarks": 16, "n_iter": 1000, "angle": 0.5}
+    assert len(layouts[0][0].collect()) == 60
+
+
+def test_tsne_layout_embeds_every_point_below_the_landmark_threshold(connection, monkeypatch):
+    StubTSNE.fitted = []
+    monkeypatch.setattr(utilities_hana, 'TSNE', StubTSNE)
+    cursor = connection.connection.cursor()
+    cursor.execute('CREATE TABLE PCA AS SELECT "project_number", "index" * 0.5 AS "1" FROM ADVISORIES4')
+    cursor.close()
+
+    _, summary = utilities_hana.tsne_layout(connection, connection.table('PCA'), 'project_number', 5, 'CLUSTERING')
+
+    assert utilities_hana.TSNE_SETTINGS["landmarks"] > 60
+    assert summary == {"rows": 60, "landmarks": 60, "n_iter": 1000, "angle": 0.5}
+    assert len(StubTSNE.fitted[0][1]) == 60
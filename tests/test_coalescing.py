@@ -0,0 +1,114 @@
+import threading
+import time
+
+from flask import Flask, jsonify, request
+
+from app.coalescing import RequestCoalescer
+
+WAITERS = 3
+
+
+def make_app(coalescer, view):
+    app = Flask(__name__)
+    app.testing = True
+    app.add_url_rule('/search', 'search', coalescer.coalesced()(view), methods=['POST'])
+    return app
+
+
+def wait_for_waiters(coalescer, count, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with coalescer._lock:
+            if sum(flight.waiters for flight in coalescer._flights.values()) >= count:
+                return
+        time.sleep(0.01)
+    raise AssertionError('duplicates did not join the flight')
+
+
+# Send the bodies concurrently; the first is sent alone so it leads, the view is released once
+# `waiters` duplicates joined its flight. Returns the status/JSON or the exception of each request
+def post_concurrently(app, coalescer, release, bodies, waiters):
+    results = [None] * len(bodies)
+
+    def send(i):
+        try:
+            response = app.test_client().post('/search', json=bodies[i])
+            results[i] = (response.status_code, response.get_json())
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=send, args=(i,)) for i in range(len(bodies))]
+    threads[0].start()
+    while not coalescer._flights:
+        time.sleep(0.01)
+    for thread in threads[1:]:
+        thread.start()
+    wait_for_waiters(coalescer, waiters)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    return results
+
+
+def test_identical_requests_share_one_execution():
+    coalescer, release, calls = RequestCoalescer(), threading.Event(), []
+
+    def view():
+        calls.append(request.get_json())
+        release.wait(5)
+        return jsonify({"calls": len(calls)}), 200
+
+    results = post_concurrently(make_app(coalescer, view), coalescer, release, [{"q": "hana", "k": 5}] * (WAITERS + 1),
+                                waiters=WAITERS)
+
+    assert len(calls) == 1
+    assert results == [(200, {"calls": 1})] * (WAITERS + 1)
+    assert coalescer.stats()["db_calls_saved"] == WAITERS and coalescer.stats()["executions"] == 1
+
+
+def test_leader_exception_reaches_the_waiters():
+    coalescer, release, calls = RequestCoalescer(), threading.Event(), []
+
+    def view():
+        calls.append(1)
+        release.wait(5)
+        raise RuntimeError('HANA unavailable')
+
+    results = post_concurrently(make_app(coalescer, view), coalescer, release, [{"q": "hana"}] * (WAITERS + 1),
+                                waiters=WAITERS)
+
+    assert len(calls) == 1
+    assert all(isinstance(result, RuntimeError) and str(result) == 'HANA unavailable' for result in results)
+    assert not coalescer._flights
+
+
+def test_different_bodies_are_not_merged():
+    coalescer, release, calls = RequestCoalescer(), threading.Event(), []
+
+    def view():
+        calls.append(request.get_json()["q"])
+        release.wait(5)
+        return jsonify({"q": request.get_json()["q"]}), 200
+
+    app = make_app(coalescer, view)
+    threads = [threading.Thread(target=app.test_client().post, args=('/search',), kwargs={"json": {"q": q}})
+               for q in ('hana', 'kyma')]
+    for thread in threads:
+        thread.start()
+    while len(calls) < 2:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert sorted(calls) == ['hana', 'kyma']
+    assert coalescer.stats()["executions"] == 2 and coalescer.stats()["db_calls_saved"] == 0
+
+
+def test_key_ignores_json_key_order():
+    app = Flask(__name__)
+    keys = []
+    for body in ({"q": "hana", "k": 5}, {"k": 5, "q": "hana"}):
+        with app.test_request_context('/search', method='POST', json=body):
+            keys.append(RequestCoalescer._key())
+    assert keys[0] == keys[1]
@@ -0,0 +1,49 @@
+import pytest
+
+from app import embedding_cache
+from app.embedding_cache import EmbeddingCache
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = EmbeddingCache(max_size=2, ttl_seconds=0)
+    cache.put('a', '[1]')
+    cache.put('b', '[2]')
+    assert cache.get('a') == '[1]'  # 'b' is now the least recently used
+    cache.put('c', '[3]')
+
+    assert cache.get('b') is None
+    assert cache.get('a') == '[1]' and cache.get('c') == '[3]'
+    assert cache.stats() == {"size": 2, "max_size": 2, "ttl_seconds": 0, "hits": 3, "misses": 1,
+                             "evictions": 1, "expirations": 0, "hit_ratio": 0.75}
+
+
+def test_expired_entries_are_misses(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(embedding_cache.time, 'monotonic', lambda: now[0])
+    cache = EmbeddingCache(max_size=2, ttl_seconds=10)
+    cache.put('a', '[1]')
+    now[0] += 11
+
+    assert cache.get('a') is None
+    assert cache.stats()["expirations"] == 1 and cache.stats()["size"] == 0
+
+
+def test_query_embedding_is_computed_once_per_text(connection, monkeypatch):
+    monkeypatch.setattr(embedding_cache, 'query_embedding_cache', EmbeddingCache(max_size=8))
+    executed = []
+    cursor = connection.connection.cursor
+    monkeypatch.setattr(connection.connection, 'cursor', lambda: executed.append(1) or cursor())
+
+    first = embedding_cache.get_query_embedding(connection, 'integration security')
+    second = embedding_cache.get_query_embedding(connection, 'integration security')
+    batch = embedding_cache.get_query_embeddings(connection, ['integration security', 'kyma', 'kyma'])
+
+    assert first == second == batch[0] and batch[1] == batch[2]
+    assert len(executed) == 2  # one statement for the first text, one for the batch's only miss
+    assert embedding_cache.query_embedding_cache.stats()["hits"] == 2
+
+
+@pytest.mark.parametrize('text_type, model_version', [('SUMMARY', 'SAP_NEB.20240715'), ('QUERY', "x'); DROP")])
+def test_unknown_text_type_or_model_version_is_rejected(connection, text_type, model_version):
+    with pytest.raises(ValueError):
+        embedding_cache.get_query_embedding(connection, 'text', text_type, model_version)
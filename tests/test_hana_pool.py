@@ -0,0 +1,82 @@
+import threading
+
+import pytest
+
+from app.hana_pool import HanaConnectionPool, PoolTimeout
+
+
+class StubHdbConnection:
+    def __init__(self):
+        self.alive = True
+
+    def isconnected(self):
+        return self.alive
+
+    # The ping of an idle connection fails, as on a socket the server already closed
+    def cursor(self):
+        raise OSError('connection reset by peer')
+
+
+class StubContext:
+    def __init__(self):
+        self.connection = StubHdbConnection()
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_dead_idle_connection_is_replaced_on_borrow():
+    pool = HanaConnectionPool(StubContext, max_size=1, validate_after_idle=60)
+    first = pool.acquire()
+    pool.release(first)
+    first.connection.alive = False
+
+    second = pool.acquire()
+    assert second is not first and first.closed
+    assert pool.stats()["reconnects"] == 1 and pool.stats()["created"] == 2
+
+
+def test_idle_connection_failing_the_ping_is_replaced_on_borrow():
+    pool = HanaConnectionPool(StubContext, max_size=1, validate_after_idle=0)
+    first = pool.acquire()
+    pool.release(first)
+
+    assert pool.acquire() is not first and first.closed
+    assert pool.stats()["reconnects"] == 1
+
+
+def test_live_idle_connection_is_reused():
+    pool = HanaConnectionPool(StubContext, max_size=1, validate_after_idle=60)
+    first = pool.acquire()
+    pool.release(first)
+    assert pool.acquire() is first and pool.stats()["created"] == 1
+
+
+def test_pool_never_hands_out_more_than_max_size_connections():
+    pool = HanaConnectionPool(StubContext, max_size=2, acquire_timeout=0.05)
+    held = [pool.acquire(), pool.acquire()]
+
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+    assert pool.stats()["in_use"] == 2 and pool.stats()["timeouts"] == 1
+
+    # A released slot is available to a waiting borrower
+    borrowed = []
+    waiter = threading.Thread(target=lambda: borrowed.append(pool.acquire()))
+    pool.acquire_timeout = 5
+    waiter.start()
+    pool.release(held[0])
+    waiter.join(5)
+    assert borrowed == [held[0]] and pool.stats()["created"] == 2
+
+
+def test_failed_connect_frees_the_slot():
+    def connect():
+        raise ConnectionError('HANA unavailable')
+
+    pool = HanaConnectionPool(connect, max_size=1, acquire_timeout=0.05)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            pool.acquire()
+    assert pool.stats()["in_use"] == 0 and pool.stats()["timeouts"] == 0
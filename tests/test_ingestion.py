@@ -0,0 +1,27 @@
+import pytest
+
+from app.ingestion import insert_texts
+from app.schema import SchemaRegistry
+
+
+def test_insert_texts_returns_the_generated_ids_in_order(connection):
+    SchemaRegistry().ensure_text_table(connection, 'DBUSER', 'TCM_SAMPLE')
+    cursor = connection.connection.cursor()
+    cursor.execute('INSERT INTO TCM_SAMPLE (TEXT) VALUES (?)', ('existing',))
+
+    texts = [f'text {i}' for i in range(7)]
+    text_ids, batches = insert_texts(connection, 'DBUSER', 'TCM_SAMPLE', texts, batch_size=3)
+
+    assert [batch["rows"] for batch in batches] == [3, 3, 1]
+    cursor.execute(f'SELECT TEXT_ID, TEXT FROM TCM_SAMPLE WHERE TEXT_ID IN ({", ".join("?" * len(text_ids))})',
+                   tuple(text_ids))
+    stored = dict(cursor.fetchall())
+    cursor.close()
+    assert [stored[text_id] for text_id in text_ids] == texts
+
+
+@pytest.mark.parametrize('options', [{"schema_name": 7}, {"table_name": ["TCM_SAMPLE"]}, {"table_name": None},
+                                     {"batch_size": [10]}, {"batch_size": "many"}])
+def test_insert_texts_and_vectors_rejects_bad_options(client, options):
+    response = client.post('/insert_texts_and_vectors', json={"texts": ["a text"], **options})
+    assert response.status_code == 400
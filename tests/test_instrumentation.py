@@ -0,0 +1,34 @@
+from app import instrumentation
+from app.instrumentation import Metrics, instrument_connection
+
+
+def test_round_trip_histogram_and_gauges_render_as_prometheus_text(connection, monkeypatch):
+    registry = Metrics()
+    monkeypatch.setattr(instrumentation, 'metrics', registry)
+    instrument_connection(connection)
+
+    registry.start_request('/get_categories')
+    cursor = connection.connection.cursor()
+    cursor.execute('SELECT "index" FROM ADVISORIES4')
+    rows = cursor.fetchall()
+    cursor.execute('SELECT 1')
+    cursor.close()
+    registry.finish_request()
+
+    lines = registry.render({"api_pool_in_use": 1, "api_pool_max_size": 2}).splitlines()
+    assert '# TYPE api_db_round_trips histogram' in lines
+    assert 'api_db_round_trips_bucket{route="/get_categories",le="1"} 0' in lines
+    assert 'api_db_round_trips_bucket{route="/get_categories",le="2"} 1' in lines
+    assert 'api_db_round_trips_bucket{route="/get_categories",le="+Inf"} 1' in lines
+    assert 'api_db_round_trips_sum{route="/get_categories"} 2.0' in lines
+    assert 'api_db_round_trips_count{route="/get_categories"} 1' in lines
+    assert f'api_db_rows_fetched_sum{{route="/get_categories"}} {float(len(rows))}' in lines
+    assert lines[-4:] == ['# TYPE api_pool_in_use gauge', 'api_pool_in_use 1',
+                          '# TYPE api_pool_max_size gauge', 'api_pool_max_size 2']
+
+
+def test_metrics_route_exposes_the_pool_gauges(client):
+    client.get('/get_categories')
+    body = client.get('/metrics').get_data(as_text=True)
+    assert 'api_request_duration_seconds_count{route="/get_categories"}' in body
+    assert '# TYPE api_pool_max_size gauge\napi_pool_max_size 2\n' in body
@@ -0,0 +1,81 @@
+import threading
+import time
+
+from app.jobs import JobRunner
+from app.schema import SchemaRegistry
+from benchmarks.fake_hana import FakeConnectionContext
+
+
+def wait_for(runner, connection, job_id, statuses=('SUCCEEDED', 'FAILED'), timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = runner.get(connection, job_id)
+        if job['status'] in statuses:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} still {job['status']}")
+
+
+def test_job_runs_and_reports_stages(db_path, connection):
+    registry = SchemaRegistry()
+    runner = JobRunner(lambda: FakeConnectionContext(db_path), registry)
+
+    def pipeline(connection, progress, n):
+        progress('first', 0.0)
+        progress('second', 0.5)
+        return {"n": n}
+
+    job_id, created = runner.submit(connection, 'test', {"n": 3}, pipeline)
+    job = wait_for(runner, connection, job_id)
+    assert created and job['status'] == 'SUCCEEDED' and job['result'] == {"n": 3}
+    assert [stage['stage'] for stage in job['stages']] == ['first', 'second']
+    # The jobs table comes from the shared registry, created with the other tables in one block
+    assert registry.ddl_runs == 1
+
+
+def test_job_is_failed_when_its_connection_cannot_be_opened(db_path, connection):
+    attempts = []
+
+    def connect():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ConnectionError('HANA unavailable')
+        return FakeConnectionContext(db_path)
+
+    runner = JobRunner(connect)
+    job_id, _ = runner.submit(connection, 'test', {}, lambda connection, progress: {})
+    job = wait_for(runner, connection, job_id)
+    assert job['status'] == 'FAILED' and job['error'] == 'HANA unavailable'
+
+    # The key is free again for a new submission
+    assert runner.submit(connection, 'test', {}, lambda connection, progress: {})[1]
+
+
+def test_job_of_a_dead_worker_does_not_block_its_key(db_path, connection):
+    runner = JobRunner(lambda: FakeConnectionContext(db_path), stale_after_seconds=60)
+    runner.schema_registry.ensure_static_tables(connection)
+    cursor = connection.connection.cursor()
+    cursor.execute("""
+        INSERT INTO CLUSTERING_JOBS (JOB_ID, JOB_TYPE, COALESCE_KEY, PARAMS, STATUS, STAGES, CREATED_AT, UPDATED_AT)
+        VALUES ('dead', 'test', 'test:{}', '{}', 'RUNNING', '[]', '2000-01-01 00:00:00', '2000-01-01 00:00:00')
+    """)
+    cursor.close()
+
+    job_id, created = runner.submit(connection, 'test', {}, lambda connection, progress: {})
+    assert created and job_id != 'dead'
+    assert runner.get(connection, 'dead')['status'] == 'FAILED'
+
+
+def test_heartbeat_keeps_a_long_job_coalescing(db_path, connection):
+    # Timestamps have whole-second resolution, so the job must outlive the 2 second limit by a margin
+    runner = JobRunner(lambda: FakeConnectionContext(db_path), stale_after_seconds=2, heartbeat_seconds=0.2)
+    release = threading.Event()
+
+    job_id, _ = runner.submit(connection, 'test', {}, lambda connection, progress: release.wait(10))
+    wait_for(runner, connection, job_id, statuses=('RUNNING',))
+    time.sleep(3.2)
+    try:
+        assert runner.submit(connection, 'test', {}, lambda connection, progress: {}) == (job_id, False)
+    finally:
+        release.set()
+    assert wait_for(runner, connection, job_id)['status'] == 'SUCCEEDED'
@@ -0,0 +1,58 @@
+import pytest
+
+from app.labelling import ClusterLabeller, LocalCompletions, MalformedLabel, MAX_LABEL_LENGTH, parse_label
+
+TOPICS = {"0": ["kyma integration events", "integration suite mapping"], "1": ["hana vector search"]}
+
+
+class FailingCompletions:
+    def __init__(self):
+        self.calls = 0
+
+    def create(self, **kwargs):
+        self.calls += 1
+        raise TimeoutError('model timed out')
+
+
+@pytest.mark.parametrize('content, label', [
+    ('Integration Events', 'Integration Events'),
+    ('"Integration Events"\nThese topics are about events.', 'Integration Events'),
+    ('Label: **Integration Events**', 'Integration Events'),
+    ('Cluster 3 - Integration Events', 'Integration Events'),
+    ('\n  Integration Events  \n', 'Integration Events'),
+])
+def test_parse_label_strips_prefixes_quotes_and_extra_lines(content, label):
+    assert parse_label(content) == label
+
+
+@pytest.mark.parametrize('content', ['', None, '\n \n', 'Label: ""'])
+def test_parse_label_rejects_completions_without_a_label(content):
+    with pytest.raises(MalformedLabel):
+        parse_label(content)
+
+
+def test_parse_label_truncates_to_the_column_length():
+    assert len(parse_label('x' * 1000)) == MAX_LABEL_LENGTH
+
+
+def test_cached_labels_skip_the_model(connection):
+    first = ClusterLabeller(completions=LocalCompletions(), retries=0)
+    labels = first.label(connection, TOPICS)
+
+    completions = LocalCompletions()
+    second = ClusterLabeller(completions=completions, retries=0)
+    assert second.label(connection, TOPICS) == labels
+    assert completions.calls == 0 and second.cache_hits == 2
+
+
+def test_failed_clusters_get_a_placeholder_that_is_not_cached(connection):
+    completions = FailingCompletions()
+    labeller = ClusterLabeller(completions=completions, retries=0, timeout_seconds=1)
+
+    assert labeller.label(connection, TOPICS) == {"0": "Cluster 0", "1": "Cluster 1"}
+    assert completions.calls == 2 and labeller.stats()["failures"] == 2
+
+    # The next refresh asks the model again instead of reusing the placeholder
+    retry = LocalCompletions()
+    labels = ClusterLabeller(completions=retry, retries=0).label(connection, TOPICS)
+    assert retry.calls == 2 and labels["1"] != "Cluster 1"
@@ -0,0 +1,37 @@
+import pytest
+
+from app import queries
+from benchmarks.fake_hana import hash_embedding
+
+
+def test_cursor_is_closed_when_prepare_fails(connection, monkeypatch):
+    closed = []
+
+    class FailingCursor:
+        def prepare(self, sql):
+            raise RuntimeError('invalid table name')
+
+        def close(self):
+            closed.append(True)
+
+    monkeypatch.setattr(connection.connection, 'cursor', FailingCursor)
+    with pytest.raises(RuntimeError):
+        queries.fetch_records(connection, 'project_category_scores', (1,))
+    assert closed == [True]
+    assert not queries._prepared.get(connection)
+
+
+def test_similarity_search_prepares_one_statement_for_every_k(connection):
+    query_vector = '[' + ','.join(str(x) for x in hash_embedding('migration to the cloud')) + ']'
+    first = queries.similarity_search(connection, 'DBUSER', query_vector, k=2)
+    second = queries.similarity_search(connection, 'DBUSER', query_vector, k=7)
+    assert len(first) == 2
+    assert len(second) == 7
+    assert len(queries._prepared[connection]) == 1
+
+
+def test_prepared_cursors_per_connection_are_bounded(connection, monkeypatch):
+    monkeypatch.setattr(queries, 'MAX_PREPARED_PER_CONNECTION', 2)
+    for name in ('project_category_scores', 'advisories_by_expert_and_category', 'project_details'):
+        queries._prepared_cursor(connection, name, {'schema': 'DBUSER'} if name == 'project_details' else {})
+    assert [key[0] for key in queries._prepared[connection]] == ['advisories_by_expert_and_category', 'project_details']
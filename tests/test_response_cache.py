@@ -0,0 +1,42 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from app.response_cache import DataVersions
+from app.schema import SchemaRegistry
+from benchmarks.fake_hana import FakeConnectionContext
+
+
+def test_concurrent_bumps_are_all_counted(db_path, connection):
+    SchemaRegistry().ensure_static_tables(connection)
+    versions = DataVersions(check_seconds=0)
+
+    def bump(_):
+        worker_connection = FakeConnectionContext(db_path)
+        try:
+            for _ in range(5):
+                versions.bump(worker_connection, 'clusters')
+        finally:
+            worker_connection.close()
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(bump, range(4)))
+    versions.bump(connection, 'categories')
+
+    assert versions.current(lambda: connection, ['clusters', 'categories', 'projects']) == (20, 1, 0)
+
+
+def test_etag_answers_304_until_a_write_bumps_the_generation(client):
+    from benchmarks.run_benchmarks import CATEGORIES
+
+    assert client.post('/update_categories_and_projects', json=CATEGORIES).status_code == 200
+    first = client.get('/get_all_project_categories')
+    etag = first.headers['ETag']
+    assert first.status_code == 200 and first.get_json()["project_categories"]
+
+    unchanged = client.get('/get_all_project_categories', headers={"If-None-Match": etag})
+    assert unchanged.status_code == 304 and not unchanged.get_data()
+
+    # Re-scoring the categories bumps their generation, so the old ETag no longer matches
+    assert client.post('/update_categories_and_projects', json=CATEGORIES).status_code == 200
+    changed = client.get('/get_all_project_categories', headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
+    assert changed.get_json() == first.get_json()
@@ -0,0 +1,33 @@
+from app.schema import SchemaRegistry
+
+
+def test_clustering_ddl_matches_the_columns_the_api_reads_and_writes(connection):
+    cursor = connection.connection.cursor()
+    cursor.execute('DROP TABLE CLUSTERING')
+    SchemaRegistry().ensure_static_tables(connection)
+
+    cursor.execute("SELECT name FROM pragma_table_info('CLUSTERING')")
+    assert [row[0] for row in cursor.fetchall()] == ['PROJECT_NUMBER', 'x', 'y', 'CLUSTER_ID', 'DISTANCE']
+    cursor.close()
+
+
+def test_bootstrap_creates_every_table_in_one_round_trip_once(connection):
+    registry = SchemaRegistry(text_tables=[('DBUSER', 'TCM_SAMPLE')])
+    registry.bootstrap(connection)
+    registry.bootstrap(connection)
+    registry.ensure_static_tables(connection)
+    registry.ensure_text_table(connection, 'DBUSER', 'TCM_SAMPLE')
+
+    assert registry.ddl_runs == 1
+    assert connection.has_table('TCM_SAMPLE') and connection.has_table('API_DATA_VERSIONS')
+    assert connection.has_table('CLUSTERING_JOBS') and connection.has_table('CLUSTER_LABEL_CACHE')
+
+
+def test_bootstrap_failure_is_not_raised_or_retried():
+    class Unreachable:
+        connection = None
+
+    registry = SchemaRegistry()
+    registry.bootstrap(Unreachable())
+    registry.bootstrap(Unreachable())
+    assert registry.ddl_runs == 0 and not registry.stats()["static_tables_ready"]
@@ -0,0 +1,53 @@
+import os
+
+import pytest
+
+from app.snapshot import EmbeddingSnapshot, export_snapshot, search_texts
+from benchmarks.fake_hana import hash_embedding, to_fvecs
+
+SOURCES = [{"table": 'DBUSER.ADVISORIES4', "key": "index", "vector": "solution_embedding"}]
+ARMS = [('DBUSER.ADVISORIES4.solution_embedding', 'DBUSER.ADVISORIES4', 'index', 'solution')]
+
+
+def brute_force(connection, query, k):
+    cursor = connection.connection.cursor()
+    cursor.execute('SELECT "solution", "project_number", COSINE_SIMILARITY("solution_embedding", ?) FROM ADVISORIES4', (query,))
+    rows = sorted(cursor.fetchall(), key=lambda row: row[2], reverse=True)[:k]
+    cursor.close()
+    return [(row[0], row[1]) for row in rows]
+
+
+@pytest.fixture
+def snapshot(tmp_path, connection):
+    export_snapshot(connection, str(tmp_path), SOURCES)
+    return EmbeddingSnapshot(str(tmp_path))
+
+
+def test_export_stores_only_quantized_vectors(snapshot, tmp_path):
+    version = open(tmp_path / 'CURRENT').read()
+    assert sorted(os.listdir(tmp_path / version)) == [
+        'DBUSER.ADVISORIES4.solution_embedding.ids.npy', 'DBUSER.ADVISORIES4.solution_embedding.scales.npy',
+        'DBUSER.ADVISORIES4.solution_embedding.vectors.npy', 'manifest.json']
+    assert snapshot.current()["sources"]['DBUSER.ADVISORIES4.solution_embedding']["max_key"] == 59
+
+
+def test_search_matches_an_exact_scan(snapshot, connection):
+    cursor = connection.connection.cursor()
+    cursor.execute('SELECT "solution" FROM ADVISORIES4 WHERE "index" = 7')
+    query = to_fvecs(hash_embedding(cursor.fetchone()[0]))
+    cursor.close()
+
+    results = search_texts(connection, snapshot, ARMS, query, k=5)
+    assert [(row["TEXT"], row["project_number"]) for row in results] == brute_force(connection, query, 5)
+    assert results[0]["project_number"] == 7 and results[0]["SIMILARITY"] == pytest.approx(1.0)
+
+
+def test_search_includes_rows_inserted_after_the_export(snapshot, connection):
+    text = 'kyma eventing extension for the new advisory'
+    cursor = connection.connection.cursor()
+    cursor.execute('INSERT INTO ADVISORIES4 ("index", "solution", "project_number", "solution_embedding") VALUES (?, ?, ?, ?)',
+                   (60, text, 60, to_fvecs(hash_embedding(text))))
+    cursor.close()
+
+    results = search_texts(connection, snapshot, ARMS, to_fvecs(hash_embedding(text)), k=3)
+    assert results[0]["project_number"] == 60
@@ -0,0 +1,35 @@
+import pytest
+
+from app.streaming import fetch_keyset_page
+
+BASE_SQL = 'SELECT "project_number" AS PROJECT_ID, "index" AS ROW_ID FROM COMMENTS4'
+
+
+@pytest.fixture
+def comments(connection):
+    # Three rows for project 0, then one for each of projects 1..4
+    cursor = connection.connection.cursor()
+    cursor.execute('DELETE FROM COMMENTS4')
+    cursor.executemany('INSERT INTO COMMENTS4 ("index", "project_number") VALUES (?, ?)',
+                       [(0, 0), (1, 0), (2, 0), (3, 1), (4, 2), (5, 3), (6, 4)])
+    cursor.close()
+    return connection
+
+
+def read_all(connection, limit):
+    pages, after = [], None
+    while True:
+        page, after = fetch_keyset_page(connection, BASE_SQL, 'PROJECT_ID', limit, after)
+        pages.append(sorted(record['ROW_ID'] for record in page))
+        if after is None:
+            return pages
+
+
+def test_pages_cover_every_row_once_without_splitting_a_key(comments):
+    assert read_all(comments, 4) == [[0, 1, 2, 3], [4, 5, 6]]
+    assert read_all(comments, 3) == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+def test_key_with_more_rows_than_the_limit_is_returned_whole(comments):
+    assert read_all(comments, 2) == [[0, 1, 2], [3, 4], [5, 6]]
+    assert read_all(comments, 1) == [[0, 1, 2], [3], [4], [5], [6]]